@@ -1,6 +1,10 @@
 from django.contrib import admin
 from .models import User, Trivia, TriviaBank, ClubBank, PlayerBank, CareerBank, FormationBank, DataLoadStatus
 from django.contrib.auth.admin import UserAdmin
+from .questions import bump_version
+from .http_cache import bump_leaderboard
+from .career_paths import career_paths
+from .formations import formations
 
 class CustomUserAdmin(UserAdmin):
     ''' Custom User Admin to inherit the user model to be displayed '''
@@ -20,6 +24,14 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ('email',)
     ordering = ('email',)
 
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_leaderboard() # Their history went with them
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_leaderboard()
+
     # We use extra field sets to see superuser priveleges and add the ability to make changes
 
 class TriviaAdmin(admin.ModelAdmin):
@@ -29,26 +41,61 @@ class TriviaAdmin(admin.ModelAdmin):
 
 class TriviaBankAdmin(admin.ModelAdmin):
     ''' Custom admin for the TriviaBank model '''
-    list_display = ('question', 'answer')
+    list_display = ('question', 'answer', 'difficulty', 'attempts', 'correct_rate', 'median_answer_time')
+    list_filter = ('difficulty',)
     search_fields = ('question', 'answer')
+    readonly_fields = ('attempts', 'correct', 'answer_times', 'difficulty') # Kept up to date from the matches
+
+    # Every change tells the workers to reload their cached question bank
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_version()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_version()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_version()
+
+class ContentAdmin(admin.ModelAdmin):
+    ''' Admin of solo game content. Every change tells the workers to drop their compiled games '''
+    content_cache = None # The ContentCache compiled from the model
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.content_cache.bump_version()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.content_cache.bump_version()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        self.content_cache.bump_version()
 
-class ClubBankAdmin(admin.ModelAdmin):
+class ClubBankAdmin(ContentAdmin):
     ''' Custom admin for the ClubBank model '''
+    content_cache = formations
     list_display = ('team_name', 'description')
     search_fields = ('team_name',)
 
-class PlayerBankAdmin(admin.ModelAdmin):
+class PlayerBankAdmin(ContentAdmin):
     ''' Custom admin for the PlayerBank model '''
+    content_cache = career_paths
     list_display = ('player_names',)
     search_fields = ('player_names',)
 
-class CareerBankAdmin(admin.ModelAdmin):
+class CareerBankAdmin(ContentAdmin):
     ''' Custom admin for the CareerBank model '''
+    content_cache = career_paths
     list_display = ('player', 'team_name', 'appearances')
     search_fields = ('player__player_names', 'team_name')
 
-class FormationBankAdmin(admin.ModelAdmin):
+class FormationBankAdmin(ContentAdmin):
     ''' Custom admin for the FormationBank model '''
+    content_cache = formations
     list_display = ('club', 'player_names', 'position')
     search_fields = ('player_names',)
 
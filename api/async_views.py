@@ -0,0 +1,389 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.db import close_old_connections, connections
+from django.views import View
+from .models import BoxToBox, GuessTheSide, CareerPath, GameProgress, PlayerBank, ClubBank
+from .career_paths import career_paths
+from .formations import formations, formation_mask, masked_formation
+from .responses import json_response
+from .http_cache import listing_validators, not_modified, with_validators, LISTING_CACHE_CONTROL
+from .batch_guesses import box2box_batch, career_path_batch, guess_the_side_batch, record_guesses
+from .session_counters import counters_key, load_counters, restore, session_counters
+from .games import (
+    box2box_keys, box2box_clubs, box2box_result_message, finalize_box2box, play_box2box,
+    career_path_result_message, finalize_career_path, play_career_path,
+    guess_the_side_key, guess_the_side_result_message, finalize_guess_the_side, play_guess_the_side, read_guesses,
+    get_new_game, get_all_games, BOX2BOX_GUESSES, CAREER_PATH_GUESSES, GUESS_THE_SIDE_GUESSES, STATE_TIMEOUT,
+)
+
+# Async variants of the solo game views, with the same routes and JSON contract as the sync views in views.py.
+# Selected with the ASYNC_SOLO_VIEWS setting (see urls.py).
+#
+# Django's async ORM and cache methods (aget, acreate, cache.aget...) still run every call through sync_to_async, in a thread
+# of the request's own, so under ASGI each in-flight request would hold a thread and a database connection of its own.
+# These views run their blocking calls on one bounded pool instead: the requests wait on the event loop, and the number of
+# threads and database connections stays fixed however many guesses are in flight.
+storage_pool = ThreadPoolExecutor(max_workers=settings.ASYNC_STORAGE_WORKERS, thread_name_prefix='solo-storage')
+
+
+def call_in_pool(func, args, kwargs):
+    ''' Runs on a storage thread. Its database connection goes back to the connection pool once the call is done (or is closed if broken) '''
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def blocking(func, *args, **kwargs):
+    ''' Run a blocking database, cache or file call on the storage pool, leaving the event loop free meanwhile '''
+    return await sync_to_async(call_in_pool, thread_sensitive=False, executor=storage_pool)(func, args, kwargs)
+
+
+def close_pool_connections():
+    ''' Close the database connection of every pool thread (e.g. before the database is dropped). The barrier makes each thread take exactly one task '''
+    barrier = threading.Barrier(settings.ASYNC_STORAGE_WORKERS)
+
+    def close(_):
+        connections.close_all()
+        barrier.wait()
+    list(storage_pool.map(close, range(settings.ASYNC_STORAGE_WORKERS)))
+
+
+class AsyncSoloGameView(View):
+    ''' Base of the async solo game views, routing a request to start/resume (game_id) or guess (session_id) '''
+
+    async def dispatch(self, request, *args, **kwargs):
+        ''' Async equivalent of login_required, then determine the particular route to take when a POST method occurs '''
+        request.user = await blocking(get_user, request) # Resolve the session's user once, on the pool
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        if kwargs.pop('batch', False):
+            return await self.guess_batch(request, *args, **kwargs)
+        elif 'game_id' in kwargs:
+            return await self.post(request, *args, **kwargs)
+        elif 'session_id' in kwargs:
+            return await self.guess(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def guess_batch(self, request, session_id):
+        ''' Plays an ordered list of guesses at once, in one call on the storage pool '''
+        guesses = read_guesses(request.body, self.max_guesses)
+        if guesses is None:
+            return json_response({'error': f'Expected a list of 1 to {self.max_guesses} guesses.'}, status=400)
+        return json_response(*await blocking(self.play_batch, request.user, session_id, guesses))
+
+
+class AsyncBoxToBoxView(AsyncSoloGameView):
+    ''' Handles the BoxToBox game logic on the event loop '''
+    max_guesses = BOX2BOX_GUESSES
+    play_batch = staticmethod(box2box_batch)
+
+    async def post(self, request, game_id):
+        '''Creates or resumes a BoxToBox game session. Returns a json response'''
+        def load():
+            final_score = GameProgress.final_score(request.user, 'box2box', game_id) # Completed? (None otherwise)
+            if final_score is not None:
+                return final_score, None, get_new_game("box2box", game_id) # The session row may have been archived, the clubs come from the game file
+            existing_session = BoxToBox.objects.filter(user=request.user, gameID=game_id).first() # Started before?
+            if existing_session is None:
+                return final_score, None, {}
+            counters = counters_key(BoxToBox, game_id, request.user.id) # Read with the state, they may be ahead of the row
+            state = cache.get_many([*box2box_keys(game_id, request.user.id), counters])
+            return final_score, restore(existing_session, state.get(counters)), state
+        final_score, existing_session, state = await blocking(load)
+
+        if final_score is not None:
+            if state is None:
+                return json_response({"error": "Game not found."}, status=404)
+            return json_response({
+                "message": box2box_result_message(final_score),
+                "game_over": True,
+                "correct_scores": final_score,
+                "guesses_left": 0,
+                "clubs": state['clubs'],
+                "grid": {k: False for k in range(9)}
+            })
+
+        elif existing_session:
+            answers_key, grid_key = box2box_keys(game_id, request.user.id)
+            if not state.get(answers_key) or not state.get(grid_key): # The cached state expired, so the game restarts
+                await blocking(existing_session.delete)
+                return await self.start_new_game(request, game_id)
+            return json_response({
+                "message": "Existing Game Resumed",
+                "session_id": existing_session.gameID,
+                "clubs": box2box_clubs(existing_session),
+                "grid": state[grid_key],
+                "guesses_left": BOX2BOX_GUESSES - existing_session.guesses,
+            }, status=200)
+        return await self.start_new_game(request, game_id)
+
+    async def start_new_game(self, request, game_id):
+        ''' Start a new box to box game session '''
+        def start():
+            if GameProgress.is_completed(request.user, 'box2box', game_id): # Guarantee the game is not already completed
+                return json_response({"error": "This game has already been completed."}, status=403)
+            game_reference = get_new_game("box2box", game_id)
+            if game_reference is None:
+                return json_response({"error": "Game not found."}, status=404)
+
+            clubs = game_reference['clubs']
+            box_to_box_session = BoxToBox.objects.create(
+                user=request.user,
+                gameID=game_id,
+                club_x1=clubs['x1'], club_x2=clubs['x2'], club_x3=clubs['x3'],
+                club_y1=clubs['y1'], club_y2=clubs['y2'], club_y3=clubs['y3'],
+            )
+            answers_key, grid_key = box2box_keys(box_to_box_session.gameID, request.user.id)
+            grid_initial_state = {k: False for k in game_reference['answers'].keys()}
+            cache.set_many({answers_key: game_reference['answers'], grid_key: grid_initial_state}, timeout=STATE_TIMEOUT)
+            return json_response({
+                "message": "Game Started",
+                "session_id": box_to_box_session.gameID,
+                "clubs": clubs,
+                "grid": grid_initial_state,
+                "guesses_left": BOX2BOX_GUESSES,
+            }, status=201)
+
+        try:
+            return await blocking(start)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=500)
+
+    async def guess(self, request, session_id):
+        '''Handles the guess made by a user, updates the grid state, and returns a json response'''
+        answers_key, grid_key = box2box_keys(session_id, request.user.id)
+        try:
+            def load():
+                counters = counters_key(BoxToBox, session_id, request.user.id)
+                state = cache.get_many([answers_key, grid_key, counters])
+                return restore(BoxToBox.objects.get(gameID=session_id, user=request.user), state.get(counters)), state
+            box_to_box_session, state = await blocking(load)
+            if box_to_box_session.guesses >= BOX2BOX_GUESSES:
+                return json_response({'game_over': True, 'message': 'Maximum guesses reached. Game over.'}, status=200)
+
+            user_guess = json.loads(request.body).get('guess', '')
+            answers, grid = state.get(answers_key), state.get(grid_key)
+            if not answers or not grid:
+                return json_response({'error': 'Game session expired or not found.'}, status=404)
+
+            (response_data,), played = play_box2box(box_to_box_session, answers, grid, [user_guess])
+
+            def store():
+                session_counters.store(box_to_box_session, {grid_key: grid, answers_key: answers}, finished=response_data['game_over'])
+                if response_data['game_over']:
+                    finalize_box2box(session_id, request.user)
+            await blocking(store)
+            record_guesses('box2box', session_id, request.user, played)
+            return json_response({**response_data, 'grid': grid})
+
+        except BoxToBox.DoesNotExist:
+            return json_response({'error': 'Game session not found.'}, status=404)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=500)
+
+    async def get(self, request):
+        ''' Retrieve all games that can be played '''
+        return await blocking(get_all_games, request, "box2box") # Lists the game files on disk
+
+
+class AsyncCareerPathView(AsyncSoloGameView):
+    ''' Handles the CareerPath game logic on the event loop '''
+    max_guesses = CAREER_PATH_GUESSES
+    play_batch = staticmethod(career_path_batch)
+
+    async def post(self, request, game_id):
+        ''' Creates or resumes a CareerPath game session. Returns a JSON response. '''
+        def load():
+            final_score = GameProgress.final_score(request.user, 'careerPath', game_id) # 1 for a win, None until completed
+            existing_session = CareerPath.objects.filter(user=request.user, gameID=game_id).first()
+            if existing_session is not None and final_score is None:
+                load_counters(existing_session)
+            return final_score, existing_session, career_paths.get(game_id)
+        final_score, existing_session, payload = await blocking(load)
+        if payload is None:
+            return json_response({"error": "Game not found."}, status=404)
+
+        if final_score is not None:
+            return json_response({
+                "message": career_path_result_message(final_score == 1, payload.names),
+                "session_id": game_id,
+                "career_path": payload.career_path,
+                "guesses_left": 0,
+                "game_over": True,
+            })
+        elif existing_session:
+            return json_response({
+                "message": "Existing Game Resumed",
+                "session_id": existing_session.gameID,
+                "career_path": payload.career_path,
+                "guesses_left": CAREER_PATH_GUESSES - existing_session.guesses,
+            })
+
+        await blocking(lambda: CareerPath.objects.create(user=request.user, gameID=game_id, player_guess=payload.player_names))
+        return json_response({
+            "message": "Game Started",
+            "session_id": game_id,
+            "career_path": payload.career_path,
+            "guesses_left": CAREER_PATH_GUESSES,
+        })
+
+    async def guess(self, request, session_id):
+        ''' Handles the guess made by a user, returns a JSON response. '''
+        try:
+            def load():
+                return load_counters(CareerPath.objects.get(gameID=session_id, user=request.user)), career_paths.get(session_id)
+            career_path_session, payload = await blocking(load)
+            if payload is None:
+                return json_response({'error': 'Game session expired or not found.'}, status=404)
+            if career_path_session.guesses >= CAREER_PATH_GUESSES or career_path_session.result:
+                return json_response({'game_over': True, 'message': 'No more guesses allowed or game already concluded.'}, status=200)
+
+            user_guess = json.loads(request.body).get('guess', '')
+            (response_data,), played = play_career_path(career_path_session, payload.names, [user_guess]) # The names are already lower-cased
+
+            def store():
+                session_counters.store(career_path_session, finished=response_data['game_over']) # Validated by the model when written
+                if response_data['game_over']:
+                    finalize_career_path(session_id, request.user)
+            await blocking(store)
+            record_guesses('careerPath', session_id, request.user, played)
+            return json_response(response_data)
+
+        except CareerPath.DoesNotExist:
+            return json_response({'error': 'Game session not found.'}, status=404)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=500)
+
+    async def get(self, request):
+        ''' Retrieve all games that can be played '''
+        def load():
+            played = GameProgress.completed_ids(request.user, 'careerPath')
+            return [{"game_id": player_id, "status": "completed" if player_id in played else "available"}
+                    for player_id in PlayerBank.objects.values_list('id', flat=True)]
+        validators = await blocking(listing_validators, request.user, 'careerPath')
+        response = not_modified(request, validators, LISTING_CACHE_CONTROL)
+        if response is not None:
+            return response
+        try:
+            return with_validators(json_response({'games': await blocking(load)}), validators, LISTING_CACHE_CONTROL)
+        except Exception as e:
+            return json_response({'error': 'An error occurred while fetching games: ' + str(e)}, status=500)
+
+
+class AsyncGuessTheSideView(AsyncSoloGameView):
+    ''' Handles the GuessTheSide game logic on the event loop '''
+    max_guesses = GUESS_THE_SIDE_GUESSES
+    play_batch = staticmethod(guess_the_side_batch)
+
+    async def post(self, request, game_id):
+        answers_key = guess_the_side_key(game_id, request.user.id)
+
+        def load():
+            final_score = GameProgress.final_score(request.user, 'formations', game_id)
+            existing_session = GuessTheSide.objects.filter(user=request.user, gameID=game_id).first()
+            if not existing_session or final_score is not None:
+                return final_score, existing_session, None, formations.get(game_id)
+            counters = counters_key(GuessTheSide, game_id, request.user.id)
+            state = cache.get_many([answers_key, counters])
+            return final_score, restore(existing_session, state.get(counters)), formation_mask(state.get(answers_key)), formations.get(game_id)
+        final_score, existing_session, mask, template = await blocking(load)
+        if template is None:
+            return json_response({"error": "Game not found."}, status=404)
+
+        if final_score is not None:
+            return json_response({
+                "message": guess_the_side_result_message(final_score),
+                "game_over": True,
+                "correct_scores": final_score,
+                "teamName": template.team_name,
+                "teamDescription": template.description,
+                "starting_eleven": template.full,
+                "guesses_left": 0,
+            })
+
+        elif existing_session and mask is not None:
+            return json_response({
+                "message": "Existing Game Resumed",
+                "session_id": existing_session.gameID,
+                "teamName": existing_session.team_guess,
+                "teamDescription": existing_session.team_description,
+                "starting_eleven": masked_formation(template, mask),
+                "guesses_left": GUESS_THE_SIDE_GUESSES - existing_session.guesses,
+            }, status=200)
+
+        def start():
+            if existing_session:
+                existing_session.delete() # The cached state expired, so the game restarts
+            if GameProgress.is_completed(request.user, 'formations', game_id):
+                return json_response({"error": "This game has already been completed."}, status=403)
+
+            guess_side_session = GuessTheSide.objects.create(
+                user=request.user,
+                gameID=game_id,
+                team_guess=template.team_name,
+                team_description=template.description
+            )
+            cache.set(answers_key, 0, timeout=STATE_TIMEOUT)
+            return json_response({
+                "message": "New Game Started",
+                "session_id": guess_side_session.gameID,
+                "teamName": template.team_name,
+                "teamDescription": template.description,
+                "starting_eleven": masked_formation(template, 0),
+                "guesses_left": GUESS_THE_SIDE_GUESSES,
+            }, status=201)
+        return await blocking(start)
+
+    async def guess(self, request, session_id):
+        ''' Handles the guess made by a user, updates the formation state, and returns a JSON response. '''
+        answers_key = guess_the_side_key(session_id, request.user.id)
+        try:
+            def load():
+                counters = counters_key(GuessTheSide, session_id, request.user.id)
+                state = cache.get_many([answers_key, counters])
+                session = restore(GuessTheSide.objects.get(gameID=session_id, user=request.user), state.get(counters))
+                return session, formation_mask(state.get(answers_key)), formations.get(session_id)
+            guess_side_session, mask, template = await blocking(load)
+            if guess_side_session.guesses >= GUESS_THE_SIDE_GUESSES:
+                return json_response({'game_over': True, 'message': 'Maximum guesses reached. Game over.'}, status=200)
+
+            user_guess = json.loads(request.body).get('guess', '')
+            if mask is None or template is None:
+                return json_response({'error': 'Game session expired or not found.'}, status=404)
+
+            (response_data,), mask, played = play_guess_the_side(guess_side_session, template, mask, [user_guess])
+
+            def store():
+                session_counters.store(guess_side_session, {answers_key: mask}, finished=response_data['game_over'])
+                if response_data['game_over']:
+                    finalize_guess_the_side(session_id, request.user)
+            await blocking(store)
+            record_guesses('formations', session_id, request.user, played)
+            return json_response({**response_data, 'guessed_players': template.full if response_data['game_over'] else masked_formation(template, mask)})
+
+        except GuessTheSide.DoesNotExist:
+            return json_response({'error': 'Game session not found.'}, status=404)
+        except Exception as e:
+            return json_response({'error': str(e)}, status=500)
+
+    async def get(self, request):
+        ''' Retrieve all games that can be played '''
+        def load():
+            played = GameProgress.completed_ids(request.user, 'formations')
+            return [{"game_id": club_id, "status": "completed" if club_id in played else "available"}
+                    for club_id in ClubBank.objects.values_list('id', flat=True)]
+        validators = await blocking(listing_validators, request.user, 'formations')
+        response = not_modified(request, validators, LISTING_CACHE_CONTROL)
+        if response is not None:
+            return response
+        try:
+            return with_validators(json_response({'games': await blocking(load)}), validators, LISTING_CACHE_CONTROL)
+        except Exception as e:
+            return json_response({'error': 'An error occurred while fetching games: ' + str(e)}, status=500)
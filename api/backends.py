@@ -1,5 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password, verify_password
+from django.core.exceptions import PermissionDenied
+from django.db.models import Q
+from django.db.models.functions import Lower
+from .throttling import login_windows, client_ip
+
+# Password hashing is CPU bound, so it runs in a small bounded pool. A login storm then queues here instead of
+# occupying every worker thread (and every core), leaving the game endpoints responsive.
+hashing_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+
 
 class EmailAuthBackend(ModelBackend):
     """
@@ -7,14 +19,54 @@ class EmailAuthBackend(ModelBackend):
 
     Allows a user to sign in using an email/password pair rather than
     a username/password pair.
+
+    The email is matched case-insensitively through the LOWER(email) index, attempts are throttled
+    per email and per client ip, and stored hashes are upgraded to the preferred hasher on login.
+    It is terminal: a refused attempt (a username works too) never reaches the default backend, and hashes the password
+    exactly once whether or not the account exists.
     """
 
     def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None or password is None:
+            return None
+
+        email = username.strip().lower() # Assume 'username' is the email, normalised to match the functional index
+        if request is not None:
+            email_window, ip_window = login_windows()
+            # Count the attempt against both, so a single ip can't spray many emails and many ips can't hammer one email
+            email_allowed = email_window.consume(email)
+            ip_allowed = ip_window.consume(client_ip(request))
+            if not (email_allowed and ip_allowed):
+                request.login_throttled = True # Lets the login view tell the user why they were refused
+                raise PermissionDenied # Stop here rather than letting the remaining backends hash the password
+
+        user = self.get_user_by_login(email, username.strip())
+        if user is None:
+            # Hash anyway (in the pool, as a real check would), so a missing account costs and takes as long as a wrong password
+            hashing_pool.submit(make_password, password).result()
+            raise PermissionDenied # Terminal: the default backend would otherwise hash the password again, outside the pool
+
+        is_correct, must_update = hashing_pool.submit(verify_password, password, user.password).result()
+        if not (is_correct and self.user_can_authenticate(user)):
+            raise PermissionDenied
+
+        if must_update:
+            # The stored hash was made with another hasher or iteration count, replace it with the preferred one
+            user.password = hashing_pool.submit(make_password, password).result()
+            user.save(update_fields=['password'])
+        if request is not None:
+            email_window.reset(email) # A successful login clears the failed attempts for that email
+        return user
+
+    def get_user_by_login(self, email, entered):
+        ''' Retrieve the user whose email matches case-insensitively, or else whose username is the one entered (as the admin
+            logs in), or None. Both are looked up by one query '''
         UserModel = get_user_model()
-        try:
-            user = UserModel.objects.get(email=username)  # Assume 'username' is the email.
-            if user.check_password(password):
-                return user
-        except UserModel.DoesNotExist:
-            return None  # Return None if no user is found
-        return None  # Return None if the password check fails
\ No newline at end of file
+        users = list(UserModel._default_manager.alias(email_lower=Lower('email')).filter(Q(email_lower=email) | Q(username=entered)))
+        by_email = [user for user in users if user.email.lower() == email]
+        if len(by_email) > 1:
+            # Legacy accounts may only differ by case, in which case only the exact email is accepted
+            by_email = [user for user in by_email if user.email == entered]
+        if by_email:
+            return by_email[0] if len(by_email) == 1 else None
+        return next((user for user in users if user.username == entered), None)
@@ -0,0 +1,103 @@
+from django.core.cache import cache
+from django.db import transaction
+from .models import BoxToBox, CareerPath, GuessTheSide
+from .guess_log import guess_log
+from .session_counters import load_counters, session_counters
+from .career_paths import career_paths
+from .formations import formations, formation_mask, masked_formation
+from .games import (
+    box2box_keys, guess_the_side_key, play_box2box, play_career_path, play_guess_the_side,
+    finalize_box2box, finalize_career_path, finalize_guess_the_side,
+    BOX2BOX_GUESSES, CAREER_PATH_GUESSES, GUESS_THE_SIDE_GUESSES, EXPIRED,
+)
+
+# Batch guesses of the solo games, served by the sync and async views alike (the async views run them on their storage pool).
+# A batch takes an ordered list of guesses and plays them as that many single guesses would, with one session and state load
+# and one write in a single transaction, instead of a request, session load and save per guess. The session row is locked
+# for the transaction, so batches of the same game can't interleave. The write is the session counters' (session_counters.py),
+# behind the batch unless it ended the game.
+#
+# The response holds the result of every guess ("results", as the guess endpoint would have answered it without the grid or
+# formation) and the state after the last one. A batch whose first guess can't be played gets the guess endpoint's response.
+
+NOT_FOUND = {'error': 'Game session not found.'}
+
+
+def final_state(results, **state):
+    ''' The response of a batch: every guess's result, then the state left by the last guess that was played '''
+    last = next(result for result in reversed(results) if 'correct' in result)
+    return {'results': results, **{key: value for key, value in last.items() if key != 'correct'}, **state}
+
+
+def record_guesses(game, session_id, user, played):
+    for user_guess, correct, attempt, cell in played:
+        guess_log.record(game, session_id, user.id, correct, attempt, user_guess, cell=cell)
+
+
+def box2box_batch(user, session_id, guesses):
+    ''' Play a batch of box to box guesses. Returns the response data and status '''
+    answers_key, grid_key = box2box_keys(session_id, user.id)
+    with transaction.atomic():
+        session = BoxToBox.objects.select_for_update().filter(gameID=session_id, user=user).first()
+        if session is None:
+            return NOT_FOUND, 404
+        load_counters(session)
+        if session.guesses >= BOX2BOX_GUESSES:
+            return {'game_over': True, 'message': 'Maximum guesses reached. Game over.'}, 200
+        state = cache.get_many([answers_key, grid_key])
+        answers, grid = state.get(answers_key), state.get(grid_key)
+        if not answers or not grid:
+            return EXPIRED, 404
+
+        results, played = play_box2box(session, answers, grid, guesses)
+        game_over = session.guesses >= BOX2BOX_GUESSES or all(grid.values())
+        session_counters.store(session, {grid_key: grid, answers_key: answers}, finished=game_over)
+        if game_over:
+            finalize_box2box(session_id, user)
+    record_guesses('box2box', session_id, user, played)
+    return final_state(results, grid=grid), 200
+
+
+def career_path_batch(user, session_id, guesses):
+    ''' Play a batch of career path guesses. Returns the response data and status '''
+    with transaction.atomic():
+        session = CareerPath.objects.select_for_update().filter(gameID=session_id, user=user).first()
+        if session is None:
+            return NOT_FOUND, 404
+        load_counters(session)
+        if session.guesses >= CAREER_PATH_GUESSES or session.result:
+            return {'game_over': True, 'message': 'No more guesses allowed or game already concluded.'}, 200
+        payload = career_paths.get(session_id)
+        if payload is None:
+            return EXPIRED, 404
+
+        results, played = play_career_path(session, payload.names, guesses)
+        game_over = session.guesses >= CAREER_PATH_GUESSES or session.result
+        session_counters.store(session, finished=game_over)
+        if game_over:
+            finalize_career_path(session_id, user)
+    record_guesses('careerPath', session_id, user, played)
+    return final_state(results), 200
+
+
+def guess_the_side_batch(user, session_id, guesses):
+    ''' Play a batch of guess the side guesses. Returns the response data and status '''
+    answers_key = guess_the_side_key(session_id, user.id)
+    with transaction.atomic():
+        session = GuessTheSide.objects.select_for_update().filter(gameID=session_id, user=user).first()
+        if session is None:
+            return NOT_FOUND, 404
+        load_counters(session)
+        if session.guesses >= GUESS_THE_SIDE_GUESSES:
+            return {'game_over': True, 'message': 'Maximum guesses reached. Game over.'}, 200
+        mask, template = formation_mask(cache.get(answers_key)), formations.get(session_id)
+        if mask is None or template is None:
+            return EXPIRED, 404
+
+        results, mask, played = play_guess_the_side(session, template, mask, guesses)
+        game_over = session.guesses >= GUESS_THE_SIDE_GUESSES or session.correct_scores == 11
+        session_counters.store(session, {answers_key: mask}, finished=game_over)
+        if game_over:
+            finalize_guess_the_side(session_id, user)
+    record_guesses('formations', session_id, user, played)
+    return final_state(results, guessed_players=template.full if game_over else masked_formation(template, mask)), 200
@@ -0,0 +1,239 @@
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import CaptureQueriesContext
+from .models import User, UserHistory, PlayerBank, CareerBank, ClubBank, FormationBank
+from .career_paths import career_paths
+from .formations import formations
+
+CELLS = [f'x{x}y{y}' for x in range(1, 4) for y in range(1, 4)] # The nine box to box cells
+POSITIONS = ['GK', 'RB', 'CB', 'CB', 'LB', 'CM', 'CM', 'CM', 'RW', 'ST', 'LW']
+
+# Most database queries each solo game endpoint may make per request, as (fixed, per item listed), where the items are the
+# games of that type in the catalogue (or the rows of the leaderboard). The fixed part includes the session and user lookups
+# made by the middleware. These record the current worst case, so any regression fails the benchmark.
+QUERY_BUDGETS = {
+    'box2box.list': (3, 0),
+    'box2box.start': (7, 0),
+    'box2box.resume': (4, 0),
+    'box2box.guess': (5, 0),
+    'box2box.finish': (12, 0),
+    'box2box.completed': (4, 0),
+    'career_path.list': (4, 0),
+    'career_path.start': (9, 0),
+    'career_path.resume': (4, 0),
+    'career_path.guess': (5, 0),
+    'career_path.finish': (9, 0),
+    'career_path.completed': (4, 0),
+    'guess_the_side.list': (4, 0),
+    'guess_the_side.start': (9, 0),
+    'guess_the_side.resume': (4, 0),
+    'guess_the_side.guess': (5, 0),
+    'guess_the_side.finish': (11, 0),
+    'guess_the_side.batch': (14, 0), # A whole game of guesses in one transaction, finishing it
+    'guess_the_side.completed': (4, 0),
+    'leaderboard': (3, 1),
+}
+
+
+# Cold start of a worker: the wall time to import the ASGI application (django.setup, the url configuration and the consumers)
+# in a fresh interpreter, which must stay within STARTUP_BUDGET seconds. The LAZY_MODULES are only needed by a few rarely used
+# paths (the admin, the REST API, the forms, the guess log readers) and are loaded by their first request, never at startup.
+STARTUP_BUDGET = 1.0
+LAZY_MODULES = ('numpy', 'rest_framework.viewsets', 'rest_framework.routers', 'api.views', 'api.rest_views', 'api.admin',
+                'api.forms', 'api.guess_chunks', 'storages')
+
+ImportTime = namedtuple('ImportTime', 'module depth self cumulative') # Times in seconds, depth 0 for a top level import
+Startup = namedtuple('Startup', 'wall imports lazy_loaded') # Seconds, ImportTimes in import order, LAZY_MODULES loaded
+STARTUP_MARKER = 'startup:'
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    ''' Run a benchmark against a throwaway test database on the configured server, so real data is never touched '''
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb, serialize=False)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+class QueryCounter:
+    ''' Counts the queries run on every database connection, from any thread, while the context is active.
+    Connections opened inside the context (e.g. by sync_to_async threads) are picked up as they are created '''
+
+    def __init__(self):
+        self.count = 0
+        self.active = False
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.active:
+            with self.lock:
+                self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        self.active = True
+        connection_created.connect(self.install)
+        for existing in connections.all(initialized_only=True):
+            self.install(connection=existing)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.active = False # Connections in other threads keep the wrapper, but it no longer counts
+        connection_created.disconnect(self.install)
+
+
+def percentile(values, percent):
+    ''' Nearest-rank percentile of the values (0 when there are none) '''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def create_benchmark_users(count, prefix='bench'):
+    ''' Bulk create users with unusable passwords (no hashing cost), returning them in order '''
+    users = [User(username=f'{prefix}_{i}', email=f'{prefix}_{i}@bench.local', password=make_password(None)) for i in range(count)]
+    User.objects.bulk_create(users, ignore_conflicts=True)
+    return list(User.objects.filter(username__startswith=f'{prefix}_').order_by('id')[:count])
+
+
+def session_cookie(user):
+    ''' Create a logged in session for the user, returning the cookie header value that authenticates as them '''
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'api.backends.EmailAuthBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return f'sessionid={session.session_key}'
+
+
+def seed_catalogue(game_files_dir, players=50, clubs=50, box2box_games=50):
+    ''' Seed a synthetic catalogue: career paths, formations and box to box game files (written to game_files_dir).
+    Returns the accepted answers of every game so the benchmark can play them '''
+    player_rows = PlayerBank.objects.bulk_create(PlayerBank(player_names=[f'Career Player {i}', f'Player{i}']) for i in range(players))
+    CareerBank.objects.bulk_create(
+        CareerBank(player=player, team_name=f'Club {season}', appearances=30, goals=5, assists=3, season=str(2000 + season))
+        for player in player_rows for season in range(8)
+    )
+    career_paths.bump_version() # Payloads cached from an earlier catalogue with the same ids are stale
+
+    club_rows = ClubBank.objects.bulk_create(ClubBank(team_name=f'Side {i}', description=f'Side {i} in the final') for i in range(clubs))
+    FormationBank.objects.bulk_create(
+        FormationBank(club=club, position=position, player_names=[f'Side {club.id} Player {slot}', f'S{club.id}P{slot}'])
+        for club in club_rows for slot, position in enumerate(POSITIONS)
+    )
+    formations.bump_version()
+
+    os.makedirs(os.path.join(game_files_dir, 'box2box'), exist_ok=True)
+    box2box = {}
+    for game_id in range(1, box2box_games + 1):
+        answers = {cell: [[f'Grid {game_id} {cell} Player {k}', f'G{game_id}{cell}P{k}'] for k in range(3)] for cell in CELLS}
+        clubs_axis = {axis: f'Grid Club {axis}' for axis in ['x1', 'x2', 'x3', 'y1', 'y2', 'y3']}
+        with open(os.path.join(game_files_dir, 'box2box', f'{game_id}.json'), 'w') as game_file:
+            json.dump({'clubs': clubs_axis, 'answers': answers}, game_file)
+        box2box[game_id] = [answers[cell][0][0] for cell in CELLS]
+
+    return {
+        'box2box': box2box,
+        'career_path': {player.id: player.player_names[0] for player in player_rows},
+        'guess_the_side': {club.id: [f'Side {club.id} Player {slot}' for slot in range(len(POSITIONS))] for club in club_rows},
+    }
+
+
+class SoloBenchmark:
+    ''' Drives the solo game flows (list, start, resume, guess, finish, completed) through the full middleware stack,
+    recording the latency and exact query count of every request per endpoint '''
+
+    def __init__(self, client):
+        self.client = client
+        self.samples = defaultdict(list) # Endpoint -> [(seconds, queries, budget)]
+
+    def request(self, endpoint, url, guess=None, items=0, guesses=None):
+        ''' Make a request, GET for listings or POST otherwise (with a batch of guesses if given), and record it under the endpoint with its query budget '''
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            if guesses is not None:
+                response = self.client.post(url, data=json.dumps({'guesses': guesses}), content_type='application/json')
+            elif guess is None and not endpoint.endswith(('start', 'resume', 'completed')):
+                response = self.client.get(url)
+            elif guess is None:
+                response = self.client.post(url)
+            else:
+                response = self.client.post(url, data=json.dumps({'guess': guess}), content_type='application/json')
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise AssertionError(f'{endpoint} ({url}) failed with status {response.status_code}: {response.content[:200]!r}')
+        self.samples[endpoint].append((elapsed, len(queries), query_budget(endpoint, items)))
+        return response
+
+    def play(self, game, game_id, correct_guesses):
+        ''' Start, resume, guess wrong once, then guess every answer (the last guess finishes the game) and view the result '''
+        self.request(f'{game}.start', f'/{game}/game/{game_id}')
+        self.request(f'{game}.resume', f'/{game}/game/{game_id}')
+        self.request(f'{game}.guess', f'/{game}/guess/{game_id}', guess='Nobody')
+        for i, guess in enumerate(correct_guesses):
+            endpoint = f'{game}.finish' if i == len(correct_guesses) - 1 else f'{game}.guess'
+            self.request(endpoint, f'/{game}/guess/{game_id}', guess=guess)
+        self.request(f'{game}.completed', f'/{game}/game/{game_id}')
+
+    def run(self, catalogue, games_per_type):
+        ''' List every game type, play the first games of each, and fetch the leaderboard '''
+        for game in ['box2box', 'career_path', 'guess_the_side']:
+            self.request(f'{game}.list', f'/{game}/game/', items=len(catalogue[game]))
+            for game_id, answers in list(catalogue[game].items())[:games_per_type]:
+                self.play(game, game_id, answers if isinstance(answers, list) else [answers])
+            self.request(f'{game}.list', f'/{game}/game/', items=len(catalogue[game]))
+        self.request('leaderboard', '/leaderboard', items=UserHistory.objects.count())
+
+    def budget_violations(self):
+        ''' Return a message for every endpoint whose query count went over its budget '''
+        violations = []
+        for endpoint, samples in sorted(self.samples.items()):
+            over = [(queries, budget) for elapsed, queries, budget in samples if queries > budget]
+            if over:
+                queries, budget = max(over)
+                violations.append(f'{endpoint} made {queries} queries, over its budget of {budget}')
+        return violations
+
+
+def query_budget(endpoint, items=0):
+    ''' The query budget of an endpoint for a request listing the given number of items '''
+    fixed, per_item = QUERY_BUDGETS[endpoint]
+    return fixed + per_item * items
+
+
+def profile_startup(module='project.asgi', env=None):
+    ''' Import a module in a fresh interpreter (python -X importtime), returning its Startup '''
+    script = (f'import sys, time; start = time.perf_counter(); import {module}; wall = time.perf_counter() - start; '
+              f'print({STARTUP_MARKER!r}, wall, *[name for name in {LAZY_MODULES!r} if name in sys.modules])')
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], cwd=settings.BASE_DIR, env=env,
+                             capture_output=True, text=True, check=True)
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        imports.append(ImportTime(name.strip(), (len(name) - len(name.lstrip()) - 1) // 2, int(own) / 1_000_000, int(cumulative) / 1_000_000))
+    _, wall, *lazy_loaded = next(line for line in process.stdout.splitlines() if line.startswith(STARTUP_MARKER)).split()
+    return Startup(float(wall), imports, lazy_loaded)
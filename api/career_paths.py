@@ -0,0 +1,25 @@
+from collections import namedtuple
+from api.content_cache import ContentCache
+from api.games import career_path_names
+from api.models import CareerBank, PlayerBank
+from api.responses import RawJSON, dumps
+
+# Compiled career path games. A game's clubs are rendered to JSON once and kept with its accepted names (lower-cased once),
+# so starting, resuming and guessing read no career data from the database. Changing players or careers must call
+# career_paths.bump_version().
+
+FIELDS = ('team_name', 'appearances', 'goals', 'assists', 'is_loan', 'season') # Fields of a club shown to the user
+
+CareerPathPayload = namedtuple('CareerPathPayload', 'career_path player_names names') # Rendered clubs, stored names, lower-cased names
+
+
+def load_career_path(game_id):
+    ''' The payload of a career path, or None when there's no such player or they have no clubs '''
+    player_names = PlayerBank.objects.filter(id=game_id).values_list('player_names', flat=True).first()
+    clubs = list(CareerBank.objects.filter(player_id=game_id).values(*FIELDS))
+    if player_names is None or not clubs:
+        return None
+    return CareerPathPayload(RawJSON(dumps(clubs)), player_names, tuple(career_path_names(player_names)))
+
+
+career_paths = ContentCache('career_path', load_career_path)
@@ -1,14 +1,152 @@
 import json
 import asyncio
+import functools
+import logging
+import weakref
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.layers import get_channel_layer
 from channels.db import database_sync_to_async
-from api.models import Trivia, TriviaBank, MatchmakingQueue
+from api.models import Trivia, MatchmakingQueue
+from api.questions import question_bank
+from api.seen_questions import choose_questions
+from api.question_stats import question_stats, start_stats_flusher
+from api.guess_log import guess_log
+from api.responses import encode_text
+from api import metrics
+from api.reaper import heartbeat_timeout, start_reaper
+from api.async_views import blocking
+from api.batch_guesses import final_state, record_guesses
+from api.games import read_guesses
+from api.solo_games import GAMES as SOLO_GAMES
 import time
 from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db.models import Prefetch
+from django.utils import timezone
+from datetime import timedelta
 
-class MatchmakingConsumer(AsyncWebsocketConsumer):
+logger = logging.getLogger('api.performance')
+
+QUESTIONS_PER_MATCH = 10
+
+active_matches = {} # Trivia matches in progress on this worker, game id -> start time (shared by both players' consumers)
+
+WS_CONNECTIONS = metrics.counter('ws_connections_total', 'Websocket connections accepted', ('consumer',))
+WS_DISCONNECTIONS = metrics.counter('ws_disconnections_total', 'Websocket connections closed', ('consumer',))
+WS_MESSAGES_RECEIVED = metrics.counter('ws_messages_received_total', 'Websocket messages received from clients', ('consumer', 'type'))
+MESSAGE_ACTIONS = frozenset({'submit_answer', 'guess', 'guesses'}) # Labels of the messages received, any other action is 'other'
+WS_MESSAGES_SENT = metrics.counter('ws_messages_sent_total', 'Websocket messages sent to clients', ('consumer',))
+TIME_TO_MATCH = metrics.histogram('matchmaking_wait_seconds', 'Time users waited in the queue before being matched', buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+ACTIVE_MATCHES = metrics.gauge('trivia_active_matches', 'Trivia matches in progress on this worker', function=lambda: {(): len(active_matches)})
+MATCH_DURATION = metrics.histogram('trivia_match_duration_seconds', 'Time from the start to the end of a trivia match', buckets=(10, 30, 50, 59, 60, 61, 65, 75, 90, 120))
+CHANNEL_SEND_LATENCY = metrics.histogram('channel_layer_send_seconds', 'Time taken by channel layer group sends', ('type',))
+SYNC_WAIT = metrics.histogram('sync_to_async_wait_seconds', 'Time database calls queued before a sync thread ran them', ('function',))
+SYNC_IN_FLIGHT = metrics.gauge('sync_to_async_in_flight', 'Database calls handed to sync threads and not yet finished')
+SOLO_WRITE_BEHIND = metrics.histogram('solo_ws_guesses_per_write', 'Guesses of a solo game websocket stored by each write', ('game',), buckets=metrics.COUNT_BUCKETS)
+EVENT_LOOP_LAG = metrics.histogram('event_loop_lag_seconds', 'How late the event loop woke up compared to the schedule', buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+
+monitored_loops = weakref.WeakKeyDictionary() # Event loop -> its monitor task (holding the task stops it being garbage collected)
+
+
+def timed_database_sync_to_async(func):
+    '''database_sync_to_async that also records how long the call queued before a sync thread picked it up.
+    A growing wait (or in flight count) means the sync thread pool is saturated'''
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        submitted = time.perf_counter()
+
+        def run():
+            SYNC_WAIT.observe(time.perf_counter() - submitted, func.__name__)
+            return func(*args, **kwargs)
+
+        SYNC_IN_FLIGHT.inc()
+        try:
+            return await database_sync_to_async(run)()
+        finally:
+            SYNC_IN_FLIGHT.dec()
+    return wrapper
+
+
+async def monitor_event_loop():
+    '''Measure how late the event loop wakes up from a sleep, and log a dump of the metrics every METRICS_LOG_INTERVAL seconds'''
+
+    loop = asyncio.get_running_loop()
+    interval = settings.EVENT_LOOP_MONITOR_INTERVAL
+    last_dump = loop.time()
+    while True:
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - scheduled, 0))
+
+        if settings.METRICS_LOG_INTERVAL and loop.time() - last_dump >= settings.METRICS_LOG_INTERVAL:
+            last_dump = loop.time()
+            logger.info('Metrics: %s', json.dumps(metrics.registry.snapshot()))
+
+
+def start_loop_monitor():
+    '''Start the monitor once per event loop'''
+
+    if not settings.EVENT_LOOP_MONITOR_INTERVAL:
+        return
+    loop = asyncio.get_running_loop()
+    if loop not in monitored_loops:
+        monitored_loops[loop] = loop.create_task(monitor_event_loop())
+
+
+class QueueDepth:
+    ''' Users waiting in the matchmaking queue of every worker, counted from the table (a match removes both players, whose
+    consumers are often on different workers). Counted at most every MATCHMAKING_QUEUE_DEPTH_INTERVAL seconds, and never on an
+    event loop (the metrics dump of monitor_event_loop gets the last count) '''
+
+    def __init__(self):
+        self.depth = 0
+        self.counted = None # Monotonic time of the last count
+
+    def __call__(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError: # No loop in this thread, so the count can block
+            now = time.monotonic()
+            if self.counted is None or now - self.counted >= settings.MATCHMAKING_QUEUE_DEPTH_INTERVAL:
+                self.depth, self.counted = MatchmakingQueue.objects.count(), now
+        return {(): self.depth}
+
+
+QUEUE_DEPTH = metrics.gauge('matchmaking_queue_depth', 'Users waiting in the matchmaking queue', function=QueueDepth())
+
+
+def action_label(action):
+    ''' The metric label of a message's action, from a fixed set so a client can't create series '''
+    return action if isinstance(action, str) and action in MESSAGE_ACTIONS else 'other'
+
+
+class InstrumentedConsumer(AsyncWebsocketConsumer):
+    '''Base consumer that records connection and message metrics under its class name'''
+
+    async def websocket_connect(self, message):
+        start_loop_monitor()
+        start_reaper()
+        start_stats_flusher()
+        WS_CONNECTIONS.inc(type(self).__name__)
+        await super().websocket_connect(message)
+
+    async def websocket_disconnect(self, message):
+        WS_DISCONNECTIONS.inc(type(self).__name__)
+        await super().websocket_disconnect(message)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        WS_MESSAGES_SENT.inc(type(self).__name__)
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    async def group_send(self, group, message):
+        '''Send an event to a channel layer group, recording how long the layer took'''
+        start = time.perf_counter()
+        await self.channel_layer.group_send(group, message)
+        CHANNEL_SEND_LATENCY.observe(time.perf_counter() - start, message['type'])
+
+
+class MatchmakingConsumer(InstrumentedConsumer):
     ''''
     Class that handles the matchmaking process for users. It adds users to the queue and pairs them with an opponent.
     '''
@@ -29,6 +167,8 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         '''Leave the group and queue when the socket is disconnected.'''
+        if getattr(self, 'heartbeat_task', None):
+            self.heartbeat_task.cancel()
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
@@ -40,15 +180,24 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
 
         user_in_queue, created = await self.get_or_create_queue_entry(user) # If the user is not already in the queue, use the create keyword to add them
         if not created:
-            await self.send(json.dumps({'message': 'You are already in the queue.'}))
+            await self.send(encode_text({'message': 'You are already in the queue.'}))
             return
 
         opponent = await self.get_opponent(user) # Attempt to match them with an opponent already in the queue
         if opponent:
+            TIME_TO_MATCH.observe((timezone.now() - opponent.timestamp).total_seconds()) # Only the opponent waited, the user joining was matched at once
             await self.notify_users_game_started(user, opponent.user)  # Single call for both users to start
             await self.remove_users_from_queue([user, opponent.user]) # Remove both users from the queue once they're matched
         else:
-            await self.send(json.dumps({'message': 'You are now in the waiting list. Searching for an opponent.'})) # Otherwise notify the user that they're in the queue
+            await self.send(encode_text({'message': 'You are now in the waiting list. Searching for an opponent.'})) # Otherwise notify the user that they're in the queue
+            self.heartbeat_task = asyncio.create_task(self.heartbeat(user))
+
+    async def heartbeat(self, user):
+        '''Keep the user's queue entry alive while they wait, so the reaper only expires entries whose consumer is gone'''
+        while True:
+            await asyncio.sleep(settings.MATCHMAKING_HEARTBEAT_INTERVAL)
+            if not await self.touch_queue_entry(user): # Matched (or removed), nothing left to keep alive
+                return
 
     async def notify_users_game_started(self, player_one, player_two):
         '''Notify both players that the game is starting.'''
@@ -61,7 +210,7 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
         }
 
         # Notify both players using a single call each with direct dictionary passing
-        await self.channel_layer.group_send(
+        await self.group_send(
             f'user_{player_one.id}',
             {
                 'type': 'game_message',
@@ -69,7 +218,7 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
             }
         )
 
-        await self.channel_layer.group_send(
+        await self.group_send(
             f'user_{player_two.id}',
             {
                 'type': 'game_message',
@@ -81,44 +230,62 @@ class MatchmakingConsumer(AsyncWebsocketConsumer):
     async def game_message(self, event):
         '''Send the message to the client that the game is starting'''
         # Convert the message dictionary directly back to JSON for sending to the client
-        message_json = json.dumps(event['message'])
+        message_json = encode_text(event['message'])
         await self.send(text_data=message_json)
 
     # The following functions are database operations that run asynchronously as we need to clean up database connections
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def get_or_create_queue_entry(self, user):
-        '''Get or create a matchmaking queue entry for the user'''
-        return MatchmakingQueue.objects.get_or_create(user=user)
-
-    @database_sync_to_async
+        '''Get or create a matchmaking queue entry for the user. An expired entry left by a dead consumer is taken over as new'''
+        entry, created = MatchmakingQueue.objects.get_or_create(user=user)
+        if not created and MatchmakingQueue.objects.filter(pk=entry.pk, last_seen__lt=self.heartbeat_cutoff()).update(last_seen=timezone.now()):
+            created = True
+        return entry, created
+
+    @timed_database_sync_to_async
+    def touch_queue_entry(self, user):
+        '''Refresh the heartbeat of the user's queue entry, returning whether it still exists'''
+        return MatchmakingQueue.objects.filter(user=user).update(last_seen=timezone.now())
+
+    def heartbeat_cutoff(self):
+        '''Entries last seen before this have expired'''
+        return timezone.now() - timedelta(seconds=heartbeat_timeout())
+
+    @timed_database_sync_to_async
     def get_opponent(self, user):
-        '''Get an opponent for the user from the matchmaking queue'''
-        return MatchmakingQueue.objects.exclude(user=user).select_related('user').first() # Specify the user accessing the consumer
+        '''Get an opponent for the user from the matchmaking queue, ignoring expired entries the reaper hasn't removed yet'''
+        return MatchmakingQueue.objects.exclude(user=user).filter(last_seen__gte=self.heartbeat_cutoff()).select_related('user').first() # Specify the user accessing the consumer
 
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def create_game(self, player_one, player_two):
-        '''Create a new Trivia row with both players and return the game id.'''
-        new_game = Trivia.objects.create(player_one=player_one, player_two=player_two, is_active=True)
+        '''Create a new Trivia row with both players and their questions, and return the game id.'''
+        question_ids = choose_questions([player_one, player_two], QUESTIONS_PER_MATCH) # Questions neither player has seen recently
+        new_game = Trivia.objects.create(player_one=player_one, player_two=player_two, is_active=True, question_ids=question_ids)
         return new_game.gameID
 
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def remove_users_from_queue(self, users):
         '''Remove the row of users from the matchmaking queue'''
-        MatchmakingQueue.objects.filter(user__in=users).delete() # Removes users when the game is starting
+        deleted, _ = MatchmakingQueue.objects.filter(user__in=users).delete() # Removes users when the game is starting
+        return deleted
 
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def remove_from_queue(self, user):
         '''Remove the user from the matchmaking queue if they leave the page or disconnect'''
-        MatchmakingQueue.objects.filter(user=user).delete()
+        deleted, _ = MatchmakingQueue.objects.filter(user=user).delete()
+        return deleted
 
 
-class TriviaGameConsumer(AsyncWebsocketConsumer):
+class TriviaGameConsumer(InstrumentedConsumer):
     '''Class that handles the gameplay of a session between two users.'''
 
+    game_duration = 60 # Length of a match in seconds
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.user_data = {}  # Dictionary to store each user's data
         self.end_game_lock = asyncio.Lock() # Lock to prevent multiple calls to end_game (race)
+        self.question_sent = {} # Question id -> when it was sent, to time the answer
 
     async def connect(self):
         '''Called when the users are ready to start playing the game'''
@@ -138,19 +305,20 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
         '''Called when a message is received from the client'''
 
         data = json.loads(text_data) # Unpack the data as a JSON object
+        WS_MESSAGES_RECEIVED.inc(type(self).__name__, action_label(data.get('action')))
         if data.get('action') == 'submit_answer':
             user = self.scope["user"] # Get the user who made the call
             if user not in self.user_data:  # Initialize the user's data if it's not already done
                 self.user_data[user] = {'question_count': 0, 'correct_answers': 0, 'current_question_index': 0}
 
-            if self.user_data[user]['question_count'] >= 10:  # If the user has already answered 10 questions
-                await self.send(text_data=json.dumps({
+            if self.user_data[user]['question_count'] >= QUESTIONS_PER_MATCH:  # If the user has already answered 10 questions
+                await self.send(text_data=encode_text({
                     'message': 'You have already answered all questions'
                 }))
                 return
 
             if self.game_end:  # If the game has ended, ignore the answer and return a message
-                await self.send(text_data=json.dumps({
+                await self.send(text_data=encode_text({
                     'message': 'Invalid game session'
                 }))
                 return
@@ -163,7 +331,7 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
                     self.user_data[user]['current_question_index'] += 1  # Increment the question index for the user
                     await self.send_question(self.questions[self.user_data[user]['current_question_index']], user)  # Send the next question
                 else:
-                    await self.send(text_data=json.dumps({
+                    await self.send(text_data=encode_text({
                         'message': 'You have answered all questions. Wait for the results.'
                     }))
 
@@ -172,9 +340,9 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
 
         while not self.game_end: # Only send the tick if the game has not ended
             elapsed_time = time.time() - self.game_start_time
-            remaining_time = max(60 - elapsed_time, 0)
+            remaining_time = max(self.game_duration - elapsed_time, 0)
             remaining_time_rounded = round(remaining_time)
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=encode_text({
                 'remaining_time': remaining_time_rounded
             }))
             await asyncio.sleep(1) # Wait for 1 second before sending the next tick
@@ -186,6 +354,7 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
 
         # Start the game timer for 60 seconds
         self.game_start_time = time.time()
+        active_matches.setdefault(self.scope['url_route']['kwargs']['game_id'], self.game_start_time) # Only the first player's consumer starts the clock
         asyncio.create_task(self.end_game_timer())
 
         # Start sending remaining time every second
@@ -199,17 +368,18 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
             self.user_data[player_two] = {'question_count': 0, 'correct_answers': 0, 'current_question_index': 0}
             # Set the initial user data at the start of the game
 
-        self.questions = await self.load_questions()  # Load the questions
+        self.questions = await self.load_questions(game)  # Load the questions
         for user in self.user_data.keys():
             await self.send_question(self.questions[0], user)  # Send the first question to each user
 
         # Send the game start message
-        await self.send(text_data=json.dumps({'message': 'The game has started. Go!'}))
+        await self.send(text_data=encode_text({'message': 'The game has started. Go!'}))
 
     async def send_question(self, question, user):
         '''Send a question to a user'''
 
-        await self.send(text_data=json.dumps({
+        self.question_sent.setdefault(question.id, time.monotonic())
+        await self.send(text_data=encode_text({
             'question': question.question,
             'question_id': question.id, # Allow the user to use the question id to send an answer
             'index': self.user_data[user]['question_count']+1, # Incerement the index to give the next question
@@ -219,10 +389,13 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
         '''Check if the answer is correct and update the score and index'''
 
         correct = await self.is_correct_answer(question_id, answer)
+        if question_id in self.question_sent: # Only the questions this match asked count towards their statistics
+            question_stats.record(question_id, correct, time.monotonic() - self.question_sent[question_id])
+        guess_log.record('trivia', question_id, user.pk, correct, 1, answer)
         if correct: # Modify relevant scoped variables if the answer is correct
             self.user_data[user]['correct_answers'] += 1
             await self.update_score(user)
-        await self.send(text_data=json.dumps({ # Send the result of the answer to the user
+        await self.send(text_data=encode_text({ # Send the result of the answer to the user
             'result': 'correct' if correct else 'incorrect',
             'question_count': self.user_data[user]['question_count'],
             'correct_answers': self.user_data[user]['correct_answers']
@@ -231,7 +404,7 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
     async def end_game_timer(self):
         '''Delay the game end for 60 seconds after the game starts'''
 
-        await asyncio.sleep(60)  # Wait for 60 seconds before ending the game
+        await asyncio.sleep(self.game_duration)  # Wait for 60 seconds before ending the game
         if not self.game_end:
             await self.end_game()
 
@@ -243,18 +416,22 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
                 return
             self.game_end = True  # Set the game end flag to True
 
+            started = active_matches.pop(self.scope['url_route']['kwargs']['game_id'], None)
+            if started is not None: # Only the first player's consumer to end the match records it
+                MATCH_DURATION.observe(time.time() - started)
+
             # Fetch the game instance and finalize it
             game = await self.get_game()
-            await database_sync_to_async(game.finalize_game)()
+            await timed_database_sync_to_async(game.finalize_game)()
 
             # Fetch the players from the game instance
             player_one = game.player_one
             player_two = game.player_two
 
             # Determine the game result message
-            result = await database_sync_to_async(getattr)(game, 'result') # Ensure we use sync_to_async for consistency
+            result = await timed_database_sync_to_async(getattr)(game, 'result') # Ensure we use sync_to_async for consistency
             if result is not None:
-                result = await database_sync_to_async(getattr)(result, 'username') # Get the winner's username (if any)
+                result = await timed_database_sync_to_async(getattr)(result, 'username') # Get the winner's username (if any)
 
             # Possible cases for the winner/drawer/loser
             if result == player_one.username:
@@ -275,7 +452,7 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
 
             # Send the game over message to each player
             for user, message in result_message.items():
-                await self.channel_layer.group_send(self.room_group_name, {  # Use the group name
+                await self.group_send(self.room_group_name, {  # Use the group name
                     'type': 'game_message',
                     'game_over': True,
                     'user': user,  # Add a 'user' field to the message to identify the recipient
@@ -286,15 +463,16 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
     async def is_correct_answer(self, question_id, answer):
         '''Check if the answer is correct for the given question id'''
 
-        question = await sync_to_async(TriviaBank.objects.get)(id=question_id)
-        correct_answers = question.answer
-        return any(correct_answer.upper() == answer.upper() for correct_answer in correct_answers) # Make comparison case-insensitive
+        question = next((question for question in getattr(self, 'questions', ()) if question.id == question_id), None) # Usually one of the match's
+        if question is None:
+            question = await timed_database_sync_to_async(question_bank.get)(question_id)
+        return question is not None and answer.upper() in question.answers # The accepted answers are upper-cased, so the comparison is case-insensitive
 
     async def get_game(self):
         '''Get the game instance id for the current game'''
 
         game_id = self.scope['url_route']['kwargs']['game_id']
-        game = await database_sync_to_async(Trivia.objects.prefetch_related(
+        game = await timed_database_sync_to_async(Trivia.objects.prefetch_related(
             Prefetch('player_one'),
             Prefetch('player_two'),
         ).get)(gameID=game_id) # Retrieve the particular game id for the session that exists between the two players (prefetch)
@@ -304,7 +482,7 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
         '''Send the game message to the client based on the user scope'''
 
         if event['user'] == self.scope['user'].username: # Make sure we are sending the message to the right user
-            await self.send(text_data=json.dumps(event))
+            await self.send(text_data=encode_text(event))
 
     @sync_to_async
     def get_result(self, game):
@@ -313,7 +491,7 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
 
         return game.result
 
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def update_score(self, user):
         '''Update the score of the user in the game instance'''
 
@@ -328,13 +506,14 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
             game.score_playerTwo += 1
         game.save()
 
-    @database_sync_to_async
-    def load_questions(self):
-        '''Retrieve 10 random questions from the database'''
+    @timed_database_sync_to_async
+    def load_questions(self, game):
+        '''Retrieve the match's questions from the question bank cache (only reads the database when it's reloading)'''
 
-        return list(TriviaBank.objects.order_by('?')[:10])  # Randomly select 10 questions from the trivia bank
+        questions = [question for question in map(question_bank.get, game.question_ids) if question is not None] # Skips questions deleted since
+        return questions or question_bank.sample(QUESTIONS_PER_MATCH) # Matches created before questions were chosen up front
 
-    @database_sync_to_async
+    @timed_database_sync_to_async
     def check_game_ready(self):
         '''Check if the row has been created in the Trivia model with game id'''
         
@@ -343,4 +522,108 @@ class TriviaGameConsumer(AsyncWebsocketConsumer):
             game = Trivia.objects.get(gameID=game_id)
         except Trivia.DoesNotExist:
             return False  # Return False if the game does not exist
-        return game.player_one is not None and game.player_two is not None # Return True only if both players are set
\ No newline at end of file
+        return game.player_one is not None and game.player_two is not None # Return True only if both players are set
+
+class SoloGameConsumer(InstrumentedConsumer):
+    '''
+    Plays a started solo game over a websocket (ws/solo/<game type>/<game id>/), as an alternative to a POST per guess.
+    The user is authenticated and the game loaded once when the socket connects, then every guess is played in memory and
+    answered straight away. The game is written behind the guesses, at most every SOLO_WRITE_BEHIND_INTERVAL seconds, when it
+    ends and when the socket closes, so guesses made in the last interval before a worker is killed are lost.
+    Guesses sent over HTTP at the same time win: a write that would move the game's row backwards is skipped.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.game = None
+        self.dirty = 0 # Guesses played since the last write
+        self.finalized = False
+        self.write_task = None
+        self.write_lock = asyncio.Lock()
+
+    async def connect(self):
+        '''Accept the socket, then send the game's state (or the reason it can't be played, and close)'''
+
+        user, kwargs = self.scope['user'], self.scope['url_route']['kwargs']
+        await self.accept()
+        if not user.is_authenticated or kwargs['game_type'] not in SOLO_GAMES:
+            await self.send(text_data=encode_text({'error': 'Unauthorized' if not user.is_authenticated else 'Invalid game type provided'}))
+            await self.close(code=4403)
+            return
+
+        game = SOLO_GAMES[kwargs['game_type']](user, kwargs['game_id'])
+        error = await blocking(game.load)
+        if error is not None:
+            await self.send(text_data=encode_text(error))
+            await self.close(code=4404)
+            return
+        self.game = game
+        await self.send(text_data=encode_text({'message': 'Connected', 'guesses_left': game.max_guesses - game.session.guesses, **game.state()}))
+
+    async def disconnect(self, close_code):
+        '''Write whatever the last interval played'''
+        if self.write_task is not None:
+            self.write_task.cancel()
+        if self.game is not None:
+            await self.write()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        '''Play a guess ({"action": "guess", "guess": ...}) or a batch of guesses ({"action": "guesses", "guesses": [...]})'''
+
+        try:
+            data = json.loads(text_data)
+            action = data.get('action')
+        except (ValueError, TypeError, AttributeError): # Not JSON, a binary frame, or not an object
+            data = action = None
+        WS_MESSAGES_RECEIVED.inc(type(self).__name__, action_label(action))
+        if self.game is None:
+            return
+        if data is None:
+            await self.send(text_data=encode_text({'error': 'Expected a JSON object.'}))
+            return
+        if action == 'guess':
+            guesses = [data.get('guess', '')] if isinstance(data.get('guess', ''), str) else None
+        elif action == 'guesses':
+            guesses = read_guesses(text_data, self.game.max_guesses)
+        else:
+            await self.send(text_data=encode_text({'error': 'Unknown action'}))
+            return
+        if guesses is None:
+            await self.send(text_data=encode_text({'error': f'Expected a list of 1 to {self.game.max_guesses} guesses.'}))
+            return
+
+        results, played = self.game.play(guesses)
+        record_guesses(self.game.name, self.game.game_id, self.game.user, played)
+        if action == 'guess':
+            await self.send(text_data=encode_text(self.game.response(results[0])))
+        elif played:
+            await self.send(text_data=encode_text(final_state(results, **self.game.state())))
+        else:
+            await self.send(text_data=encode_text(results[0])) # Nothing could be played, as a batch over HTTP would answer
+
+        if played:
+            self.dirty += len(played)
+            if self.game.over():
+                await self.write() # The result is recorded before anything else is read from this socket
+            elif self.write_task is None or self.write_task.done():
+                self.write_task = asyncio.create_task(self.write_later())
+
+    async def write_later(self):
+        await asyncio.sleep(settings.SOLO_WRITE_BEHIND_INTERVAL)
+        await self.write()
+
+    async def write(self):
+        '''Write a snapshot of the game, finalizing it once it's over. A failed write is retried by the next one'''
+        async with self.write_lock:
+            if not self.dirty or self.finalized:
+                return
+            dirty, self.dirty = self.dirty, 0
+            finalize = self.game.over()
+            try:
+                await blocking(self.game.store, self.game.snapshot(), finalize)
+            except Exception:
+                self.dirty += dirty
+                logger.exception('Solo game write failed (%s %s)', self.game.name, self.game.game_id)
+                return
+            self.finalized = finalize
+            SOLO_WRITE_BEHIND.observe(dirty, self.game.name)
@@ -0,0 +1,81 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from api import http_cache, metrics
+
+# Read-through cache of solo game content, which only changes with a content release. Each game is compiled once (by the
+# cache's load function) into an immutable payload, kept in a per worker LRU of CONTENT_CACHE_SIZE games and backed by the
+# shared cache, so a worker missing a game rarely reads the database.
+#
+# Changes to the content bump the cache's version stamp in the shared cache (bump_version), which is part of the shared keys.
+# Workers read it at most every CONTENT_CACHE_CHECK_INTERVAL seconds, and drop their LRU when it changed.
+
+SHARED_TIMEOUT = 7 * 86400 # Seconds a payload stays in the shared cache (keys of old versions are simply never read again)
+
+CONTENT_LOOKUPS = metrics.counter('content_cache_lookups_total', 'Solo game payloads looked up, by where they were found', ('cache', 'source'))
+
+
+class ContentCache:
+    ''' LRU of compiled game payloads, safe to share between the threads of a worker '''
+
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load # Game id -> payload, or None when there's no such game
+        self.lock = threading.Lock()
+        self.entries = OrderedDict() # Game id -> payload, least recently used first
+        self.version = None
+        self.checked = 0 # When the version stamp was last read (monotonic)
+
+    def bump_version(self):
+        ''' Tell every worker to drop its cached payloads (called after the content was edited) '''
+        cache.set(f'{self.name}_version', uuid.uuid4().hex, timeout=None)
+        http_cache.bump_version(f'content:{self.name}') # The game listings change with the content
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.checked = 0
+
+    def get(self, game_id):
+        ''' The payload of a game, or None when there's no such game '''
+        with self.lock:
+            self.refresh()
+            payload = self.entries.get(game_id)
+            if payload is not None:
+                self.entries.move_to_end(game_id)
+                CONTENT_LOOKUPS.inc(self.name, 'local')
+                return payload
+            version = self.version
+
+        key = f'{self.name}:{version}:{game_id}'
+        payload = cache.get(key)
+        if payload is not None:
+            CONTENT_LOOKUPS.inc(self.name, 'shared')
+        else:
+            payload = self.load(game_id)
+            CONTENT_LOOKUPS.inc(self.name, 'database')
+            if payload is None:
+                return None
+            cache.set(key, payload, timeout=SHARED_TIMEOUT)
+
+        with self.lock:
+            if version == self.version: # Not stale by a reload in the meantime
+                self.entries[game_id] = payload
+                while len(self.entries) > settings.CONTENT_CACHE_SIZE:
+                    self.entries.popitem(last=False)
+        return payload
+
+    def refresh(self):
+        ''' Drop every payload when the version stamp changed, reading it at most every CONTENT_CACHE_CHECK_INTERVAL seconds. Called with the lock held '''
+        now = time.monotonic()
+        if self.checked and now - self.checked < settings.CONTENT_CACHE_CHECK_INTERVAL:
+            return
+        self.checked = now
+        version = cache.get(f'{self.name}_version')
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
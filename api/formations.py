@@ -0,0 +1,54 @@
+from collections import namedtuple
+from api.content_cache import ContentCache
+from api.models import ClubBank, FormationBank
+from api.responses import RawJSON, dumps
+
+# Compiled guess the side games. A club's eleven is compiled once into a template: every player's JSON, hidden and revealed,
+# and an index of every lower-cased name to the slots of the players known by it. A user's progress is then just a mask with
+# a bit per guessed slot (kept in the cache under guess_the_side_key), a guess is a dictionary lookup, and a response joins the
+# pre-rendered players the mask selects. Changing clubs or formations must call formations.bump_version().
+#
+# A slot is the player's position in id order, so a template reloaded (after an LRU eviction or a shared cache expiry) gives
+# every mask the same players. Adding or removing a club's players shifts the slots though, and the masks of the games in
+# progress then reveal the wrong players once the bumped version is loaded.
+
+FormationTemplate = namedtuple('FormationTemplate', 'team_name description size aliases hidden revealed full')
+
+
+def load_formation(game_id):
+    ''' The template of a club's formation, or None when there's no such club '''
+    club = ClubBank.objects.filter(id=game_id).values_list('team_name', 'description').first()
+    if club is None:
+        return None
+    players = list(FormationBank.objects.filter(club_id=game_id).order_by('id').values('player_names', 'position')) # Slots are stable across reloads
+    aliases = {}
+    for slot, player in enumerate(players):
+        for name in player['player_names']:
+            aliases[name.lower()] = aliases.get(name.lower(), 0) | 1 << slot
+    return FormationTemplate(
+        *club, len(players), aliases,
+        tuple(RawJSON(dumps({'position': player['position'], 'playerNames': [], 'guessed': False})) for player in players),
+        tuple(RawJSON(dumps({'position': player['position'], 'playerNames': player['player_names'], 'guessed': True})) for player in players),
+        RawJSON(dumps([{'position': player['position'], 'playerNames': player['player_names']} for player in players])),
+    )
+
+
+def formation_mask(state):
+    ''' The guessed slots of a cached game state, None when it expired. Games started before masks were kept hold a list of players '''
+    if state is None or isinstance(state, int):
+        return state
+    return sum(1 << slot for slot, player in enumerate(state) if player['guessed']) if state else None
+
+
+def guess_players(template, mask, user_guess):
+    ''' Mark every player known by the guessed name. Returns the new mask and how many players were newly guessed '''
+    newly_guessed = template.aliases.get(user_guess.lower(), 0) & ~mask
+    return mask | newly_guessed, newly_guessed.bit_count()
+
+
+def masked_formation(template, mask):
+    ''' The formation as shown to the user, hiding the names of players that have not been guessed yet '''
+    return RawJSON(b'[' + b', '.join(template.revealed[slot] if mask >> slot & 1 else template.hidden[slot] for slot in range(template.size)) + b']')
+
+
+formations = ContentCache('formation', load_formation)
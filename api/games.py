@@ -0,0 +1,289 @@
+import glob
+import json
+import os
+from django.conf import settings
+from django.core.cache import cache
+from .models import UserHistory, BoxToBox, GuessTheSide, CareerPath, GameProgress
+from .responses import json_response
+from .http_cache import bump_leaderboard, listing_validators, not_modified, with_validators, LISTING_CACHE_CONTROL
+from .formations import guess_players
+
+# Rules of the solo games, shared by the sync and async views so both keep the same behaviour
+
+BOX2BOX_GUESSES = BoxToBox.invariants.bounds['guesses'][1] # Attempts allowed per game, bounded by the session models
+CAREER_PATH_GUESSES = CareerPath.invariants.bounds['guesses'][1]
+GUESS_THE_SIDE_GUESSES = GuessTheSide.invariants.bounds['guesses'][1]
+
+STATE_TIMEOUT = 86400 # A user has 24 hours to complete a game before the cached state expires and it resets
+
+
+def box2box_keys(game_id, user_id):
+    ''' Cache keys of the box to box answers and grid state. Based on game type -> game id -> user id (Always guarantees uniqueness) '''
+    return f"answers_box2box_{game_id}_{user_id}", f"grid_{game_id}_{user_id}"
+
+
+def guess_the_side_key(game_id, user_id):
+    ''' Cache key of the guess the side formation state '''
+    return f"answers_gts_{game_id}_{user_id}"
+
+
+def box2box_clubs(session):
+    ''' The six clubs of a box to box session, 3 per axis '''
+    return {
+        "x1": session.club_x1,
+        "x2": session.club_x2,
+        "x3": session.club_x3,
+        "y1": session.club_y1,
+        "y2": session.club_y2,
+        "y3": session.club_y3,
+    }
+
+
+def box2box_guess(answers, grid, user_guess):
+    ''' Mark the first cell accepting the guess that hasn't been guessed before. Returns that cell, or None when the guess was wrong '''
+    guess = user_guess.lower()
+    for coord, possible_answers_lists in answers.items():
+        for possible_answers in possible_answers_lists:
+            # Convert both to lowercase before comparing
+            if guess in (answer.lower() for answer in possible_answers) and not grid[coord]: # Make sure the check is case-insesitive and that the answer hasn't been guessed before
+                grid[coord] = True
+                return coord # Stop once the correct answer is found to avoid redundant checks
+    return None
+
+
+def box2box_result_message(correct_scores):
+    ''' Final message of a box to box game, the user wins by filling all nine cells '''
+    if correct_scores == 9:
+        return 'Game over. You won!'
+    return f'Game over. You lost. Correct Scores: {correct_scores}'
+
+
+def career_path_names(player_names):
+    ''' The accepted answers of a career path, in a lower case manner '''
+    return [name.lower() for name in player_names]
+
+
+def career_path_result_message(won, player_names):
+    ''' Final message of a career path game, revealing the player '''
+    if won:
+        return f'Game over. You won! It was {player_names[0]}'
+    return f'Game over. You lost. It was {player_names[0]}'
+
+
+def guess_the_side_result_message(correct_scores):
+    ''' Final message of a guess the side game, the user wins by naming all 11 players '''
+    if correct_scores == 11:
+        return 'Game over. You won!'
+    return f'Game over. You lost. Correct Scores: {correct_scores}'
+
+
+# Playing guesses. Each function applies guesses in order to a session and its state in memory, exactly as that many single
+# guesses would, so the guess and batch guess endpoints share them and only load and store the state around them. A guess
+# made once the game is over gets the response a single guess would get then, and changes nothing. They return the response
+# data of every guess (without the grid or formation) and the (guess, correct, attempt, cell) of the guesses that were played.
+
+EXPIRED = {'error': 'Game session expired or not found.'} # A won game's cached state is dropped once it's finalized
+
+
+def play_box2box(session, answers, grid, guesses):
+    ''' Play box to box guesses, marking the solved cells of the grid '''
+    results, played = [], []
+    for user_guess in guesses:
+        if session.guesses >= BOX2BOX_GUESSES:
+            results.append({'game_over': True, 'message': 'Maximum guesses reached. Game over.'})
+            continue
+        if all(grid.values()):
+            results.append(dict(EXPIRED))
+            continue
+        cell = box2box_guess(answers, grid, user_guess) # Marks the matching cell of the grid, if any
+        correct = cell is not None
+        if correct:
+            session.correct_scores += 1
+        session.guesses += 1
+        game_over = session.guesses >= BOX2BOX_GUESSES or all(grid.values()) # The guesses are used up or all answers are correct
+        result = {'correct': 'yes' if correct else 'no', 'guesses_left': BOX2BOX_GUESSES - session.guesses, 'game_over': game_over}
+        if game_over:
+            result['message'] = box2box_result_message(session.correct_scores)
+        results.append(result)
+        played.append((user_guess, correct, session.guesses, list(answers).index(cell) if correct else -1))
+    return results, played
+
+
+def play_career_path(session, player_names, guesses):
+    ''' Play career path guesses against the lower-cased accepted names '''
+    results, played = [], []
+    for user_guess in guesses:
+        if session.guesses >= CAREER_PATH_GUESSES or session.result:
+            results.append({'game_over': True, 'message': 'No more guesses allowed or game already concluded.'})
+            continue
+        user_guess = user_guess.strip()
+        correct = user_guess.lower() in player_names # Check the guess against the correct answers in a case-insensitive manner
+        if correct:
+            session.result = True
+            session.points_received += 1 # 1 point for a successfull game
+        session.guesses += 1
+        game_over = session.guesses >= CAREER_PATH_GUESSES or correct
+        result = {'correct': 'yes' if correct else 'no', 'guesses_left': CAREER_PATH_GUESSES - session.guesses, 'game_over': game_over}
+        if game_over:
+            result.update({'message': career_path_result_message(correct, player_names), 'total_user_points': session.points_received, 'guesses_left': 0})
+        results.append(result)
+        played.append((user_guess, correct, session.guesses, -1))
+    return results, played
+
+
+def play_guess_the_side(session, template, mask, guesses):
+    ''' Play guess the side guesses against the compiled formation. Also returns the new mask of the guessed players '''
+    results, played = [], []
+    for user_guess in guesses:
+        if session.guesses >= GUESS_THE_SIDE_GUESSES:
+            results.append({'game_over': True, 'message': 'Maximum guesses reached. Game over.'})
+            continue
+        if session.correct_scores == 11:
+            results.append(dict(EXPIRED))
+            continue
+        mask, newly_guessed = guess_players(template, mask, user_guess) # Mark every player of the eleven known by the guessed name
+        correct = newly_guessed > 0
+        session.correct_scores += newly_guessed
+        session.guesses += 1
+        game_over = session.guesses >= GUESS_THE_SIDE_GUESSES or session.correct_scores == 11
+        if session.correct_scores == 11:
+            session.result = True
+        result = {'correct': 'yes' if correct else 'no', 'guesses_left': GUESS_THE_SIDE_GUESSES - session.guesses, 'game_over': game_over}
+        if game_over:
+            result['message'] = guess_the_side_result_message(session.correct_scores)
+        results.append(result)
+        played.append((user_guess, correct, session.guesses, -1))
+    return results, mask, played
+
+
+def read_guesses(body, limit):
+    ''' The guesses of a batch guess request body ({"guesses": [...]}), or None when it isn't a list of 1 to limit strings '''
+    try:
+        guesses = json.loads(body).get('guesses')
+    except (ValueError, AttributeError): # Not JSON, or not an object
+        return None
+    if not isinstance(guesses, list) or not 0 < len(guesses) <= limit or not all(isinstance(guess, str) for guess in guesses):
+        return None
+    return guesses
+
+
+def finalize_box2box(session_id, user):
+    ''' Handle game completion and result updates once the game is finished '''
+    try:
+        box_to_box_session = BoxToBox.objects.get(gameID=session_id, user=user)
+        if box_to_box_session.guesses < BOX2BOX_GUESSES and not box_to_box_session.correct_scores == 9:
+            return  # Ensure game is truly over before finalizing
+
+        # Mark the game as completed, unless another request or socket already did (and recorded the result)
+        if not GameProgress.mark_completed(user, 'box2box', session_id, box_to_box_session.correct_scores):
+            return
+
+        # Retrieve or create the user's history
+        user_history, created = UserHistory.objects.get_or_create(user=user)
+        # Update history based on game completion
+        user_history.matches_played += 1
+        if box_to_box_session.correct_scores == 9:
+            user_history.matches_won += 1
+            user_history.user_points += box_to_box_session.points_received
+        else:
+            user_history.matches_lost += 1
+        user_history.save()
+        bump_leaderboard()
+
+        # Clean up cache after game completion
+        cache.delete_many(list(box2box_keys(session_id, user.id)))
+
+    except BoxToBox.DoesNotExist:
+        pass
+
+
+def finalize_career_path(session_id, user):
+    ''' Finalizes game completion and updates results. '''
+    try:
+        career_path_session = CareerPath.objects.get(gameID=session_id, user=user) # Attempt to locat the game
+        if not career_path_session.result and career_path_session.guesses < CAREER_PATH_GUESSES:
+            return  # Ensure game is really over before marking as completed
+
+        if not GameProgress.mark_completed(user, 'careerPath', session_id, int(career_path_session.result)): # Set the game as completed
+            return # Already completed, its result is recorded
+
+        user_history, created = UserHistory.objects.get_or_create(user=user)
+        user_history.matches_played += 1
+        if career_path_session.result: # 1 point for a win, otherwise a loss is added
+            user_history.matches_won += 1
+            user_history.user_points += career_path_session.points_received
+        else:
+            user_history.matches_lost += 1
+        user_history.save()
+        bump_leaderboard()
+
+    except CareerPath.DoesNotExist:
+        pass
+
+
+def finalize_guess_the_side(session_id, user):
+    ''' Finalizes game completion and updates results. '''
+    try:
+        guess_side_session = GuessTheSide.objects.get(gameID=session_id, user=user) # Retrieve the relevant game session
+        if guess_side_session.guesses < GUESS_THE_SIDE_GUESSES and not guess_side_session.correct_scores == 11:
+            return  # Ensure game is truly over before finalizing
+
+        if not GameProgress.mark_completed(user, 'formations', session_id, guess_side_session.correct_scores): # Mark the game as completed
+            return # Already completed, its result is recorded
+        user_history, created = UserHistory.objects.get_or_create(user=user)
+        user_history.matches_played += 1
+        if guess_side_session.result:
+            user_history.matches_won += 1
+        else:
+            user_history.matches_lost += 1
+        user_history.user_points += guess_side_session.points_received
+        user_history.save()
+        bump_leaderboard()
+        cache.delete(guess_the_side_key(session_id, user.id)) # Remove the cache after the game is completed
+
+    except GuessTheSide.DoesNotExist:
+        pass
+
+
+def get_new_game(game_type, game_id):
+    ''' Find the game of choice based on the game type'''
+    try:
+        game_file_path = os.path.join(settings.GAME_FILES_DIR, game_type, f'{game_id}.json') # Access the game directory in the application
+        with open(game_file_path, 'r') as game_file:
+            game_data = json.load(game_file) # Attempt to load the game data stored in JSON
+        return game_data
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print("An error occurred while fetching the game: ", str(e))
+
+
+def get_all_games(request, game_type):
+    '''Return all the games available for one type in JSON format'''
+
+    if game_type not in ["box2box", "careerPath", "formations"]: # Must be one of these three game types
+        return json_response({'error': 'Invalid game type provided'}, status=400)
+
+    validators = listing_validators(request.user, game_type)
+    response = not_modified(request, validators, LISTING_CACHE_CONTROL) # The listing didn't change since the client's copy
+    if response is not None:
+        return response
+
+    try:
+        game_files_dir = os.path.join(settings.GAME_FILES_DIR, str(game_type)) # Access the directory for the game type
+        game_files = glob.glob(os.path.join(game_files_dir, "*.json")) # Use glob to match file patterns
+        if not game_files:
+            return json_response({'error': 'No games found'}, status=404)
+
+        game_names = [os.path.splitext(os.path.basename(file))[0] for file in game_files]
+        games_info = [] # Holds all info about each game
+        completed_ids = GameProgress.completed_ids(request.user, game_type) if request.user.is_authenticated else set() # Read once for every game
+
+        for game in game_names:
+            status = "completed" if int(game) in completed_ids else "available"
+            games_info.append({"game_id": game, "status": status}) # Games are either available or completed
+
+        return with_validators(json_response({'games': games_info}), validators, LISTING_CACHE_CONTROL)
+
+    except Exception as e:
+        return json_response({'error': 'An error occurred while fetching games: ' + str(e)}, status=500)
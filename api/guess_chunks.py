@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import numpy as np
+from api.guess_log import RECORD, chunk_dir, spool_dir, spool_hour
+
+# Readers of the guess log (guess_log.py): rolling the spool files into column chunks, and the per item statistics of the
+# chunks. Kept apart from the writer so the workers only load numpy when they roll or aggregate the log.
+
+EVENT_DTYPE = np.dtype([
+    ('time', '<f8'), # Unix time of the guess
+    ('game', 'u1'),
+    ('item', '<i4'), # Question id, or game id of the solo games
+    ('cell', 'i1'), # Box to box cell solved by the guess, -1 otherwise
+    ('user', '<i4'),
+    ('correct', '?'),
+    ('attempt', '<i2'), # Guess number within the game (1 for trivia answers)
+    ('answer', '<u8'), # answer_hash of the guess
+])
+assert EVENT_DTYPE.itemsize == RECORD.size # The spool records are written with RECORD
+
+
+def roll(include_current=False):
+    '''
+    Turn the spool files of finished hours into column chunks, returning how many guesses were rolled. The current hour (and
+    the first minutes of the next, while writers finish their last flush) is left alone unless include_current is set
+    '''
+    rolled = 0
+    cutoff = spool_hour(datetime.now(timezone.utc) - timedelta(minutes=5))
+    for events_path in sorted(spool_dir().glob('*.events')):
+        if not include_current and events_path.name[:10] >= cutoff:
+            continue
+        data = events_path.read_bytes()
+        records = np.frombuffer(data, dtype=EVENT_DTYPE, count=len(data) // EVENT_DTYPE.itemsize)
+        chunk = chunk_dir() / events_path.stem
+        partial = chunk.with_name(chunk.name + '.partial')
+        partial.mkdir(parents=True, exist_ok=True)
+        for column in EVENT_DTYPE.names:
+            np.save(partial / f'{column}.npy', np.ascontiguousarray(records[column]))
+        answers_path = events_path.with_name(f'{events_path.stem}.answers')
+        if answers_path.exists():
+            answers_path.replace(partial / 'answers.tsv')
+        partial.rename(chunk) # Readers only ever see complete chunks
+        events_path.unlink()
+        rolled += len(records)
+    return rolled
+
+
+def chunks(directory=None):
+    ''' The complete chunk directories '''
+    directory = Path(directory) if directory else chunk_dir()
+    return sorted(path for path in directory.glob('*') if path.is_dir() and not path.name.endswith('.partial'))
+
+
+def group_sum(keys, values):
+    ''' Sort by the key arrays together, returning each distinct key and the sum of each value array over it '''
+    if not len(keys[0]):
+        return [key[:0] for key in keys], [value[:0] for value in values]
+    order = np.argsort(keys[0], kind='stable') if len(keys) == 1 else np.lexsort(keys[::-1]) # lexsort sorts by its last key first
+    keys = [key[order] for key in keys]
+    change = np.zeros(len(order), dtype=bool)
+    change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(change)
+    return [key[starts] for key in keys], [np.add.reduceat(value[order], starts) for value in values]
+
+
+def item_keys(game, item):
+    return (game.astype(np.int64) << 40) | item.astype(np.int64)
+
+
+def split_item_key(keys):
+    return (keys >> 40).astype(np.int64), keys & ((1 << 40) - 1)
+
+
+def aggregate(chunk_paths):
+    '''
+    Per item statistics over every chunk, summed a chunk at a time so memory stays bounded by the largest chunk and the number of
+    distinct items and wrong answers. Returns the items (attempts, correct guesses, summed attempt numbers of the solving
+    guesses), the box to box cells (times solved, summed attempt numbers) and the wrong answers (times given), each as a dict
+    of arrays sorted by key
+    '''
+    items, cells, wrong = [], [], []
+    for path in chunk_paths:
+        column = {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in ('game', 'item', 'cell', 'correct', 'attempt', 'answer')}
+        key = item_keys(column['game'], column['item'])
+        correct = np.asarray(column['correct'])
+        attempt = np.asarray(column['attempt'], dtype=np.int64)
+        ones = np.ones(len(key), dtype=np.int64)
+        items.append(group_sum([key], [ones, correct.astype(np.int64), attempt * correct]))
+        solved = np.asarray(column['cell']) >= 0
+        cells.append(group_sum([key[solved], np.asarray(column['cell'], dtype=np.int64)[solved]], [ones[solved], attempt[solved]]))
+        wrong.append(group_sum([key[~correct], np.asarray(column['answer'])[~correct]], [ones[~correct]]))
+
+    def combine(parts, key_count, value_count):
+        ''' Sum the per chunk results sharing a key '''
+        if not parts:
+            return [np.zeros(0, dtype=np.int64)] * key_count, [np.zeros(0, dtype=np.int64)] * value_count
+        return group_sum([np.concatenate([keys[i] for keys, _ in parts]) for i in range(key_count)],
+                         [np.concatenate([values[i] for _, values in parts]) for i in range(value_count)])
+
+    (item_key,), (attempts, correct, solve) = combine(items, 1, 3)
+    (cell_key, cell), (cell_solved, cell_solve) = combine(cells, 2, 2)
+    (wrong_key, wrong_answer), (wrong_count,) = combine(wrong, 2, 1)
+    return (
+        {'key': item_key, 'attempts': attempts, 'correct': correct, 'solve_attempts': solve},
+        {'key': cell_key, 'cell': cell, 'solved': cell_solved, 'solve_attempts': cell_solve},
+        {'key': wrong_key, 'answer': wrong_answer, 'count': wrong_count},
+    )
+
+
+def answer_texts(chunk_paths, hashes):
+    ''' The text of the wanted answer hashes, from the chunks' answer files '''
+    wanted, texts = {int(hashed) for hashed in hashes}, {}
+    for path in chunk_paths:
+        answers_path = path / 'answers.tsv'
+        if not answers_path.exists():
+            continue
+        with open(answers_path, encoding='utf-8') as file:
+            for line in file:
+                hashed, _, text = line.rstrip('\n').partition('\t')
+                if int(hashed) in wanted:
+                    texts[int(hashed)] = text
+    return texts
@@ -0,0 +1,130 @@
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from django.conf import settings
+from api import metrics
+
+# Append-only log of every guess made in the games, kept to find the questions, cells, careers and formations that are too
+# easy or too hard. Recording a guess only puts a tuple on a queue; a writer thread per process appends the queued guesses
+# every GUESS_LOG_FLUSH_INTERVAL seconds to a spool file of fixed size binary records, one file per process and hour. The
+# roll_guess_log command turns finished spool files into chunks of one .npy file per column (guess_chunks.py), which
+# guess_analytics reads memory mapped. Guesses still queued when a worker is killed are lost. Writing the records takes no
+# numpy, which is only loaded by the readers.
+#
+# Answers are stored as a 64 bit hash of their normalised text. The text of wrong answers is written once per process to an
+# .answers file next to the spool file, so the most common wrong answers can be shown.
+
+logger = logging.getLogger('api.performance')
+
+GAMES = ('trivia', 'box2box', 'careerPath', 'formations') # Stored as their position
+RECORD = struct.Struct('<dBibi?hQ') # A spool record, laid out as guess_chunks.EVENT_DTYPE
+MAX_QUEUED = 100_000 # Guesses dropped beyond this many waiting for the writer
+MAX_NAMED = 1_000_000 # Answer hashes remembered as already written to the answers file
+
+GUESSES_LOGGED = metrics.counter('guess_log_events_total', 'Guesses written to the guess log', ('game',))
+GUESSES_DROPPED = metrics.counter('guess_log_dropped_total', 'Guesses dropped because the writer fell behind or failed')
+
+
+def normalise(answer):
+    return ' '.join(str(answer).lower().split())[:100]
+
+
+def answer_hash(answer):
+    ''' Stable hash of the normalised answer (Python's hash() differs between processes) '''
+    return int.from_bytes(hashlib.blake2b(normalise(answer).encode(), digest_size=8).digest(), 'little')
+
+
+def spool_dir():
+    return Path(settings.GUESS_LOG_DIR) / 'spool'
+
+
+def chunk_dir():
+    return Path(settings.GUESS_LOG_DIR) / 'chunks'
+
+
+def spool_hour(moment):
+    return f'{moment:%Y%m%d%H}'
+
+
+class GuessLog:
+    ''' Queue of guesses and the thread writing them to the spool '''
+
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.named = set() # Hashes whose text this process already wrote
+        atexit.register(self.flush)
+
+    def record(self, game, item, user_id, correct, attempt, answer, cell=-1):
+        ''' Queue a guess for the writer. Never blocks, and never fails the request making the guess '''
+        if not settings.GUESS_LOG_DIR:
+            return
+        if self.queue.qsize() >= MAX_QUEUED:
+            GUESSES_DROPPED.inc()
+            return
+        self.queue.put((time.time(), GAMES.index(game), item, cell, user_id or 0, bool(correct), attempt, answer))
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='guess-log-writer', daemon=True)
+                    self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(settings.GUESS_LOG_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Guess log write failed')
+
+    def flush(self):
+        ''' Append every queued guess to this process's spool file of the current hour '''
+        events = []
+        try:
+            while True:
+                events.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        if not events:
+            return
+        try:
+            self.write(events)
+        except Exception:
+            GUESSES_DROPPED.inc(amount=len(events))
+            raise
+
+    def write(self, events):
+        records, names, counts = bytearray(), [], Counter()
+        for moment, game, item, cell, user_id, correct, attempt, answer in events:
+            hashed = answer_hash(answer)
+            records += RECORD.pack(moment, game, item, cell, user_id, correct, attempt, hashed)
+            counts[game] += 1
+            if not correct and hashed not in self.named:
+                if len(self.named) >= MAX_NAMED: # Forgetting only means a text is written again
+                    self.named.clear()
+                self.named.add(hashed)
+                names.append(f'{hashed}\t{normalise(answer)}\n')
+
+        directory = spool_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = f'{spool_hour(datetime.now(timezone.utc))}-{socket.gethostname()}-{os.getpid()}' # Host names may hold dots
+        with open(directory / f'{stem}.events', 'ab') as file: # Whole records only, so a reader can skip a torn last one
+            file.write(records)
+        if names:
+            with open(directory / f'{stem}.answers', 'a', encoding='utf-8') as file:
+                file.writelines(names)
+        for game, count in counts.items():
+            GUESSES_LOGGED.inc(GAMES[game], amount=count)
+
+
+guess_log = GuessLog()
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    '''
+    PBKDF2-SHA256 hasher with the iteration count taken from settings.PASSWORD_HASH_ITERATIONS.
+
+    The algorithm name is unchanged, so existing hashes remain valid. Any hash stored with a different
+    iteration count is flagged by must_update() and re-hashed transparently on the user's next login.
+    '''
+    iterations = settings.PASSWORD_HASH_ITERATIONS
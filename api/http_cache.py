@@ -0,0 +1,100 @@
+import hashlib
+import os
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+# Conditional GET of the endpoints the SPA polls: the game listings and the leaderboard. Their payloads only change with a few
+# events, each of which bumps a version stamp in the shared cache: the content of a game type (content:<type>, bumped with the
+# ContentCache of the type), a user's progress in a game type (progress:<user id>:<type>, bumped when they complete a game)
+# and the leaderboard (bumped whenever a UserHistory changes). A stamp is the time of its last bump, so it gives both the
+# ETag and the Last-Modified of a response. The box to box games are files, whose content stamp is their directory's mtime.
+#
+# A request whose validators still match gets a 304 before the view reads anything from the database. Listings are per user,
+# so they're private and revalidated on every poll; the leaderboard is the same for everyone and a shared cache (e.g. the
+# reverse proxy) may serve it for LEADERBOARD_MAX_AGE seconds.
+#
+# The progress and leaderboard stamps are bumped once the transaction changing them commits (at once outside of one): a poll
+# between the bump and the commit would otherwise read the old rows under the new validators, and keep them until the next bump.
+
+LISTING_CACHE_CONTROL = {'private': True, 'no_cache': True}
+
+Validators = namedtuple('Validators', 'etag last_modified') # Quoted ETag, and Unix time of the last change
+
+CONTENT_CACHES = {'careerPath': 'career_path', 'formations': 'formation'} # Game type -> name of its ContentCache
+
+
+def get_version(name):
+    ''' The stamp of a version counter, starting it now when it was never bumped (or was evicted) '''
+    key = f'http_version:{name}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    ''' Mark everything validated by the counter as changed '''
+    cache.set(f'http_version:{name}', time.time(), timeout=None)
+
+
+def bump_progress(user_id, game_type):
+    transaction.on_commit(lambda: bump_version(f'progress:{user_id}:{game_type}'))
+
+
+def bump_leaderboard():
+    transaction.on_commit(lambda: bump_version('leaderboard'))
+
+
+def content_version(game_type):
+    ''' Stamp of the games of a type. The box to box games change with the files in their directory '''
+    if game_type == 'box2box':
+        try:
+            return os.stat(os.path.join(settings.GAME_FILES_DIR, 'box2box')).st_mtime
+        except OSError:
+            return 0
+    return get_version(f'content:{CONTENT_CACHES[game_type]}')
+
+
+def stamp_validators(*parts):
+    ''' Validators of a response built from the given (name, stamp) parts '''
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return Validators(quote_etag(digest), int(max(stamp for _, stamp in parts)))
+
+
+def listing_validators(user, game_type):
+    ''' Validators of a user's listing of a game type '''
+    parts = [(f'content:{game_type}', content_version(game_type))]
+    if user.is_authenticated:
+        parts.append((f'progress:{user.pk}', get_version(f'progress:{user.pk}:{game_type}')))
+    return stamp_validators(*parts)
+
+
+def leaderboard_validators():
+    return stamp_validators(('leaderboard', get_version('leaderboard')))
+
+
+def not_modified(request, validators, cache_control):
+    ''' The 304 response when the request's conditional headers match the validators, otherwise None '''
+    response = get_conditional_response(request, etag=validators.etag, last_modified=validators.last_modified)
+    if response is not None:
+        return with_validators(response, validators, cache_control)
+    return None
+
+
+def with_validators(response, validators, cache_control):
+    ''' Add the validators and the caching policy to a successful response '''
+    if response.status_code in (200, 304):
+        response.headers['ETag'] = validators.etag
+        response.headers['Last-Modified'] = http_date(validators.last_modified)
+        patch_cache_control(response, **cache_control)
+    return response
+
+
+def leaderboard_cache_control():
+    return {'public': True, 'max_age': settings.LEADERBOARD_MAX_AGE}
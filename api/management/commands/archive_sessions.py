@@ -0,0 +1,102 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from api.models import Trivia, BoxToBox, CareerPath, GuessTheSide
+from api.partitions import add_months, create_monthly_partition, month_start, monthly_partitions, months_between
+
+SESSION_MODELS = ((BoxToBox, 'box2box'), (CareerPath, 'careerPath'), (GuessTheSide, 'formations'))
+
+
+class Command(BaseCommand):
+    help = ('Keep the hot tables bounded by live data: create the trivia partitions of the coming months, move finished trivia matches '
+            'older than --days to the archive partitions and drop the emptied live partitions, and delete the solo sessions of completed '
+            'games (their final score is kept in GameProgress). Rows are moved in batches of short transactions. Meant to run daily')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Finished matches older than this many days are archived')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows moved or deleted per transaction')
+        parser.add_argument('--months-ahead', type=int, default=2, help='Trivia partitions created ahead of the current month')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning needs a PostgreSQL server')
+
+        now = timezone.now()
+        cutoff = now - timedelta(days=options['days'])
+        columns = [field.column for field in Trivia._meta.concrete_fields]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            created = [month for month in months_between(now, add_months(month_start(now), options['months_ahead']))
+                       if create_monthly_partition(cursor, 'api_trivia', month, columns)]
+        self.stdout.write(f'Created {len(created)} trivia partitions')
+
+        archived = self.archive_matches(cutoff, columns, options['batch_size'])
+        dropped = self.drop_empty_partitions(cutoff)
+        self.stdout.write(f'Archived {archived} finished matches, dropped {len(dropped)} empty partitions')
+        stale = Trivia.objects.filter(is_active=True, created_at__lt=cutoff).count()
+        if stale:
+            self.stdout.write(self.style.WARNING(f'{stale} matches older than the cutoff are still active, and were left in place'))
+
+        for model, game_type in SESSION_MODELS:
+            deleted = self.delete_completed_sessions(model, game_type, options['batch_size'])
+            self.stdout.write(f'Deleted {deleted} completed {model.__name__} sessions')
+
+    def archive_matches(self, cutoff, columns, batch_size):
+        ''' Move the finished matches created before the cutoff to the archive, batch by batch. Returns how many were moved '''
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT MIN(created_at), MAX(created_at) FROM api_trivia WHERE NOT is_active AND created_at < %s', [cutoff])
+            first, last = cursor.fetchone()
+            if first is None:
+                return 0
+            with transaction.atomic():
+                for month in months_between(first, last): # The archive has no default partition, so every month must exist first
+                    create_monthly_partition(cursor, 'api_trivia_archive', month, columns)
+
+            column_list = ', '.join(f'"{column}"' for column in columns)
+            moved = 0
+            while True:
+                with transaction.atomic():
+                    cursor.execute(f'''
+                        WITH moved AS (
+                            DELETE FROM api_trivia WHERE ("gameID", created_at) IN (
+                                SELECT "gameID", created_at FROM api_trivia WHERE NOT is_active AND created_at < %s
+                                LIMIT %s FOR UPDATE SKIP LOCKED
+                            ) RETURNING {column_list}
+                        )
+                        INSERT INTO api_trivia_archive ({column_list}) SELECT {column_list} FROM moved''', [cutoff, batch_size])
+                    moved += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    return moved
+
+    def drop_empty_partitions(self, cutoff):
+        ''' Drop the live monthly partitions that ended before the cutoff and have no matches left. Returns their names '''
+        dropped = []
+        with connection.cursor() as cursor:
+            for month, name in sorted(monthly_partitions(cursor, 'api_trivia').items()):
+                if add_months(month, 1) > cutoff:
+                    continue
+                cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {name})')
+                if not cursor.fetchone()[0]:
+                    cursor.execute(f'DROP TABLE {name}')
+                    dropped.append(name)
+        return dropped
+
+    def delete_completed_sessions(self, model, game_type, batch_size):
+        ''' Delete the sessions of the games their user completed, walking the table by id. Returns how many were deleted '''
+        table = connection.ops.quote_name(model._meta.db_table)
+        deleted, last_id = 0, 0
+        with connection.cursor() as cursor:
+            while True:
+                # get_bit fails past the end of the bitset, and only CASE guarantees the length is checked first
+                cursor.execute(f'''
+                    SELECT session.id FROM {table} session
+                    JOIN api_gameprogress progress ON progress.user_id = session.user_id AND progress.game_type = %s
+                    WHERE session.id > %s AND CASE WHEN session."gameID" < length(progress.completed) * 8
+                                                   THEN get_bit(progress.completed, session."gameID") = 1 ELSE false END
+                    ORDER BY session.id LIMIT %s''', [game_type, last_id, batch_size])
+                ids = [session_id for session_id, in cursor.fetchall()]
+                if not ids:
+                    return deleted
+                deleted += model.objects.filter(id__in=ids).delete()[0]
+                last_id = ids[-1]
@@ -0,0 +1,118 @@
+import asyncio
+import gc
+import json
+import tempfile
+import threading
+import time
+import types
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, override_settings
+from api.async_views import AsyncBoxToBoxView, AsyncCareerPathView, AsyncGuessTheSideView, close_pool_connections
+from api.benchmarks import QueryCounter, benchmark_database, create_benchmark_users, percentile, seed_catalogue, session_cookie
+from api.urls import solo_game_urls
+from api.views import BoxToBoxView, CareerPathView, GuessTheSideView
+
+VIEWS = {
+    'sync': (BoxToBoxView, CareerPathView, GuessTheSideView),
+    'async': (AsyncBoxToBoxView, AsyncCareerPathView, AsyncGuessTheSideView),
+}
+SETUP_CONCURRENCY = 50 # Games are started in batches this size, so the setup itself never runs out of database connections
+
+
+class Command(BaseCommand):
+    help = ('Benchmark many concurrent guessers against the sync and the async solo game views, through the async request handler. '
+            'Every guesser starts a game, then they all guess at once. Runs against a throwaway database on the configured PostgreSQL server')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--guessers', type=int, default=2000, help='Number of users guessing at the same time')
+        parser.add_argument('--guesses', type=int, default=3, help='Guesses made in a row by each user')
+        parser.add_argument('--game', choices=['box2box', 'career_path', 'guess_the_side'], default='guess_the_side', help='Game played')
+        parser.add_argument('--views', choices=['sync', 'async', 'both'], default='both', help='Which views to benchmark')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The benchmark needs a PostgreSQL server, as the game banks use ArrayField')
+
+        modes = ['sync', 'async'] if options['views'] == 'both' else [options['views']]
+        with benchmark_database(keepdb=options['keepdb']), tempfile.TemporaryDirectory() as directory:
+            cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': f'{directory}/cache',
+                                 'OPTIONS': {'MAX_ENTRIES': 10 * options['guessers']}}} # Room for every game's state, nothing is culled
+            with override_settings(GAME_FILES_DIR=directory, CACHES=cache):
+                catalogue = seed_catalogue(directory, players=1, clubs=1, box2box_games=1)
+                game_id = next(iter(catalogue[options['game']]))
+                for mode in modes:
+                    cookies = [session_cookie(user) for user in create_benchmark_users(options['guessers'], prefix=f'guesser_{mode}')]
+                    urlconf = types.ModuleType(f'bench_{mode}_urls')
+                    urlconf.urlpatterns = solo_game_urls(*VIEWS[mode])
+                    with override_settings(ROOT_URLCONF=urlconf):
+                        results = asyncio.run(self.run_guessers(cookies, options['game'], game_id, options['guesses']))
+                    self.report(mode, results)
+            close_pool_connections()
+            gc.collect() # Drops the connections of the finished request threads, so the database can be destroyed
+
+    async def run_guessers(self, cookies, game, game_id, guesses):
+        ''' Start a game for every guesser, then have them all guess at once, tracking threads and database connections '''
+        handler = AsyncClient().handler # One middleware stack shared by every client, as in a server process
+        clients = []
+        for cookie in cookies:
+            client = AsyncClient(raise_request_exception=False)
+            client.handler = handler
+            client.cookies.load(cookie)
+            clients.append(client)
+
+        results = {'latencies': [], 'statuses': {}, 'peak_threads': threading.active_count(), 'connections': 0}
+        with QueryCounter() as queries: # Entered before the setup, so it also counts on the connections the setup opens
+            for batch in range(0, len(clients), SETUP_CONCURRENCY):
+                await asyncio.gather(*(self.request(client, f'/{game}/game/{game_id}') for client in clients[batch:batch + SETUP_CONCURRENCY]))
+            setup_queries = queries.count
+
+            def count_connection(**kwargs):
+                results['connections'] += 1
+            connection_created.connect(count_connection, weak=False)
+            sampling = asyncio.create_task(self.sample_threads(results))
+            try:
+                start = time.perf_counter()
+                await asyncio.gather(*(self.guesser(client, f'/{game}/guess/{game_id}', guesses, results) for client in clients))
+                results['elapsed'] = time.perf_counter() - start
+            finally:
+                sampling.cancel()
+                connection_created.disconnect(count_connection)
+            results['queries'] = queries.count - setup_queries
+        return results
+
+    async def guesser(self, client, url, guesses, results):
+        ''' Make wrong guesses in a row (so the game never finishes early), recording the latency and status of each '''
+        for _ in range(guesses):
+            start = time.perf_counter()
+            response = await self.request(client, url, {'guess': 'Nobody'})
+            results['latencies'].append(time.perf_counter() - start)
+            results['statuses'][response.status_code] = results['statuses'].get(response.status_code, 0) + 1
+
+    async def request(self, client, url, data=None):
+        ''' POST through the async handler. As in the ASGI handler, each request gets its own thread sensitive context,
+        and the connections its thread opened are closed when it finishes '''
+        async with ThreadSensitiveContext():
+            if data is None:
+                response = await client.post(url)
+            else:
+                response = await client.post(url, data=json.dumps(data), content_type='application/json')
+            await sync_to_async(close_old_connections)()
+        return response
+
+    async def sample_threads(self, results):
+        while True:
+            results['peak_threads'] = max(results['peak_threads'], threading.active_count())
+            await asyncio.sleep(0.005)
+
+    def report(self, mode, results):
+        latencies = [latency * 1000 for latency in results['latencies']]
+        failed = sum(count for status, count in results['statuses'].items() if status != 200)
+        self.stdout.write(f'{mode} views:')
+        self.stdout.write(f"  {len(latencies)} guesses in {results['elapsed']:.2f}s ({len(latencies) / results['elapsed']:.0f} guesses per second), {failed} failed")
+        self.stdout.write(f'  Latency: p50 {percentile(latencies, 50):.1f}ms, p99 {percentile(latencies, 99):.1f}ms')
+        self.stdout.write(f"  Peak threads: {results['peak_threads']}, database connections opened or checked out of the pool: {results['connections']}, queries: {results['queries']}")
+        self.stdout.write(f"  Statuses: {dict(sorted(results['statuses'].items()))}")
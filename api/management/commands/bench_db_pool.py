@@ -0,0 +1,64 @@
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.postgresql.base import DatabaseWrapper as PlainDatabaseWrapper
+from api.benchmarks import percentile
+from api.postgres_pool.base import DatabaseWrapper as PooledDatabaseWrapper, close_pools
+
+
+class Command(BaseCommand):
+    help = ('Compare the latency of requests opening their own database connection with requests borrowing one from the pool. '
+            'Each simulated request connects, runs a few queries and closes, as a request thread does with CONN_MAX_AGE = 0. '
+            'Only runs SELECT 1, so no data is read or written')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests simulated per backend')
+        parser.add_argument('--threads', type=int, default=10, help='Requests running at the same time')
+        parser.add_argument('--queries', type=int, default=3, help='Queries run by each request')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The benchmark needs a PostgreSQL server')
+
+        plain_settings = copy.deepcopy(connection.settings_dict)
+        plain_settings['OPTIONS'].pop('pool', None)
+        pooled_settings = copy.deepcopy(connection.settings_dict)
+        pooled_settings['OPTIONS'].setdefault('pool', {})['max_size'] = options['threads'] # Never waits, so only the connection setup is compared
+        backends = {'unpooled': (PlainDatabaseWrapper, plain_settings), 'pooled': (PooledDatabaseWrapper, pooled_settings)}
+
+        try:
+            for name, (wrapper_class, settings_dict) in backends.items():
+                self.report(name, self.run(wrapper_class, settings_dict, options))
+        finally:
+            close_pools()
+
+    def run(self, wrapper_class, settings_dict, options):
+        ''' Run the requests over the threads and return their latencies, and the time it took '''
+
+        def request(_):
+            start = time.perf_counter()
+            wrapper = wrapper_class(settings_dict, alias=connection.alias) # A new wrapper per request, as a new request thread gets
+            try:
+                with wrapper.cursor() as cursor:
+                    for _ in range(options['queries']):
+                        cursor.execute('SELECT 1')
+                        cursor.fetchone()
+            finally:
+                wrapper.close()
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            list(executor.map(request, range(options['threads']))) # Warm up the threads (and fill the pool)
+            start = time.perf_counter()
+            latencies = list(executor.map(request, range(options['requests'])))
+            elapsed = time.perf_counter() - start
+        return latencies, elapsed
+
+    def report(self, name, results):
+        latencies, elapsed = results
+        latencies = [latency * 1000 for latency in latencies]
+        self.stdout.write(f'{name}:')
+        self.stdout.write(f'  {len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} requests per second)')
+        self.stdout.write(f'  Latency: p50 {percentile(latencies, 50):.2f}ms, p99 {percentile(latencies, 99):.2f}ms')
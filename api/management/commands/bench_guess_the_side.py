@@ -0,0 +1,63 @@
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from api.benchmarks import SoloBenchmark, benchmark_database, create_benchmark_users, percentile, seed_catalogue
+from api.formations import formations, guess_players, masked_formation
+from api.games import GUESS_THE_SIDE_GUESSES
+from api.responses import encode
+
+
+class Command(BaseCommand):
+    help = ('Measure the latency of the guess the side guess endpoint through the full middleware stack, and the cost of a guess '
+            'and its rendered formation on their own. Every user starts --games games and makes every guess but the last, mixing '
+            'right and wrong names. Other users then play the same games with one batch of --batch-size guesses each. Runs '
+            'against a throwaway database on the configured PostgreSQL server')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of users playing')
+        parser.add_argument('--games', type=int, default=10, help='Games started by every user')
+        parser.add_argument('--batch-size', type=int, default=GUESS_THE_SIDE_GUESSES, help='Guesses per batch request')
+        parser.add_argument('--iterations', type=int, default=100_000, help='Guesses timed without the request around them')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        batch_size = min(options['batch_size'], GUESS_THE_SIDE_GUESSES)
+        with benchmark_database(keepdb=options['keepdb']), tempfile.TemporaryDirectory() as directory:
+            cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': f'{directory}/cache'}}
+            with override_settings(GAME_FILES_DIR=directory, CACHES=cache):
+                catalogue = seed_catalogue(directory, players=1, clubs=options['games'], box2box_games=1)
+                benchmark = SoloBenchmark(Client())
+                for user in create_benchmark_users(options['users'], prefix='gts'):
+                    benchmark.client = Client()
+                    benchmark.client.force_login(user)
+                    for game_id, answers in catalogue['guess_the_side'].items():
+                        benchmark.request('guess_the_side.start', f'/guess_the_side/game/{game_id}')
+                        guesses = [guess for answer in answers for guess in (answer, 'Nobody')][:GUESS_THE_SIDE_GUESSES - 1] # Never finishes
+                        for guess in guesses:
+                            benchmark.request('guess_the_side.guess', f'/guess_the_side/guess/{game_id}', guess=guess)
+                for user in create_benchmark_users(options['users'], prefix='gts_batch'):
+                    benchmark.client = Client()
+                    benchmark.client.force_login(user)
+                    for game_id, answers in catalogue['guess_the_side'].items():
+                        benchmark.request('guess_the_side.start', f'/guess_the_side/game/{game_id}')
+                        guesses = [guess for answer in answers for guess in (answer, 'Nobody')][:batch_size]
+                        benchmark.request('guess_the_side.batch', f'/guess_the_side/guesses/{game_id}', guesses=guesses)
+                template = formations.get(next(iter(catalogue['guess_the_side'])))
+
+        for endpoint, label, per in (('guess_the_side.guess', 'Guess endpoint', 'guesses'), ('guess_the_side.batch', 'Batch endpoint', 'batches')):
+            samples = benchmark.samples[endpoint]
+            latencies = [elapsed * 1000 for elapsed, queries, budget in samples]
+            self.stdout.write(f'{label}: p50 {percentile(latencies, 50):.2f}ms, p99 {percentile(latencies, 99):.2f}ms, '
+                              f'{max(queries for elapsed, queries, budget in samples)} queries ({len(latencies)} {per})')
+        batch_p50 = percentile([elapsed * 1000 for elapsed, queries, budget in benchmark.samples['guess_the_side.batch']], 50)
+        self.stdout.write(f'Batch of {batch_size}: {batch_p50 / batch_size:.2f}ms per guess')
+
+        names = [name for slot in range(template.size) for name in (f'Side {next(iter(catalogue["guess_the_side"]))} Player {slot}', 'Nobody')]
+        start = time.perf_counter()
+        mask = 0
+        for i in range(options['iterations']):
+            mask, newly_guessed = guess_players(template, mask if i % 22 else 0, names[i % len(names)])
+            encode({'correct': 'yes' if newly_guessed else 'no', 'guesses_left': 5, 'game_over': False, 'guessed_players': masked_formation(template, mask)})
+        took = time.perf_counter() - start
+        self.stdout.write(f'Guess and rendered response alone: {took / options["iterations"] * 1_000_000:.2f}us per guess')
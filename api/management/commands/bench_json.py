@@ -0,0 +1,69 @@
+import json
+import time
+from collections import namedtuple
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from api.benchmarks import POSITIONS
+from api.formations import FormationTemplate, masked_formation
+from api.responses import ENCODERS, RawJSON, encode
+
+Sample = namedtuple('Sample', 'plain compiled') # Build the response as the views built it before, and with the compiled fragments
+
+
+def samples(encoder):
+    ''' A typical response of every hot endpoint, with the compiled fragments rendered by the encoder '''
+    clubs = [{'team_name': f'Club {season}', 'appearances': 30, 'goals': 5, 'assists': 3, 'is_loan': False, 'season': str(2000 + season)} for season in range(8)]
+    eleven = [{'position': position, 'playerNames': [f'Side Player {slot}', f'SP{slot}'], 'guessed': slot % 3 == 0} for slot, position in enumerate(POSITIONS)]
+    template = FormationTemplate(
+        'Side', 'Side in the final', len(eleven), {},
+        tuple(RawJSON(encoder({'position': player['position'], 'playerNames': [], 'guessed': False})) for player in eleven),
+        tuple(RawJSON(encoder({'position': player['position'], 'playerNames': player['playerNames'], 'guessed': True})) for player in eleven),
+        RawJSON(encoder([{'position': player['position'], 'playerNames': player['playerNames']} for player in eleven])),
+    )
+    mask = sum(1 << slot for slot, player in enumerate(eleven) if player['guessed'])
+    grid = {f'{x}{y}': (x + y) % 2 == 0 for x in range(3) for y in range(3)}
+    guess = {'correct': 'yes', 'guesses_left': 4, 'game_over': False}
+    career_start = {'message': 'Game Started', 'session_id': 17, 'guesses_left': 5}
+    career_path = RawJSON(encoder(clubs))
+    completed = {'message': 'Game over. You lost. Correct Scores: 4', 'game_over': True}
+    leaderboard = [{'username': f'user{i}', 'matches_played': 40, 'matches_won': 20, 'matches_drawn': 5, 'matches_lost': 15,
+                    'total_points': 65, 'win_percentage': 50.0} for i in range(100)]
+    return {
+        'box2box.guess': Sample(lambda: {**guess, 'grid': grid}, lambda: {**guess, 'grid': grid}),
+        'career_path.start': Sample(lambda: {**career_start, 'career_path': clubs}, lambda: {**career_start, 'career_path': career_path}),
+        'guess_the_side.guess': Sample(lambda: {**guess, 'guessed_players': [
+            {'position': f['position'], 'playerNames': f['playerNames'] if f['guessed'] else [], 'guessed': f['guessed']} for f in eleven]},
+            lambda: {**guess, 'guessed_players': masked_formation(template, mask)}),
+        'guess_the_side.completed': Sample(lambda: {**completed, 'starting_eleven': [
+            {'position': player['position'], 'playerNames': player['playerNames']} for player in eleven]},
+            lambda: {**completed, 'starting_eleven': template.full}),
+        'leaderboard': Sample(*[lambda: {'leaderboard': leaderboard}] * 2),
+        'trivia.question': Sample(*[lambda: {'question': 'Who won the 2005 Champions League final?', 'question_id': 4821, 'index': 3}] * 2),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Measure the time to build and encode a typical response of every hot endpoint: as the views did with JsonResponse '
+            '(standard library, every part built and encoded per response), and with every available encoder of api/responses.py '
+            'and the compiled fragments')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20_000, help='Encodes timed per response type and encoder')
+
+    def handle(self, *args, **options):
+        encoders = {'JsonResponse': lambda value: json.dumps(value, cls=DjangoJSONEncoder).encode()}
+        encoders.update(ENCODERS)
+        timings = {} # (response type, encoder) -> microseconds per encode
+        for name, encoder in encoders.items():
+            for response_type, sample in samples(ENCODERS.get(name, ENCODERS['json'])).items():
+                build = sample.plain if name == 'JsonResponse' else sample.compiled
+                if name != 'JsonResponse':
+                    json.loads(encode(build(), encoder)) # Every encoder writes valid JSON
+                start = time.perf_counter()
+                for _ in range(options['iterations']):
+                    encoder(build()) if name == 'JsonResponse' else encode(build(), encoder)
+                timings[response_type, name] = (time.perf_counter() - start) / options['iterations'] * 1_000_000
+
+        self.stdout.write(f"{'response':<26}" + ''.join(f'{name + " us":>16}' for name in encoders))
+        for response_type in samples(ENCODERS['json']):
+            self.stdout.write(f'{response_type:<26}' + ''.join(f'{timings[response_type, name]:>16.2f}' for name in encoders))
@@ -0,0 +1,75 @@
+import random
+import time
+import tracemalloc
+from array import array
+from collections import deque
+from django.core.management.base import BaseCommand
+from api.benchmarks import percentile
+from api.questions import draw
+from api.seen_questions import CAPACITY, SIZE, SeenQuestions
+
+
+class Command(BaseCommand):
+    help = ('Measure the seen question filters at scale: the memory the filters of --users users take, the time to pick the questions '
+            'of a match for two players, and how often a player gets a question from their last 50, with and without the filters. '
+            'Runs in memory against a synthetic bank, without a database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000, help='Users with a filter')
+        parser.add_argument('--questions', type=int, default=2000, help='Questions in the bank')
+        parser.add_argument('--matches', type=int, default=200_000, help='Matches simulated per run')
+        parser.add_argument('--tracked', type=int, default=1000, help='Heaviest users whose exact history is kept to count repeats')
+
+    def handle(self, *args, **options):
+        bank = array('q', range(1, options['questions'] + 1))
+        rng = random.Random(0)
+        players = [self.pick_players(rng, options['users']) for _ in range(options['matches'])] # The same matches in both runs
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        filters = [SeenQuestions().to_bytes() for _ in range(options['users'])] # As read from and written to the history rows
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        self.stdout.write(f'Filters: {SIZE} bytes stored per user, {used / len(filters):.0f} bytes in memory per user, '
+                          f'{used / 2**20:.1f}MiB for {len(filters)} users')
+
+        self.report('random', self.run(bank, players, None, options['tracked']))
+        self.report('filtered', self.run(bank, players, filters, options['tracked']))
+
+    def pick_players(self, rng, users):
+        ''' Two different users, skewed so a few heavy users play most matches '''
+        one = int(users * rng.random() ** 4)
+        two = int(users * rng.random() ** 4)
+        return one, two if two != one else (one + 1) % users
+
+    def run(self, bank, players, filters, tracked):
+        ''' Pick the questions of every match, returning the pick latencies and how many questions were repeats '''
+        recent = {} # Tracked user -> their last CAPACITY questions
+        latencies, repeats, asked = [], 0, 0
+        for pair in players:
+            start = time.perf_counter()
+            if filters is None:
+                questions = draw(bank, 10)
+            else:
+                seen = [SeenQuestions(filters[user]) for user in pair]
+                questions = draw(bank, 10, lambda question_id: any(question_id in seen_filter for seen_filter in seen))
+                for user, seen_filter in zip(pair, seen):
+                    for question_id in questions:
+                        seen_filter.add(question_id)
+                    filters[user] = seen_filter.to_bytes()
+            latencies.append(time.perf_counter() - start)
+
+            for user in pair:
+                if user < tracked:
+                    history = recent.setdefault(user, deque(maxlen=CAPACITY))
+                    repeats += sum(question_id in history for question_id in questions)
+                    asked += len(questions)
+                    history.extend(questions)
+        return latencies, repeats, asked
+
+    def report(self, name, results):
+        latencies, repeats, asked = results
+        latencies = [latency * 1_000_000 for latency in latencies]
+        self.stdout.write(f'{name}:')
+        self.stdout.write(f'  Pick latency: p50 {percentile(latencies, 50):.1f}us, p99 {percentile(latencies, 99):.1f}us ({len(latencies)} matches)')
+        self.stdout.write(f'  Repeats within the last {CAPACITY} questions: {repeats} of {asked} tracked questions ({repeats / max(asked, 1):.2%})')
@@ -0,0 +1,57 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import models
+from api.benchmarks import QueryCounter, benchmark_database, create_benchmark_users, percentile
+from api.models import BoxToBox, CareerPath, GuessTheSide
+from api.session_counters import FIELDS
+
+
+def full_clean_save(session, update_fields):
+    ''' The session save before the invariants: every field validated by full_clean, then written '''
+    session.full_clean(validate_constraints=False)
+    models.Model.save(session, update_fields=update_fields)
+
+
+class Command(BaseCommand):
+    help = ('Measure the validation and save of a solo game session after a guess, with full_clean (every field validated, as '
+            'the session models did) and with their compiled invariants. Runs against a throwaway database on the configured '
+            'PostgreSQL server')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Validations and saves timed per model and method')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        with benchmark_database(keepdb=options['keepdb']):
+            user, = create_benchmark_users(1, prefix='session_save')
+            clubs = {f'club_{axis}': f'Grid Club {axis}' for axis in ('x1', 'x2', 'x3', 'y1', 'y2', 'y3')}
+            sessions = [
+                BoxToBox.objects.create(user=user, gameID=1, **clubs),
+                CareerPath.objects.create(user=user, gameID=1, player_guess='Career Player 1'),
+                GuessTheSide.objects.create(user=user, gameID=1, team_guess='Side 1', team_description='Side 1 in the final'),
+            ]
+
+            self.stdout.write(f"{'model':<14}{'method':<12}{'validate us':>14}{'save p50 us':>14}{'queries/save':>14}")
+            for session in sessions:
+                model = type(session)
+                update_fields = [*FIELDS[model], *(['updated_at'] if hasattr(session, 'updated_at') else [])]
+                methods = {
+                    'full_clean': (lambda: session.full_clean(validate_constraints=False), lambda: full_clean_save(session, update_fields)),
+                    'invariants': (lambda: model.invariants.check(session), lambda: session.save(update_fields=update_fields)),
+                }
+                for method, (validate, save) in methods.items():
+                    start = time.perf_counter()
+                    for _ in range(iterations):
+                        validate()
+                    validate_time = (time.perf_counter() - start) / iterations * 1_000_000
+
+                    latencies = []
+                    with QueryCounter() as queries:
+                        for _ in range(iterations):
+                            session.guesses = 1 - session.guesses # Stays within every game's bounds
+                            start = time.perf_counter()
+                            save()
+                            latencies.append(time.perf_counter() - start)
+                    self.stdout.write(f'{model.__name__:<14}{method:<12}{validate_time:>14.1f}'
+                                      f'{percentile(latencies, 50) * 1_000_000:>14.1f}{queries.count / iterations:>14.1f}')
@@ -0,0 +1,49 @@
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from api.benchmarks import SoloBenchmark, benchmark_database, create_benchmark_users, percentile, seed_catalogue
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the solo game endpoints (list, start, resume, guess, finish, completed and the leaderboard) against a seeded '
+            'synthetic catalogue, reporting latency, throughput and exact query counts. Fails when an endpoint exceeds its query budget')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5, help='Number of users playing')
+        parser.add_argument('--players', type=int, default=50, help='Career paths in the catalogue')
+        parser.add_argument('--clubs', type=int, default=50, help='Guess the side formations in the catalogue')
+        parser.add_argument('--box2box', type=int, default=50, help='Box to box game files in the catalogue')
+        parser.add_argument('--games', type=int, default=3, help='Games of each type played by every user')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        with benchmark_database(keepdb=options['keepdb']), tempfile.TemporaryDirectory() as directory:
+            # Games files and the game state cache live in a temporary directory, away from the real ones
+            cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': f'{directory}/cache'}}
+            with override_settings(GAME_FILES_DIR=directory, CACHES=cache):
+                catalogue = seed_catalogue(directory, options['players'], options['clubs'], options['box2box'])
+                benchmark = SoloBenchmark(Client())
+
+                start = time.perf_counter()
+                for user in create_benchmark_users(options['users'], prefix='solo'):
+                    benchmark.client = Client()
+                    benchmark.client.force_login(user)
+                    benchmark.run(catalogue, options['games'])
+                elapsed = time.perf_counter() - start
+
+        self.report(benchmark, elapsed)
+        violations = benchmark.budget_violations()
+        if violations:
+            raise CommandError('Query budget exceeded:\n' + '\n'.join(violations))
+
+    def report(self, benchmark, elapsed):
+        self.stdout.write(f"{'endpoint':<26}{'requests':>9}{'p50 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}{'budget':>8}")
+        total = 0
+        for endpoint, samples in sorted(benchmark.samples.items()):
+            latencies = [elapsed * 1000 for elapsed, queries, budget in samples]
+            total += len(samples)
+            self.stdout.write(f'{endpoint:<26}{len(samples):>9}{percentile(latencies, 50):>9.2f}{percentile(latencies, 99):>9.2f}'
+                              f'{len(samples) / (sum(latencies) / 1000):>9.0f}{max(queries for elapsed, queries, budget in samples):>9}'
+                              f'{max(budget for elapsed, queries, budget in samples):>8}')
+        self.stdout.write(f'{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} requests per second)')
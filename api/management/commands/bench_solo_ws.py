@@ -0,0 +1,87 @@
+import asyncio
+import copy
+import gc
+import json
+import tempfile
+import time
+from channels.auth import AuthMiddlewareStack
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import path
+from api.async_views import close_pool_connections
+from api.benchmarks import benchmark_database, create_benchmark_users, percentile, seed_catalogue, session_cookie
+from api.consumers import SoloGameConsumer
+from api.responses import encode
+from api.solo_games import GAMES
+
+
+class Command(BaseCommand):
+    help = ('Compare the latency of a solo game guess over HTTP (the sync views, through the full middleware stack), over the '
+            'solo game websocket, and played in memory with no transport at all. Every user starts a game and makes --guesses '
+            'wrong guesses in a row. Runs against a throwaway database on the configured PostgreSQL server')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Number of users playing over each transport')
+        parser.add_argument('--guesses', type=int, default=9, help='Guesses made in a row by each user')
+        parser.add_argument('--game', choices=list(GAMES), default='guess_the_side', help='Game played')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        game, guesses = options['game'], options['guesses']
+        with benchmark_database(keepdb=options['keepdb']), tempfile.TemporaryDirectory() as directory:
+            cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': f'{directory}/cache'}}
+            with override_settings(GAME_FILES_DIR=directory, CACHES=cache):
+                catalogue = seed_catalogue(directory, players=1, clubs=1, box2box_games=1)
+                game_id = next(iter(catalogue[game]))
+
+                http_latencies = []
+                for user in create_benchmark_users(options['users'], prefix='solo_http'):
+                    client = Client()
+                    client.force_login(user)
+                    client.post(f'/{game}/game/{game_id}')
+                    for _ in range(guesses):
+                        start = time.perf_counter()
+                        client.post(f'/{game}/guess/{game_id}', data=json.dumps({'guess': 'Nobody'}), content_type='application/json')
+                        http_latencies.append(time.perf_counter() - start)
+
+                users = create_benchmark_users(options['users'], prefix='solo_ws')
+                for user in users:
+                    client = Client()
+                    client.force_login(user)
+                    client.post(f'/{game}/game/{game_id}')
+                ws_latencies = asyncio.run(self.play_sockets([session_cookie(user) for user in users], game, game_id, guesses))
+
+                loaded = GAMES[game](users[0], game_id)
+                loaded.load()
+                memory_latencies = []
+                for _ in range(options['users']):
+                    played = copy.deepcopy(loaded) # A fresh game each time, as each user has
+                    for _ in range(guesses):
+                        start = time.perf_counter()
+                        results, _ = played.play(['Nobody'])
+                        encode(played.response(results[0]))
+                        memory_latencies.append(time.perf_counter() - start)
+            close_pool_connections()
+            gc.collect()
+
+        for label, latencies in (('HTTP', http_latencies), ('Websocket', ws_latencies), ('In memory', memory_latencies)):
+            latencies = [latency * 1000 for latency in latencies]
+            self.stdout.write(f'{label}: p50 {percentile(latencies, 50):.3f}ms, p99 {percentile(latencies, 99):.3f}ms ({len(latencies)} guesses)')
+
+    async def play_sockets(self, cookies, game, game_id, guesses):
+        ''' Connect a socket per user, authenticated by their session cookie, and time each guess's round trip '''
+        application = AuthMiddlewareStack(URLRouter([path('ws/solo/<str:game_type>/<int:game_id>/', SoloGameConsumer.as_asgi())]))
+        latencies = []
+        for cookie in cookies:
+            communicator = WebsocketCommunicator(application, f'/ws/solo/{game}/{game_id}/', headers=[(b'cookie', cookie.encode())])
+            await communicator.connect()
+            await communicator.receive_json_from()
+            for _ in range(guesses):
+                start = time.perf_counter()
+                await communicator.send_json_to({'action': 'guess', 'guess': 'Nobody'})
+                await communicator.receive_json_from()
+                latencies.append(time.perf_counter() - start)
+            await communicator.disconnect() # Writes the guesses behind
+        return latencies
@@ -0,0 +1,20 @@
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.spa_shell import TEMPLATE, compress, render_shell
+
+
+class Command(BaseCommand):
+    help = ('Render the SPA shell (api/spa/index.html) into SPA_SHELL_PATH, where the workers read it from instead of rendering '
+            'it. Run it at build time, after collectstatic')
+
+    def handle(self, *args, **options):
+        body = render_shell()
+        path = Path(settings.SPA_SHELL_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f'{path.name}.tmp')
+        temporary.write_bytes(body)
+        temporary.replace(path) # Workers starting meanwhile read the previous shell or this one, never part of it
+
+        sizes = ', '.join(f"{encoding or 'identity'} {len(variant)} bytes" for encoding, variant in compress(body).items())
+        self.stdout.write(self.style.SUCCESS(f'Rendered {TEMPLATE} into {path} ({sizes})'))
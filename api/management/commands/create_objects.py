@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.core.exceptions import ValidationError
 from api.models import CareerBank, PlayerBank, TriviaBank, ClubBank, FormationBank
+from api.questions import bump_version
 import traceback
 import json
 
@@ -24,4 +25,6 @@ class Command(BaseCommand):
                     trivia.save()  # Save the instance
                     self.stdout.write(self.style.SUCCESS(f'Successfully created trivia: {question}'))
                 except ValidationError as e:
-                    self.stdout.write(self.style.ERROR(f'Failed to create trivia: {question}. Error: {e}'))
\ No newline at end of file
+                    self.stdout.write(self.style.ERROR(f'Failed to create trivia: {question}. Error: {e}'))
+
+        bump_version() # The workers reload the question bank with the new questions
\ No newline at end of file
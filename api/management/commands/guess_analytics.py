@@ -0,0 +1,109 @@
+import csv
+import shutil
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from django.core.management.base import BaseCommand
+from api.guess_log import GAMES
+from api.guess_chunks import EVENT_DTYPE, aggregate, answer_texts, chunks, split_item_key
+
+BENCHMARK_CHUNK = 5_000_000 # Synthetic guesses per chunk, about the guesses a busy hour would roll
+
+
+class Command(BaseCommand):
+    help = ('Per item statistics of the rolled guess log: attempts, accuracy, mean attempts to solve and the most '
+            'common wrong answers of every trivia question and solo game, and the solves per box to box cell. With --benchmark, '
+            'aggregates that many synthetic guesses instead and reports the time taken')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=3, help='Wrong answers shown per item')
+        parser.add_argument('--min-attempts', type=int, default=1, help='Leave out items with fewer attempts')
+        parser.add_argument('--csv', help='Write one row per item to this file instead of printing them')
+        parser.add_argument('--benchmark', type=int, metavar='GUESSES', help='Aggregate this many synthetic guesses in a temporary directory')
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark(options['benchmark'])
+
+        chunk_paths = chunks()
+        start = time.perf_counter()
+        items, cells, wrong = aggregate(chunk_paths)
+        self.stderr.write(f'Aggregated {items["attempts"].sum()} guesses from {len(chunk_paths)} chunks in {time.perf_counter() - start:.1f}s')
+
+        keep = items['attempts'] >= options['min_attempts']
+        top = self.top_wrong(wrong, options['top'])
+        texts = answer_texts(chunk_paths, [answer for answers in top.values() for answer, _ in answers])
+        solved_cells = {}
+        for key, cell, solved in zip(cells['key'].tolist(), cells['cell'].tolist(), cells['solved'].tolist()):
+            solved_cells.setdefault(key, []).append(f'{cell}:{solved}')
+
+        games, ids = split_item_key(items['key'])
+        rows = []
+        for index in np.flatnonzero(keep):
+            key, attempts, correct = int(items['key'][index]), int(items['attempts'][index]), int(items['correct'][index])
+            rows.append([
+                GAMES[games[index]], int(ids[index]), attempts, f'{correct / attempts:.3f}',
+                f'{items["solve_attempts"][index] / correct:.2f}' if correct else '',
+                ' | '.join(f'{texts.get(answer, answer)} ({count})' for answer, count in top.get(key, [])),
+                ' '.join(solved_cells.get(key, [])),
+            ])
+
+        header = ['game', 'item', 'attempts', 'accuracy', 'attempts_to_solve', 'top_wrong_answers', 'cell_solves']
+        if options['csv']:
+            with open(options['csv'], 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(header)
+                writer.writerows(rows)
+            self.stdout.write(f"Wrote {len(rows)} items to {options['csv']}")
+        else:
+            self.stdout.write('\t'.join(header))
+            for row in rows:
+                self.stdout.write('\t'.join(map(str, row)))
+
+    def top_wrong(self, wrong, top):
+        ''' The top wrong answers of every item, as item key -> [(answer hash, count)...] '''
+        if not top or not len(wrong['key']):
+            return {}
+        order = np.lexsort((-wrong['count'], wrong['key'])) # By item, most given first
+        keys, answers, counts = wrong['key'][order], wrong['answer'][order], wrong['count'][order]
+        first = np.searchsorted(keys, keys) # Start of each item's run
+        rank = np.arange(len(keys)) - first
+        result = {}
+        for key, answer, count in zip(keys[rank < top].tolist(), answers[rank < top].tolist(), counts[rank < top].tolist()):
+            result.setdefault(key, []).append((answer, count))
+        return result
+
+    def benchmark(self, guesses):
+        ''' Write synthetic chunks of skewed guesses to a temporary directory, then time the aggregation over them '''
+        directory = Path(tempfile.mkdtemp(prefix='guess-analytics-'))
+        rng = np.random.default_rng(0)
+        try:
+            start = time.perf_counter()
+            for number, first in enumerate(range(0, guesses, BENCHMARK_CHUNK)):
+                size = min(BENCHMARK_CHUNK, guesses - first)
+                path = directory / f'{number:06d}'
+                path.mkdir()
+                game = rng.integers(0, len(GAMES), size, dtype=np.uint8)
+                correct = rng.random(size) < 0.4
+                columns = {
+                    'time': np.full(size, time.time()),
+                    'game': game,
+                    'item': (rng.zipf(1.3, size) % 20_000).astype(np.int32), # A few popular items get most guesses
+                    'cell': np.where(correct & (game == GAMES.index('box2box')), rng.integers(0, 9, size), -1).astype(np.int8),
+                    'user': rng.integers(1, 1_000_000, size, dtype=np.int32),
+                    'correct': correct,
+                    'attempt': rng.integers(1, 10, size, dtype=np.int16),
+                    'answer': rng.zipf(1.5, size).astype(np.uint64), # Wrong answers repeat a lot too
+                }
+                for name in EVENT_DTYPE.names:
+                    np.save(path / f'{name}.npy', columns[name].astype(EVENT_DTYPE[name]))
+            self.stdout.write(f'Wrote {guesses} guesses in {number + 1} chunks in {time.perf_counter() - start:.1f}s')
+
+            start = time.perf_counter()
+            items, cells, wrong = aggregate(chunks(directory))
+            took = time.perf_counter() - start
+            self.stdout.write(f'Aggregated {items["attempts"].sum()} guesses into {len(items["key"])} items, {len(cells["key"])} cells '
+                              f'and {len(wrong["key"])} wrong answers in {took:.1f}s ({guesses / took / 1e6:.1f}M guesses/s)')
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,124 @@
+import asyncio
+import random
+import time
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from api.benchmarks import QueryCounter, benchmark_database, create_benchmark_users, percentile, session_cookie
+from api.consumers import TriviaGameConsumer
+from api.models import TriviaBank
+from api.questions import question_bank
+from project.asgi import application
+
+
+class Command(BaseCommand):
+    help = ('Load test matchmaking and trivia matches with simulated players connected to the ASGI application. '
+            'Runs against a throwaway database on the configured PostgreSQL server (the trivia bank uses ArrayField, so SQLite is not supported)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=20, help='Number of concurrent players (rounded down to an even number)')
+        parser.add_argument('--ramp', type=float, default=5.0, help='Seconds over which the players join the queue')
+        parser.add_argument('--duration', type=float, default=60.0, help='Length of each match in seconds')
+        parser.add_argument('--answer-rate', type=float, default=0.5, help='Average answers per second per player')
+        parser.add_argument('--correct-rate', type=float, default=0.5, help='Probability of each answer being correct')
+        parser.add_argument('--questions', type=int, default=200, help='Size of the seeded question bank')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The load test needs a PostgreSQL server, as the trivia bank uses ArrayField')
+        players = options['players'] - options['players'] % 2
+        if players < 2:
+            raise CommandError('At least two players are needed for a match')
+
+        duration = TriviaGameConsumer.game_duration
+        TriviaGameConsumer.game_duration = options['duration']
+        try:
+            with benchmark_database(keepdb=options['keepdb']):
+                answers = self.seed_questions(options['questions'])
+                cookies = [session_cookie(user) for user in create_benchmark_users(players, prefix='loadtest')]
+
+                with QueryCounter() as queries:
+                    start = time.perf_counter()
+                    results = asyncio.run(self.run_players(cookies, answers, options))
+                    elapsed = time.perf_counter() - start
+        finally:
+            TriviaGameConsumer.game_duration = duration
+
+        self.report(players, elapsed, queries.count, results)
+
+    def seed_questions(self, count):
+        ''' Fill the trivia bank up to the requested size, returning the correct answer for each question id '''
+        missing = count - TriviaBank.objects.count()
+        if missing > 0:
+            TriviaBank.objects.bulk_create(TriviaBank(question=f'Benchmark question {i}?', answer=[f'answer {i}']) for i in range(missing))
+        question_bank.warm() # The bank was loaded from the real database when the application was imported
+        return {question_id: answer[0] for question_id, answer in TriviaBank.objects.values_list('id', 'answer')}
+
+    async def run_players(self, cookies, answers, options):
+        ''' Ramp up every player, wait for them all to finish, then close the connections held by the sync threads '''
+        results = {'waits': [], 'latencies': [], 'matches': set(), 'unmatched': 0, 'failed': 0}
+        ramp_step = options['ramp'] / len(cookies)
+        outcomes = await asyncio.gather(*(self.play(cookie, i * ramp_step, answers, options, results) for i, cookie in enumerate(cookies)),
+                                        return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                self.stderr.write(f'Player failed: {outcome!r}')
+                results['failed'] += 1
+        await sync_to_async(connections.close_all)()
+        return results
+
+    async def play(self, cookie, delay, answers, options, results):
+        ''' Simulate a single player: join the queue, then answer questions until the match is over '''
+        await asyncio.sleep(delay)
+        headers = [(b'cookie', cookie.encode())]
+
+        queued_at = time.perf_counter()
+        matchmaking = WebsocketCommunicator(application, '/ws/matchmaking/', headers=headers)
+        await matchmaking.connect()
+        try:
+            message = {}
+            while not message.get('gameStarted'):
+                message = await matchmaking.receive_json_from(timeout=options['ramp'] + 30)
+        except asyncio.TimeoutError:
+            results['unmatched'] += 1 # Never paired with an opponent
+            return
+        finally:
+            await matchmaking.disconnect()
+        results['waits'].append(time.perf_counter() - queued_at)
+
+        game_url = message['url']
+        game = WebsocketCommunicator(application, game_url, headers=headers)
+        await game.connect()
+        sent_at = None
+        answered = 0 # Index of the last question answered, as the first question may be sent more than once
+        while not message.get('game_over'):
+            message = await game.receive_json_from(timeout=10) # The server ticks every second, so silence means it has stalled
+            if 'result' in message and sent_at is not None:
+                results['latencies'].append(time.perf_counter() - sent_at)
+                sent_at = None
+            elif 'question' in message and sent_at is None and message['index'] > answered:
+                answered = message['index']
+                await asyncio.sleep(random.expovariate(options['answer_rate'])) # Thinking time
+                correct = random.random() < options['correct_rate']
+                sent_at = time.perf_counter()
+                await game.send_json_to({
+                    'action': 'submit_answer',
+                    'question_id': message['question_id'],
+                    'answer': answers[message['question_id']] if correct else 'wrong answer',
+                })
+        await game.disconnect()
+        results['matches'].add(game_url)
+
+    def report(self, players, elapsed, query_count, results):
+        matches = len(results['matches'])
+        latencies = [latency * 1000 for latency in results['latencies']]
+        waits = results['waits']
+
+        self.stdout.write(f"Players: {players} ({matches} matches completed, {results['unmatched']} unmatched, {results['failed']} failed)")
+        self.stdout.write(f'Wall time: {elapsed:.1f}s')
+        self.stdout.write(f'Matches per second: {matches / elapsed:.3f}')
+        self.stdout.write(f'Answer latency: p50 {percentile(latencies, 50):.2f}ms, p99 {percentile(latencies, 99):.2f}ms ({len(latencies)} answers)')
+        self.stdout.write(f'Time to match: p50 {percentile(waits, 50):.2f}s, p99 {percentile(waits, 99):.2f}s')
+        self.stdout.write(f'Database queries: {query_count} ({query_count / matches if matches else 0:.1f} per match)')
@@ -0,0 +1,32 @@
+import statistics
+from django.core.management.base import BaseCommand
+from api.benchmarks import LAZY_MODULES, STARTUP_BUDGET, profile_startup
+
+
+class Command(BaseCommand):
+    help = ('Profile the cold start of a worker: import the ASGI application in fresh interpreters, then report the wall time '
+            'against the startup budget and the slowest modules to import (python -X importtime)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='project.asgi', help='Module imported at startup')
+        parser.add_argument('--top', type=int, default=20, help='Modules listed by self and by cumulative import time')
+        parser.add_argument('--repeat', type=int, default=5, help='Cold starts timed, the median is reported')
+
+    def handle(self, *args, **options):
+        startups = [profile_startup(options['module']) for _ in range(options['repeat'])]
+        wall = statistics.median(startup.wall for startup in startups)
+        startup = min(startups, key=lambda startup: abs(startup.wall - wall)) # The imports of the median start
+
+        for title, key in (('self', lambda item: item.self), ('cumulative', lambda item: item.cumulative)):
+            self.stdout.write(f"\nSlowest imports by {title} time\n{'module':<60}{'self ms':>10}{'cumulative ms':>16}")
+            for item in sorted(startup.imports, key=key, reverse=True)[:options['top']]:
+                self.stdout.write(f"{'  ' * item.depth + item.module:<60}{item.self * 1000:>10.1f}{item.cumulative * 1000:>16.1f}")
+
+        self.stdout.write(f"\n{len(startup.imports)} modules imported, {options['module']} in {wall * 1000:.0f} ms "
+                          f"(median of {len(startups)}, budget {STARTUP_BUDGET * 1000:.0f} ms)")
+        if startup.lazy_loaded:
+            self.stdout.write(self.style.ERROR(f"Loaded at startup, should be lazy: {', '.join(startup.lazy_loaded)}"))
+        if wall > STARTUP_BUDGET:
+            self.stdout.write(self.style.ERROR('Over the startup budget'))
+        elif not startup.lazy_loaded:
+            self.stdout.write(self.style.SUCCESS(f"Within the startup budget, none of {len(LAZY_MODULES)} lazy modules loaded"))
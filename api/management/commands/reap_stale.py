@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.reaper import reap
+
+
+class Command(BaseCommand):
+    help = ('Clean up the rows left behind by dead workers and vanished sockets: expire matchmaking entries without a heartbeat, '
+            'end abandoned trivia matches and delete solo sessions whose cached state expired. The websocket workers already run this '
+            'every REAPER_INTERVAL seconds, so it is only needed when that is disabled (run it from cron instead)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows handled per transaction (REAPER_BATCH_SIZE by default)')
+
+    def handle(self, *args, **options):
+        reaped = reap(options['batch_size'])
+        self.stdout.write(f"Expired {reaped['queue_entries']} queue entries, ended {reaped['matches']} abandoned matches, "
+                          f"deleted {reaped['sessions']} orphaned sessions")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from api.session_counters import session_counters
+
+
+class Command(BaseCommand):
+    help = ('Write the solo game session counters journaled by the dead processes of this host. The first guess a worker '
+            'writes behind already does this, so it is only needed to recover the counters before the workers restart')
+
+    def handle(self, *args, **options):
+        written = session_counters.replay()
+        self.stdout.write(f'Wrote the counters of {written} sessions')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.guess_chunks import roll
+
+
+class Command(BaseCommand):
+    help = ('Turn the guess log spool files of finished hours into column chunks for guess_analytics. Run it hourly from cron, '
+            'a few minutes past the hour')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Also roll the spool files of the current hour (when no worker is writing)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Rolled {roll(include_current=options['all'])} guesses")
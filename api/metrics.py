@@ -0,0 +1,208 @@
+import bisect
+import math
+import threading
+import weakref
+from collections import deque
+
+# Default histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Seconds
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89) # e.g. database queries per request
+
+
+class Registry:
+    ''' Holds every metric of the process so they can be rendered together '''
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        ''' Register a metric, returning the existing one if the name is already taken (modules may be reloaded) '''
+        return self.metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        ''' Render every metric in the Prometheus text exposition format '''
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        ''' Return a plain dictionary of every metric's current values (used for log dumps) '''
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+
+registry = Registry()
+
+
+def format_labels(labelnames, labelvalues, extra=''):
+    ''' Format label pairs as {name="value",...}, escaping the values '''
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class ShardOwner:
+    ''' Holds a thread's shard in its thread local storage, so the shard can be retired once the thread is gone '''
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self):
+        self.shard = {}
+
+
+class Metric:
+    '''
+    Base class of a labelled metric.
+
+    Every thread writes to its own shard, so recording a value never takes a lock or contends with other threads.
+    The shards are only summed when the metrics are rendered, which is rare compared to the writes. The shard of a thread
+    that exits (under ASGI every request's sync code may run on a new thread) is queued as retired, and merged into the
+    base values by the next collect or new thread, so the shards only ever number the live threads.
+    '''
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = {} # id -> the shard of a thread, keyed by the label values
+        self.base = {} # Values of the threads that exited
+        self.retired = deque() # Shards of exited threads not yet merged into the base
+
+    def shard(self):
+        ''' Return the calling thread's shard, creating it on first use '''
+        try:
+            return self.local.owner.shard
+        except AttributeError:
+            owner = self.local.owner = ShardOwner()
+            with self.lock:
+                self.fold_retired()
+                self.shards[id(owner.shard)] = owner.shard
+            # Called from whichever thread collects the owner, maybe one holding the lock, so it only queues the shard
+            weakref.finalize(owner, self.retired.append, owner.shard).atexit = False
+            return owner.shard
+
+    def fold_retired(self):
+        ''' Merge the retired shards into the base values and drop them (called with the lock held) '''
+        while self.retired:
+            shard = self.retired.popleft()
+            for labelvalues, value in shard.items():
+                self.base[labelvalues] = self.merge(self.base.get(labelvalues), value)
+            del self.shards[id(shard)]
+
+    def collect(self):
+        ''' Merge the base values and the shards into a single {labelvalues: value} dictionary '''
+        with self.lock:
+            self.fold_retired()
+            merged = {labelvalues: self.merge(None, value) for labelvalues, value in self.base.items()}
+            shards = list(self.shards.values())
+        for shard in shards:
+            for labelvalues, value in shard.copy().items(): # dict.copy is atomic, the owning thread may still be writing
+                merged[labelvalues] = self.merge(merged.get(labelvalues), value)
+        return merged
+
+    def merge(self, total, value):
+        return value if total is None else total + value
+
+    def render(self):
+        return [f'{self.name}{format_labels(self.labelnames, labelvalues)} {format_value(value)}'
+                for labelvalues, value in sorted(self.collect().items())]
+
+    def snapshot(self):
+        return {','.join(map(str, labelvalues)) or 'total': value for labelvalues, value in sorted(self.collect().items())}
+
+
+class Counter(Metric):
+    ''' Monotonically increasing count (e.g. requests served) '''
+    kind = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        shard = self.shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+
+class Gauge(Metric):
+    ''' Value that goes up and down (e.g. matches in progress). It may also be computed on demand by a function '''
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function # Optional callable returning {labelvalues: value}, evaluated when rendering
+
+    def inc(self, *labelvalues, amount=1):
+        shard = self.shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def collect(self):
+        if self.function is not None:
+            return self.function()
+        return super().collect()
+
+
+class Histogram(Metric):
+    ''' Distribution of observed values in fixed buckets, with their sum and count '''
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, *labelvalues):
+        shard = self.shard()
+        state = shard.get(labelvalues)
+        if state is None:
+            state = shard[labelvalues] = [0] * len(self.buckets) + [0] # Per bucket counts, followed by the sum
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def merge(self, total, value):
+        return list(value) if total is None else [a + b for a, b in zip(total, value)]
+
+    def render(self):
+        lines = []
+        for labelvalues, state in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count # Prometheus buckets are cumulative
+                le = f'le="{format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labelvalues, le)} {cumulative}')
+            labels = format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {format_value(state[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+    def snapshot(self):
+        return {','.join(map(str, labelvalues)) or 'total': {'count': sum(state[:-1]), 'sum': state[-1]}
+                for labelvalues, state in sorted(self.collect().items())}
+
+
+def counter(name, documentation, labelnames=()):
+    ''' Create (or fetch) a counter in the process registry '''
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=(), function=None):
+    ''' Create (or fetch) a gauge in the process registry '''
+    return registry.register(Gauge(name, documentation, labelnames, function))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    ''' Create (or fetch) a histogram in the process registry '''
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
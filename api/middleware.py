@@ -1,12 +1,198 @@
+import cProfile
+import contextvars
+import io
+import logging
+import pstats
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
+from django.db.backends.signals import connection_created
 from django.http import HttpResponse
 from django.conf import settings  # Importing settings so we can import the frontend environment variable
+from whitenoise.middleware import WhiteNoiseMiddleware
+from . import metrics
+from .spa_shell import is_navigation, spa_shell
+
+logger = logging.getLogger('api.performance')
+
+# Per endpoint request metrics, labelled by the resolved url name (e.g. api:box2box_guess)
+REQUESTS = metrics.counter('http_requests_total', 'HTTP requests served', ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = metrics.histogram('http_request_duration_seconds', 'Time taken to serve a request', ('endpoint',))
+REQUEST_QUERIES = metrics.histogram('http_request_db_queries', 'Database queries made per request', ('endpoint',), buckets=metrics.COUNT_BUCKETS)
+REQUEST_QUERY_TIME = metrics.histogram('http_request_db_query_duration_seconds', 'Time spent in the database per request', ('endpoint',))
+SLOW_REQUESTS = metrics.counter('http_slow_requests_total', 'Requests slower than SLOW_REQUEST_THRESHOLD', ('endpoint',))
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}) # Method labels, any other method is 'other'
+
+
+class InstrumentationMiddleware:
+    ''' Records the latency, database query count and query time of every request, per resolved url name.
+    A sampled fraction of requests is profiled, and the profile is logged when the request turns out to be slow.
+    Supports both sync and async stacks, so it never forces the async views back onto a thread '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        queries = QueryTracker()
+        profiler = None
+        if settings.SLOW_REQUEST_PROFILE_RATE and random.random() < settings.SLOW_REQUEST_PROFILE_RATE:
+            profiler = cProfile.Profile()
+
+        install_query_tracking(connection=connection) # A connection opened before this module was imported has no wrapper yet
+        token = current_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                response = profiler.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        duration = time.perf_counter() - start
+        self.record(request, response, duration, queries, profiler)
+        return response
+
+    async def __acall__(self, request):
+        ''' Async path. Requests are not profiled, as a profile of a coroutine mixes in everything else the event loop ran meanwhile '''
+        queries = QueryTracker()
+        token = current_queries.set(queries) # Copied into sync_to_async threads, so their queries are counted too
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        duration = time.perf_counter() - start
+        self.record(request, response, duration, queries)
+        return response
+
+    def record(self, request, response, duration, queries, profiler=None):
+        ''' Update the request metrics, logging the profile of a slow request if it was profiled '''
+        match = request.resolver_match # Set once the url has been resolved, None if it never got that far
+        endpoint = match.view_name if match is not None else 'unresolved'
+        REQUESTS.inc(endpoint, request.method if request.method in HTTP_METHODS else 'other', str(response.status_code))
+        REQUEST_LATENCY.observe(duration, endpoint)
+        REQUEST_QUERIES.observe(queries.count, endpoint)
+        REQUEST_QUERY_TIME.observe(queries.duration, endpoint)
+
+        if duration >= settings.SLOW_REQUEST_THRESHOLD:
+            SLOW_REQUESTS.inc(endpoint)
+            if profiler is not None:
+                self.log_profile(endpoint, duration, queries, profiler)
+
+    def log_profile(self, endpoint, duration, queries, profiler):
+        ''' Log the most expensive functions of a slow, profiled request '''
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(25)
+        logger.warning('Slow request to %s took %.3fs (%d queries, %.3fs in the database)\n%s',
+                       endpoint, duration, queries.count, queries.duration, output.getvalue())
+
+
+current_queries = contextvars.ContextVar('current_queries', default=None) # QueryTracker of the request being served
+
+
+def track_queries(execute, sql, params, many, context):
+    ''' Execute wrapper installed on every connection, recording the query into the current request's tracker (if any) '''
+    queries = current_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    return queries(execute, sql, params, many, context)
+
+
+def install_query_tracking(sender=None, connection=None, **kwargs):
+    ''' Add the query tracking wrapper to a connection, once '''
+    if track_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_queries)
+
+
+connection_created.connect(install_query_tracking) # Connections are thread local, so every thread's connection needs the wrapper
+
+
+class QueryTracker:
+    ''' Database execute wrapper that counts the queries made and the time spent running them '''
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    ''' WhiteNoise with an async path. WhiteNoise itself is sync only, which would force every view below it onto a thread '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request) # Opens the file
+        return await self.get_response(request)
+
+
+class SpaShellMiddleware:
+    ''' Answers the navigations of the SPA with its shell held in memory (spa_shell.py), so the middleware below it (sessions,
+    authentication, CSRF...) and a template render are skipped for them. Every other request carries on down the stack '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if is_navigation(request):
+            return spa_shell.response(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if is_navigation(request): # The shell is only read from disk (or rendered) by the first navigation
+            return spa_shell.response(request)
+        return await self.get_response(request)
+
 
 class ErrorHandlingMiddleware:
     ''' This class is designed to redirect any url's that are not found or are forbidden to unauthenticated users '''
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response # Retrieve the initial response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         response = self.get_response(request)
         # Check if the request path is not already the landing, login or sign up page
         if request.path not in ['/landing', '/login', '/signup']:
@@ -14,4 +200,11 @@ class ErrorHandlingMiddleware:
                 return HttpResponse(status=418)  # Return a 418 status code if the page does not exist
             elif response.status_code == 403 and request.user.is_authenticated:
                 return HttpResponse(status=418)  # Return a 418 status code if they are not logged in
-        return response
\ No newline at end of file
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.path not in ['/landing', '/login', '/signup'] and response.status_code in (403, 404):
+            if (await request.auser()).is_authenticated: # Only resolve the user when the response needs it
+                return HttpResponse(status=418)
+        return response
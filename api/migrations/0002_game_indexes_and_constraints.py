@@ -0,0 +1,87 @@
+# Generated by Django 5.0.4 on 2026-10-19 12:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_sessions(apps, schema_editor):
+    ''' Keep the most recent session of each user and game, so the unique constraints can be added '''
+    for model_name in ('BoxToBox', 'CareerPath', 'GuessTheSide'):
+        model = apps.get_model('api', model_name)
+        duplicates = model.objects.values('user', 'gameID').annotate(count=models.Count('id'), latest=models.Max('id')).filter(count__gt=1)
+        for duplicate in duplicates:
+            model.objects.filter(user=duplicate['user'], gameID=duplicate['gameID']).exclude(id=duplicate['latest']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_sessions, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='playedgames',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='boxtobox',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='careerbank',
+            name='player',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='careers', to='api.playerbank'),
+        ),
+        migrations.AlterField(
+            model_name='careerpath',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='formationbank',
+            name='club',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.clubbank'),
+        ),
+        migrations.AlterField(
+            model_name='guesstheside',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='playedgames',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='played_games', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='careerbank',
+            index=models.Index(fields=['player'], include=('team_name', 'appearances', 'goals', 'assists', 'is_loan', 'season'), name='career_player_covering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='formationbank',
+            index=models.Index(fields=['club'], include=('player_names', 'position'), name='formation_club_covering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userhistory',
+            index=models.Index(fields=['-matches_won'], name='history_matches_won_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='boxtobox',
+            constraint=models.UniqueConstraint(fields=('user', 'gameID'), name='boxtobox_user_game_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='careerpath',
+            constraint=models.UniqueConstraint(fields=('user', 'gameID'), name='careerpath_user_game_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='guesstheside',
+            constraint=models.UniqueConstraint(fields=('user', 'gameID'), name='guesstheside_user_game_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='playedgames',
+            constraint=models.UniqueConstraint(fields=('user', 'game_type', 'game_id'), include=('completed',), name='playedgames_user_game_uniq'),
+        ),
+    ]
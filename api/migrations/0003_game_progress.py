@@ -0,0 +1,68 @@
+# Generated by Django 5.0.4 on 2026-10-19 12:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from itertools import groupby
+
+BATCH_SIZE = 1000
+
+
+def played_games_to_progress(apps, schema_editor):
+    ''' Fold the completed PlayedGames rows of each user and game type into one bitset row '''
+    PlayedGames = apps.get_model('api', 'PlayedGames')
+    GameProgress = apps.get_model('api', 'GameProgress')
+    rows = PlayedGames.objects.filter(completed=True).order_by('user_id', 'game_type').values_list('user_id', 'game_type', 'game_id').iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for (user_id, game_type), games in groupby(rows, key=lambda row: row[:2]):
+        game_ids = [game_id for _, _, game_id in games]
+        bitset = bytearray(max(game_ids) // 8 + 1)
+        for game_id in game_ids:
+            bitset[game_id >> 3] |= 1 << (game_id & 7)
+        batch.append(GameProgress(user_id=user_id, game_type=game_type, completed=bytes(bitset)))
+        if len(batch) == BATCH_SIZE:
+            GameProgress.objects.bulk_create(batch)
+            batch = []
+    GameProgress.objects.bulk_create(batch)
+
+
+def progress_to_played_games(apps, schema_editor):
+    ''' Expand the bitsets back into one PlayedGames row per completed game '''
+    PlayedGames = apps.get_model('api', 'PlayedGames')
+    GameProgress = apps.get_model('api', 'GameProgress')
+    batch = []
+    for progress in GameProgress.objects.iterator(chunk_size=BATCH_SIZE):
+        for index, byte in enumerate(bytes(progress.completed)):
+            batch.extend(PlayedGames(user_id=progress.user_id, game_type=progress.game_type, game_id=index * 8 + bit, completed=True)
+                         for bit in range(8) if byte >> bit & 1)
+        if len(batch) >= BATCH_SIZE:
+            PlayedGames.objects.bulk_create(batch)
+            batch = []
+    PlayedGames.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_game_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_type', models.CharField(max_length=10)),
+                ('completed', models.BinaryField(default=bytes)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='game_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='gameprogress',
+            constraint=models.UniqueConstraint(fields=('user', 'game_type'), name='gameprogress_user_type_uniq'),
+        ),
+        migrations.RunPython(played_games_to_progress, progress_to_played_games),
+        migrations.DeleteModel(
+            name='PlayedGames',
+        ),
+    ]
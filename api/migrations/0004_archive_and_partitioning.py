@@ -0,0 +1,98 @@
+# Generated by Django 5.0.4 on 2026-10-19 12:41
+
+from django.db import migrations, models
+from django.utils import timezone
+from api.partitions import add_months, create_monthly_partition, default_partition_name, months_between
+
+SESSION_SCORES = ( # Session model, game type, and the field its final score is read from
+    ('BoxToBox', 'box2box', 'correct_scores'),
+    ('CareerPath', 'careerPath', 'result'),
+    ('GuessTheSide', 'formations', 'correct_scores'),
+)
+
+
+def record_final_scores(apps, schema_editor):
+    ''' Copy the final score of every completed game from its session row, so the row can later be archived '''
+    GameProgress = apps.get_model('api', 'GameProgress')
+    for model_name, game_type, field in SESSION_SCORES:
+        model = apps.get_model('api', model_name)
+        for progress in GameProgress.objects.filter(game_type=game_type).iterator(chunk_size=1000):
+            bitset = bytes(progress.completed)
+            game_ids = [index * 8 + bit for index, byte in enumerate(bitset) if byte for bit in range(8) if byte >> bit & 1]
+            if not game_ids:
+                continue
+            scores = bytearray(max(game_ids) + 1)
+            for game_id, score in model.objects.filter(user_id=progress.user_id, gameID__in=game_ids).values_list('gameID', field):
+                scores[game_id] = int(score)
+            progress.scores = bytes(scores)
+            progress.save(update_fields=['scores'])
+
+
+def partition_trivia(apps, schema_editor):
+    '''
+    Rebuild api_trivia as a table partitioned by month on created_at, with a default partition, and create the archive
+    table the finished matches are moved to. PostgreSQL needs the partition key in the primary key, so it becomes
+    (gameID, created_at), and gameID takes its values from a sequence, as partitioned tables can't have identity columns
+    '''
+    columns = [field.column for field in apps.get_model('api', 'Trivia')._meta.concrete_fields]
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE api_trivia RENAME TO api_trivia_unpartitioned')
+        cursor.execute('ALTER INDEX api_trivia_pkey RENAME TO api_trivia_unpartitioned_pkey')
+        cursor.execute('CREATE TABLE api_trivia (LIKE api_trivia_unpartitioned) PARTITION BY RANGE (created_at)')
+        cursor.execute('ALTER TABLE api_trivia ADD CONSTRAINT api_trivia_pkey PRIMARY KEY ("gameID", created_at)')
+        cursor.execute(f'CREATE TABLE {default_partition_name("api_trivia")} PARTITION OF api_trivia DEFAULT')
+
+        cursor.execute('SELECT MIN(created_at) FROM api_trivia_unpartitioned')
+        first = cursor.fetchone()[0] or timezone.now()
+        for month in months_between(first, add_months(timezone.now(), 1)): # Every month with matches, up to the next one
+            create_monthly_partition(cursor, 'api_trivia', month, columns)
+        cursor.execute(f'INSERT INTO api_trivia ({column_list}) SELECT {column_list} FROM api_trivia_unpartitioned')
+        cursor.execute('DROP TABLE api_trivia_unpartitioned')
+        # Added after the copy, as the deferred checks of the copied rows would otherwise block the ALTER TABLEs below
+        for column in ('player_one_id', 'player_two_id', 'result_id'):
+            cursor.execute(f'CREATE INDEX api_trivia_{column}_idx ON api_trivia ({column})')
+            cursor.execute(f'ALTER TABLE api_trivia ADD CONSTRAINT api_trivia_{column}_fk FOREIGN KEY ({column}) REFERENCES api_user (id) DEFERRABLE INITIALLY DEFERRED')
+
+        cursor.execute('CREATE SEQUENCE "api_trivia_gameID_seq" AS integer OWNED BY api_trivia."gameID"')
+        cursor.execute('''SELECT setval('"api_trivia_gameID_seq"', COALESCE(MAX("gameID"), 0) + 1, false) FROM api_trivia''')
+        cursor.execute('''ALTER TABLE api_trivia ALTER COLUMN "gameID" SET DEFAULT nextval('"api_trivia_gameID_seq"')''')
+
+        # No foreign keys, so archived matches never stop a user from being deleted
+        cursor.execute('CREATE TABLE api_trivia_archive (LIKE api_trivia) PARTITION BY RANGE (created_at)')
+        cursor.execute('ALTER TABLE api_trivia_archive ADD CONSTRAINT api_trivia_archive_pkey PRIMARY KEY ("gameID", created_at)')
+
+
+def unpartition_trivia(apps, schema_editor):
+    ''' Rebuild api_trivia as a plain table, bringing the archived matches back '''
+    columns = [field.column for field in apps.get_model('api', 'Trivia')._meta.concrete_fields]
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('CREATE TABLE api_trivia_plain (LIKE api_trivia)')
+        cursor.execute(f'''INSERT INTO api_trivia_plain ({column_list}) SELECT {column_list} FROM api_trivia
+                           UNION ALL SELECT {column_list} FROM api_trivia_archive''')
+        cursor.execute('DROP TABLE api_trivia, api_trivia_archive')
+        cursor.execute('ALTER TABLE api_trivia_plain RENAME TO api_trivia')
+        cursor.execute('ALTER TABLE api_trivia ADD CONSTRAINT api_trivia_pkey PRIMARY KEY ("gameID")')
+        cursor.execute('ALTER TABLE api_trivia ALTER COLUMN "gameID" ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute('''SELECT setval(pg_get_serial_sequence('api_trivia', 'gameID'), COALESCE(MAX("gameID"), 0) + 1, false) FROM api_trivia''')
+        for column in ('player_one_id', 'player_two_id', 'result_id'):
+            cursor.execute(f'CREATE INDEX api_trivia_{column}_idx ON api_trivia ({column})')
+            cursor.execute(f'ALTER TABLE api_trivia ADD CONSTRAINT api_trivia_{column}_fk FOREIGN KEY ({column}) REFERENCES api_user (id) DEFERRABLE INITIALLY DEFERRED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_game_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameprogress',
+            name='scores',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(record_final_scores, migrations.RunPython.noop),
+        migrations.RunPython(partition_trivia, unpartition_trivia),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.4 on 2026-10-19 12:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_archive_and_partitioning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='boxtobox',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='guesstheside',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='matchmakingqueue',
+            name='last_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.4 on 2026-10-19 12:50
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_session_heartbeats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trivia',
+            name='question_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.RunSQL( # The archive isn't a model, it follows api_trivia by hand
+            '''ALTER TABLE api_trivia_archive ADD COLUMN question_ids integer[] NOT NULL DEFAULT '{}';
+               ALTER TABLE api_trivia_archive ALTER COLUMN question_ids DROP DEFAULT''',
+            'ALTER TABLE api_trivia_archive DROP COLUMN question_ids',
+        ),
+        migrations.AddField(
+            model_name='userhistory',
+            name='seen_questions',
+            field=models.BinaryField(default=bytes),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.4 on 2026-10-19 12:53
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_match_questions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='triviabank',
+            name='answer_times',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='triviabank',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='triviabank',
+            name='correct',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='triviabank',
+            name='difficulty',
+            field=models.SmallIntegerField(choices=[(0, 'Easy'), (1, 'Medium'), (2, 'Hard')], default=1),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_question_statistics'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='boxtobox',
+            constraint=models.CheckConstraint(check=models.Q(('guesses__gte', 0), ('guesses__lte', 10)), name='boxtobox_guesses_bounds'),
+        ),
+        migrations.AddConstraint(
+            model_name='boxtobox',
+            constraint=models.CheckConstraint(check=models.Q(('correct_scores__gte', 0), ('correct_scores__lte', 9)), name='boxtobox_correct_scores_bounds'),
+        ),
+        migrations.AddConstraint(
+            model_name='boxtobox',
+            constraint=models.CheckConstraint(check=models.Q(('points_received__gte', 0), ('points_received__lte', 1)), name='boxtobox_points_received_bounds'),
+        ),
+        migrations.AddConstraint(
+            model_name='careerpath',
+            constraint=models.CheckConstraint(check=models.Q(('guesses__gte', 0), ('guesses__lte', 5)), name='careerpath_guesses_bounds'),
+        ),
+        migrations.AddConstraint(
+            model_name='careerpath',
+            constraint=models.CheckConstraint(check=models.Q(('points_received__gte', 0), ('points_received__lte', 1)), name='careerpath_points_received_bounds'),
+        ),
+        migrations.AddConstraint(
+            model_name='guesstheside',
+            constraint=models.CheckConstraint(check=models.Q(('guesses__gte', 0), ('guesses__lte', 15)), name='guesstheside_guesses_bounds'),
+        ),
+        migrations.AddConstraint(
+            model_name='guesstheside',
+            constraint=models.CheckConstraint(check=models.Q(('correct_scores__gte', 0), ('correct_scores__lte', 11)), name='guesstheside_correct_scores_bounds'),
+        ),
+        migrations.AddConstraint(
+            model_name='guesstheside',
+            constraint=models.CheckConstraint(check=models.Q(('points_received__gte', 0), ('points_received__lte', 11)), name='guesstheside_points_received_bounds'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.4 on 2026-10-19 13:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_session_invariants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionHistory',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('seen_questions', models.BinaryField(default=bytes)),
+            ],
+        ),
+        migrations.RunSQL( # The filters move with their users, the history rows stay
+            'INSERT INTO api_questionhistory (user_id, seen_questions) SELECT user_id, seen_questions FROM api_userhistory',
+            'UPDATE api_userhistory SET seen_questions = api_questionhistory.seen_questions FROM api_questionhistory '
+            'WHERE api_userhistory.user_id = api_questionhistory.user_id',
+        ),
+        migrations.RemoveField(
+            model_name='userhistory',
+            name='seen_questions',
+        ),
+    ]
@@ -1,5 +1,6 @@
+from operator import attrgetter
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db import models
+from django.db import models, connection
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, RegexValidator
@@ -7,6 +8,8 @@ from django.core.exceptions import ValidationError
 from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.utils import timezone
+from django.db.models.functions import Lower
+from api.http_cache import bump_leaderboard, bump_progress
 
 year_validator = RegexValidator(regex=r'^\d{4}$', message="Enter a valid year in YYYY format") # Simple regex pattern to validate the year of a club's season
 
@@ -51,6 +54,11 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(Lower('email'), name='user_email_lower_idx'), # Case-insensitive email lookups when logging in
+        ]
+
     def __str__(self):
         ''' String representation of the user as username '''
         return self.username
@@ -68,11 +76,25 @@ class UserHistory(models.Model):
 
     user_points = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-matches_won'], name='history_matches_won_idx'), # The leaderboard ranks users by matches won
+        ]
 
     def __str__(self):
         ''' String representation of the user history '''
         return f'{self.user.email} - History'
 
+class QuestionHistory(models.Model):
+    ''' Trivia questions a user saw recently, kept apart from their UserHistory so picking a match's questions doesn't put
+        them on the leaderboard '''
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    seen_questions = models.BinaryField(default=bytes) # A fixed size filter (api/seen_questions.py)
+
+    def __str__(self):
+        return f'{self.user_id} - Seen questions'
+
 class UserChannel(models.Model):
     ''' Model to store the channel name for a user in a trivia session '''
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -81,27 +103,97 @@ class UserChannel(models.Model):
     def __str__(self):
         return self.user.username + " - " + self.channel_name
         
-class PlayedGames(models.Model):
-    ''' Tracks which static games the user has played, to prevent point farming '''
-
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='played_games')
-    game_type = models.CharField(max_length=100) # The particular type of game they played
-    game_id = models.IntegerField() # The id of that game
-    completed = models.BooleanField(default=False)  # Indicates if the game was completed
+class GameProgress(models.Model):
+    '''
+    Tracks which static games the user has completed, to prevent point farming. One row per user and game type (e.g. Box2Box),
+    holding a bitset of the completed game ids: bit n (bit n % 8 of byte n // 8, as PostgreSQL's get_bit/set_bit number them) is set
+    once game n is completed. Checking a game or listing them all reads a single row, however many games the user has played.
+    It also keeps the final score of every completed game, so a finished session row is no longer needed once it's been recorded.
+    '''
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='game_progress', db_index=False) # Indexed by the constraint below
+    game_type = models.CharField(max_length=10) # box2box, careerPath or formations
+    completed = models.BinaryField(default=bytes) # Bitset of the completed game ids
+    scores = models.BinaryField(default=bytes) # Byte n is the final score of game n: the correct answers, or 1 for a won career path
 
     class Meta:
-        unique_together = ('user', 'game_type', 'game_id') # Ensure the user can only play a game once for that particular type (e.g. Box2Box)
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'game_type'], name='gameprogress_user_type_uniq'),
+        ]
 
     def __str__(self):
-        ''' String representation of the played game '''
-        completion_status = "completed" if self.completed else "in progress"
-        return f'{self.user.username} - {self.game_type} Game ID {self.game_id} ({completion_status})'
+        ''' String representation of the progress '''
+        return f'{self.user.username} - {self.game_type} ({len(self.game_ids(self.completed))} completed)'
+
+    @staticmethod
+    def bitset(game_ids):
+        ''' Bitset with the bits of the game ids set '''
+        bitset = bytearray(max(game_ids, default=-1) // 8 + 1)
+        for game_id in game_ids:
+            bitset[game_id >> 3] |= 1 << (game_id & 7)
+        return bytes(bitset)
+
+    @staticmethod
+    def game_ids(bitset):
+        ''' The game ids set in a bitset, in ascending order '''
+        return [index * 8 + bit for index, byte in enumerate(bitset) if byte for bit in range(8) if byte >> bit & 1]
+
+    @classmethod
+    def completed_bitset(cls, user, game_type):
+        ''' The user's bitset for a game type (empty when no game was completed) '''
+        bitset = cls.objects.filter(user=user, game_type=game_type).values_list('completed', flat=True).first()
+        return bytes(bitset) if bitset is not None else b''
+
+    @classmethod
+    def is_completed(cls, user, game_type, game_id):
+        ''' Whether the user completed the game '''
+        bitset = cls.completed_bitset(user, game_type)
+        return game_id >> 3 < len(bitset) and bool(bitset[game_id >> 3] >> (game_id & 7) & 1)
+
+    @classmethod
+    def final_score(cls, user, game_type, game_id):
+        ''' The final score of a completed game, or None when the user hasn't completed it '''
+        progress = cls.objects.filter(user=user, game_type=game_type).values_list('completed', 'scores').first()
+        if progress is None:
+            return None
+        bitset, scores = bytes(progress[0]), bytes(progress[1])
+        if game_id >> 3 >= len(bitset) or not bitset[game_id >> 3] >> (game_id & 7) & 1:
+            return None
+        return scores[game_id] if game_id < len(scores) else 0
+
+    @classmethod
+    def completed_ids(cls, user, game_type):
+        ''' The ids of every game of the type the user completed '''
+        return set(cls.game_ids(cls.completed_bitset(user, game_type)))
+
+    @classmethod
+    def mark_completed(cls, user, game_type, game_id, score=0):
+        ''' Set the game's bit and score in a single statement, creating the row if needed. Games finishing at the same time can't lose each other's bit.
+        Returns whether the bit was newly set, False when the game was already completed (its score is kept) '''
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''INSERT INTO {table} (user_id, game_type, completed, scores) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id, game_type) DO UPDATE SET
+                    completed = set_bit({table}.completed || decode(repeat('00', greatest(0, %s - length({table}.completed))), 'hex'), %s, 1),
+                    scores = set_byte({table}.scores || decode(repeat('00', greatest(0, %s - length({table}.scores))), 'hex'), %s, %s)
+                WHERE CASE WHEN length({table}.completed) > %s THEN get_bit({table}.completed, %s) = 0 ELSE TRUE END
+                RETURNING 1''',
+                # Both are zero padded up to the game's byte first. A row whose bit is set already isn't updated, nor returned
+                [user.pk, game_type, cls.bitset([game_id]), bytes(game_id) + bytes([score]), game_id // 8 + 1, game_id, game_id + 1, game_id, score,
+                 game_id // 8, game_id],
+            )
+            completed = cursor.fetchone() is not None
+        if completed:
+            bump_progress(user.pk, game_type) # The user's listing of the game type changed
+        return completed
 
     
 class MatchmakingQueue(models.Model):
     ''' Model to store users in the matchmaking queue '''
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(auto_now_add=True) # The time they entered the queue (not used for anything apart from admin logs)
+    last_seen = models.DateTimeField(default=timezone.now) # Heartbeat of the consumer holding the entry, which expires once it stops (e.g. its worker died)
 
     def __str__(self):
         ''' String representation of the user in the matchmaking queue '''
@@ -127,6 +219,7 @@ class Trivia(models.Model):
     score_playerTwo = models.IntegerField(default=0, validators=[MaxValueValidator(10)])
 
     result = models.ForeignKey(User, on_delete=models.CASCADE, related_name="Winner", null=True, default=None)
+    question_ids = ArrayField(models.IntegerField(), default=list, blank=True) # Chosen when the match is created, so both players get the same questions
 
     def __str__(self):
         ''' String representation of the game '''
@@ -181,13 +274,42 @@ class Trivia(models.Model):
         user_historyOne.save()
         user_historyTwo.save()
         self.save()
+        bump_leaderboard()
+
+
+class Invariants:
+    ''' Bounds of the tamper sensitive fields of a solo game session, field -> (lowest, highest). They are compiled into
+        attribute getters checked by the session's save (instead of a full_clean of every field, the club names of a box to
+        box session included, on every guess), and the database enforces the same bounds as check constraints '''
+
+    def __init__(self, name, **bounds):
+        self.name = name # Prefix of the constraint names
+        self.bounds = bounds
+        self.compiled = tuple((attrgetter(field), low, high) for field, (low, high) in bounds.items())
+        self.hold = lambda row: all(low <= get(row) <= high for get, low, high in self.compiled)
+
+    def check(self, row):
+        ''' Raise ValidationError when a bound of the row (a session, or any object with its fields) doesn't hold '''
+        if not self.hold(row):
+            raise ValidationError({field: f'{field} must be between {low} and {high}' for field, (low, high) in self.bounds.items()
+                                   if not low <= getattr(row, field) <= high})
+
+    def constraints(self):
+        return [models.CheckConstraint(check=models.Q(**{f'{field}__gte': low, f'{field}__lte': high}), name=f'{self.name}_{field}_bounds')
+                for field, (low, high) in self.bounds.items()]
+
+
+BOX2BOX_INVARIANTS = Invariants('boxtobox', guesses=(0, 10), correct_scores=(0, 9), points_received=(0, 1)) # 10 guesses for 9 cells, 1 point
+CAREER_PATH_INVARIANTS = Invariants('careerpath', guesses=(0, 5), points_received=(0, 1))
+GUESS_THE_SIDE_INVARIANTS = Invariants('guesstheside', guesses=(0, 15), correct_scores=(0, 11), points_received=(0, 11))
 
 
 class BoxToBox(models.Model):
     ''' Model to store the session of a box to box game '''
+    invariants = BOX2BOX_INVARIANTS
 
     gameID = models.IntegerField() #Game session id
-    user = models.ForeignKey(User, on_delete=models.CASCADE) #User assigned to game session
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False) #User assigned to game session (indexed by the unique constraint)
 
     #Game fields - 6 clubs, 3 per axis
     club_x1 = models.CharField(max_length=100)
@@ -201,14 +323,17 @@ class BoxToBox(models.Model):
     guesses = models.IntegerField(default=0) #Amount of attempts used (lower is better)
 
     points_received = models.IntegerField(default=0, validators=[MaxValueValidator(1)]) #Amount of points earnt for the game
+    updated_at = models.DateTimeField(auto_now=True) # Last guess, the cached grid expires STATE_TIMEOUT after it
 
-    def save(self, *args, **kwargs):
-        ''' Ensure no tampering, as a user cannot achieve more than 1 point '''
-        if self.points_received > 1:
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'gameID'], name='boxtobox_user_game_uniq'), # One session per user and game, also the index of the session lookups
+            *BOX2BOX_INVARIANTS.constraints(),
+        ]
 
-            raise ValidationError("Points achieved cannot exceed 1")
-        
-        self.full_clean()
+    def save(self, *args, **kwargs):
+        ''' Ensure no tampering, as a user cannot achieve more than 1 point (or more guesses and cells than the game has) '''
+        self.invariants.check(self)
         super(BoxToBox, self).save(*args, **kwargs) # Save the model with any previously constructed arguments
 
     def __str__(self):
@@ -218,21 +343,25 @@ class BoxToBox(models.Model):
 
 class CareerPath(models.Model):
     ''' Model to store the session of a career path game '''
+    invariants = CAREER_PATH_INVARIANTS
 
     gameID = models.IntegerField() #Game session id
-    user = models.ForeignKey(User, on_delete=models.CASCADE) # User assigned to game session
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False) # User assigned to game session (indexed by the unique constraint)
     player_guess = models.CharField(max_length=100) # Player to be guessed
     guesses = models.IntegerField(default=0) # Amount of attempts used
     result = models.BooleanField(default=False)
 
     points_received = models.IntegerField(default=0, validators=[MaxValueValidator(1)]) # Points earned for the game
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'gameID'], name='careerpath_user_game_uniq'), # One session per user and game, also the index of the session lookups
+            *CAREER_PATH_INVARIANTS.constraints(),
+        ]
+
     def save(self, *args, **kwargs):
         ''' Ensure no tampering, as a user cannot achieve more than 1 point'''
-        if self.points_received > 1:
-            raise ValidationError("Points achieved cannot exceed 1")
-        
-        self.full_clean()
+        self.invariants.check(self)
         super(CareerPath, self).save(*args, **kwargs)
 
     def __str__(self):
@@ -243,8 +372,9 @@ class CareerPath(models.Model):
 
 class GuessTheSide(models.Model):
     ''' Model to store the session of a guess the side game '''
+    invariants = GUESS_THE_SIDE_INVARIANTS
     gameID = models.IntegerField() #Game session id
-    user = models.ForeignKey(User, on_delete=models.CASCADE) #User assigned to game session
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False) #User assigned to game session (indexed by the unique constraint)
 
     # Game fields
     team_guess = models.CharField(null=False, max_length=100) # Simply their club name
@@ -255,13 +385,17 @@ class GuessTheSide(models.Model):
     result = models.BooleanField(default=False)
 
     points_received = models.IntegerField(default=0, validators=[MaxValueValidator(11)]) #Amount of points earnt for the game
+    updated_at = models.DateTimeField(auto_now=True) # Last guess, the cached formation expires STATE_TIMEOUT after it
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'gameID'], name='guesstheside_user_game_uniq'), # One session per user and game, also the index of the session lookups
+            *GUESS_THE_SIDE_INVARIANTS.constraints(),
+        ]
 
     def save(self, *args, **kwargs):
         ''' Ensure no tampering, as a user cannot achieve more than 11 points '''
-        if self.points_received > 11:
-            raise ValidationError("Points achieved cannot exceed 11")
-        
-        self.full_clean()
+        self.invariants.check(self)
         super(GuessTheSide, self).save(*args, **kwargs)
 
     def __str__(self):
@@ -271,14 +405,40 @@ class GuessTheSide(models.Model):
 #Answer models (Banks)
     
 class TriviaBank(models.Model):
-    ''' Model to store the trivia questions and answers '''
+    ''' Model to store the trivia questions and answers, with statistics of how they were answered in matches '''
+
+    EASY, MEDIUM, HARD = 0, 1, 2
+    DIFFICULTIES = [(EASY, 'Easy'), (MEDIUM, 'Medium'), (HARD, 'Hard')]
+    ANSWER_TIME_BUCKETS = (1, 2, 3, 5, 8, 13, 20) # Upper bounds in seconds, answer_times has one more count for slower answers
+
     question = models.CharField(max_length=250)
     answer = ArrayField(models.CharField(max_length=250), default=list, blank=True)
 
+    # Added to in batches by api/question_stats.py, which also keeps the difficulty in line with them
+    attempts = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+    answer_times = ArrayField(models.IntegerField(), default=list, blank=True) # Answers counted per ANSWER_TIME_BUCKETS bucket
+    difficulty = models.SmallIntegerField(choices=DIFFICULTIES, default=MEDIUM) # Medium until enough answers were recorded
+
     def __str__(self):
         ''' String representation of the trivia question '''
         return self.question
 
+    @property
+    def correct_rate(self):
+        ''' Fraction of the attempts answered correctly (None before the first attempt) '''
+        return self.correct / self.attempts if self.attempts else None
+
+    @property
+    def median_answer_time(self):
+        ''' Upper bound of the bucket holding the median answer time, in seconds (None before the first answer, inf when slower than every bucket) '''
+        total, cumulative = sum(self.answer_times), 0
+        for bound, count in zip(self.ANSWER_TIME_BUCKETS + (float('inf'),), self.answer_times):
+            cumulative += count
+            if total and cumulative * 2 >= total:
+                return bound
+        return None
+
 class ClubBank(models.Model):
     ''' Model to store the club names for guess the side, and their description '''
     team_name = models.CharField(max_length=250)
@@ -298,7 +458,7 @@ class PlayerBank(models.Model):
 class CareerBank(models.Model):
     ''' Model to store the career path information for a single club '''
 
-    player = models.ForeignKey(PlayerBank, related_name='careers', on_delete=models.CASCADE)
+    player = models.ForeignKey(PlayerBank, related_name='careers', on_delete=models.CASCADE, db_index=False) # Indexed by the covering index below
     team_name = models.CharField(max_length=250) # The team at the time of the player's career
     appearances = models.IntegerField()
     goals = models.IntegerField()
@@ -306,16 +466,27 @@ class CareerBank(models.Model):
     is_loan = models.BooleanField(default=False) # Indicates if the player was on loan at the club (not always required)
     season = models.CharField(max_length=4, validators=[year_validator], help_text="Enter the year in YYYY") # Abides by the four digit season format
 
+    class Meta:
+        indexes = [
+            # A career path is read by player, with all of these fields, so the index alone answers it
+            models.Index(fields=['player'], include=['team_name', 'appearances', 'goals', 'assists', 'is_loan', 'season'], name='career_player_covering_idx'),
+        ]
+
     def __str__(self):
         ''' Simple print wrapper (used for admin panel)'''
         return self.team_name
     
 class FormationBank(models.Model):
     ''' Model to store the entire formations for guess the side '''
-    club = models.ForeignKey(ClubBank, on_delete=models.CASCADE)
+    club = models.ForeignKey(ClubBank, on_delete=models.CASCADE, db_index=False) # Indexed by the covering index below
     player_names = ArrayField(models.CharField(max_length=250), default=list, blank=True) # The player that was in that side
     position = models.CharField(max_length=10)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['club'], include=['player_names', 'position'], name='formation_club_covering_idx'), # A side is read by club, with these fields
+        ]
+
     def __str__(self):
         ''' Simple print wrapper (used for admin panel)'''
         return f"{self.club} - {self.player_names}"
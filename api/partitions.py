@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+# Monthly range partitions of the tables partitioned on created_at (api_trivia and its archive). A partition covers
+# [first of the month, first of the next month) in UTC, and is named <table>_pYYYYMM. The live table also has a default
+# partition, catching rows of months whose partition was not created in time, until they are moved into one.
+#
+# PostgreSQL can only enforce a primary key that includes the partition key, so api_trivia's is ("gameID", created_at). Only
+# its sequence keeps gameID unique across the partitions: a row inserted with an explicit gameID is not checked against the
+# other months. A lookup by gameID alone (as the consumers make) probes the primary key index of every live partition, which
+# the archiving keeps to the last few months.
+
+
+def month_start(moment):
+    ''' First instant of the moment's month, in UTC '''
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, months):
+    ''' The start of the month a number of months after (or before) the given month start '''
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def months_between(first, last):
+    ''' Starts of every month from first's month to last's month, inclusive '''
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partitions(cursor, table):
+    ''' Names of the table's partitions '''
+    cursor.execute('SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass', [table])
+    return {name for name, in cursor.fetchall()}
+
+
+def create_monthly_partition(cursor, table, month, columns):
+    '''
+    Create the partition of a month if it doesn't exist. When the table has a default partition, the month's rows it
+    holds are moved into the new partition before it is attached, as PostgreSQL refuses a partition overlapping rows of the default.
+    '''
+    name = partition_name(table, month)
+    existing = partitions(cursor, table)
+    if name in existing:
+        return False
+    bounds = [month, add_months(month, 1)]
+    default = default_partition_name(table)
+    if default not in existing:
+        cursor.execute(f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)', bounds)
+        return True
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(f'''WITH moved AS (DELETE FROM {default} WHERE created_at >= %s AND created_at < %s RETURNING {column_list})
+                       INSERT INTO {name} ({column_list}) SELECT {column_list} FROM moved''', bounds)
+    cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', bounds)
+    return True
+
+
+def monthly_partitions(cursor, table):
+    ''' The table's monthly partitions, as {month start: name} '''
+    prefix = f'{table}_p'
+    return {datetime.strptime(name[len(prefix):], '%Y%m').replace(tzinfo=timezone.utc): name
+            for name in partitions(cursor, table) if name.startswith(prefix)}
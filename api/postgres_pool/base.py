@@ -0,0 +1,232 @@
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.utils.asyncio import async_unsafe
+from api import metrics
+
+# PostgreSQL backend whose connections are borrowed from a process wide pool, configured by OPTIONS['pool'] (same keys as the pool of
+# Django 5.1+, which needs psycopg 3). Closing a connection, e.g. at the end of every request or database_sync_to_async call, returns it
+# to the pool, so threads and requests never pay for a TCP and authentication handshake, and a worker never holds more than max_size.
+
+pools = {} # (alias, database, host, port, user) -> ConnectionPool
+pools_lock = threading.Lock()
+
+
+def pool_states():
+    ''' Connections of every pool by state, for the pool gauge '''
+    states = {}
+    for (alias, *_), pool in list(pools.items()):
+        for state, count in (('idle', len(pool.idle)), ('in_use', pool.in_use)):
+            states[(alias, state)] = states.get((alias, state), 0) + count
+    return states
+
+
+POOL_CONNECTIONS = metrics.gauge('db_pool_connections', 'Pooled database connections by state', ('alias', 'state'), function=pool_states)
+POOL_CHECKOUTS = metrics.counter('db_pool_checkouts_total', 'Connections handed out by the pool', ('alias',))
+POOL_WAIT = metrics.histogram('db_pool_wait_seconds', 'Time waited for a pooled connection, including opening or checking it', ('alias',))
+POOL_OPENED = metrics.counter('db_pool_connections_opened_total', 'Connections opened by the pool', ('alias',))
+POOL_DISCARDED = metrics.counter('db_pool_connections_discarded_total', 'Connections closed by the pool', ('alias', 'reason'))
+POOL_TIMEOUTS = metrics.counter('db_pool_timeouts_total', 'Checkouts that gave up waiting for a free connection', ('alias',))
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    ''' No connection became free in time. Raised as a driver error, so Django reports it as an OperationalError '''
+
+
+class ConnectionPool:
+    '''
+    Thread safe pool of psycopg2 connections to one database, shared by every thread of the process.
+
+    Idle connections are reused most recent first, so the least used ones idle out. A connection that sat idle for longer than
+    check_after is checked with a query before being handed out, and one older than max_lifetime is replaced, so a restarted
+    server or a dropped connection costs a reconnect rather than a failed request.
+    '''
+
+    def __init__(self, alias, conn_params, min_size=0, max_size=20, timeout=10.0, max_idle=300.0, max_lifetime=3600.0, check_after=30.0):
+        self.alias = alias
+        self.conn_params = conn_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout # Seconds to wait for a free connection when max_size are in use
+        self.max_idle = max_idle # Seconds an idle connection is kept, while there are more than min_size
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.condition = threading.Condition()
+        self.idle = [] # [(connection, returned at)], most recently returned last
+        self.opened_at = {} # Connection -> time it was opened
+        self.in_use = 0
+        self.size = 0 # Connections open, idle or in use
+
+    def getconn(self):
+        ''' Check out a connection, reusing an idle one, opening a new one under max_size, or waiting for one to be returned '''
+        start = time.monotonic()
+        while True:
+            candidate = None
+            with self.condition:
+                while not self.idle and self.size >= self.max_size:
+                    remaining = start + self.timeout - time.monotonic()
+                    if remaining <= 0:
+                        POOL_TIMEOUTS.inc(self.alias)
+                        raise PoolTimeout(f'No database connection became free within {self.timeout}s ({self.max_size} in use)')
+                    self.condition.wait(remaining)
+                if self.idle:
+                    candidate = self.idle.pop()
+                else:
+                    self.size += 1 # Reserve the slot, the connection is opened outside the lock
+
+            if candidate is None:
+                connection = self.open()
+                break
+            connection = self.validate(*candidate) # None when the connection was discarded
+            if connection is not None:
+                break
+
+        with self.condition:
+            self.in_use += 1
+        POOL_CHECKOUTS.inc(self.alias)
+        POOL_WAIT.observe(time.monotonic() - start, self.alias)
+        return connection
+
+    def putconn(self, connection):
+        ''' Return a connection. Any transaction left open is rolled back, and a broken or expired connection is closed '''
+        try:
+            if not connection.closed and connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            if not connection.closed:
+                connection.autocommit = True
+        except psycopg2.Error:
+            pass # The connection is broken, so closed below
+
+        now = time.monotonic()
+        discard = []
+        with self.condition:
+            self.in_use -= 1
+            if connection.closed:
+                discard.append((connection, 'broken'))
+            elif now - self.opened_at[connection] > self.max_lifetime:
+                discard.append((connection, 'lifetime'))
+            else:
+                self.idle.append((connection, now))
+            while self.idle and len(self.idle) + self.in_use > self.min_size and now - self.idle[0][1] > self.max_idle:
+                discard.append((self.idle.pop(0)[0], 'idle'))
+            self.size -= len(discard)
+            for stale, reason in discard:
+                self.opened_at.pop(stale, None)
+            self.condition.notify(len(discard) + 1)
+        for stale, reason in discard:
+            self.discard(stale, reason)
+
+    def open(self):
+        ''' Open a new connection for a slot already reserved in size '''
+        try:
+            connection = psycopg2.connect(**self.conn_params)
+            # As Django's backend does: skip psycopg2's json decoding, as Django decodes JSONField values itself
+            psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        except BaseException:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.opened_at[connection] = time.monotonic()
+        POOL_OPENED.inc(self.alias)
+        return connection
+
+    def validate(self, connection, returned_at):
+        ''' Return the idle connection if it can still be used, otherwise close it and return None '''
+        now = time.monotonic()
+        reason = None
+        if connection.closed:
+            reason = 'broken'
+        elif now - self.opened_at[connection] > self.max_lifetime:
+            reason = 'lifetime'
+        elif now - returned_at > self.check_after:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            except psycopg2.Error:
+                reason = 'failed_check'
+        if reason is None:
+            return connection
+        with self.condition:
+            self.size -= 1
+            self.opened_at.pop(connection, None)
+            self.condition.notify()
+        self.discard(connection, reason)
+        return None
+
+    def discard(self, connection, reason):
+        POOL_DISCARDED.inc(self.alias, reason)
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def close(self):
+        ''' Close every idle connection (connections in use are closed when they are returned) '''
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            for connection, returned_at in idle:
+                self.opened_at.pop(connection, None)
+            self.max_lifetime = -1 # Connections still in use are closed on return
+        for connection, returned_at in idle:
+            self.discard(connection, 'closed')
+
+
+def get_pool(alias, conn_params, options):
+    ''' The process wide pool for the connection parameters, created on first use '''
+    key = (alias, conn_params.get('dbname'), conn_params.get('host'), conn_params.get('port'), conn_params.get('user'))
+    pool = pools.get(key)
+    if pool is None:
+        with pools_lock:
+            pool = pools.get(key)
+            if pool is None:
+                pool = pools[key] = ConnectionPool(alias, conn_params, **options)
+    return pool
+
+
+def close_pools(database=None):
+    ''' Close and forget the pools, or only those of one database (e.g. before it is dropped) '''
+    with pools_lock:
+        closing = [key for key in pools if database is None or key[1] == database]
+        closing = [pools.pop(key) for key in closing]
+    for pool in closing:
+        pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(test_database_name) # Idle pooled connections would stop the database from being dropped
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    ''' PostgreSQL backend borrowing its connections from the process wide pool '''
+    creation_class = DatabaseCreation
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None) # Pool options, not connection parameters
+        return conn_params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = IsolationLevel(options.get('isolation_level', IsolationLevel.READ_COMMITTED))
+        self.pool = get_pool(self.alias, conn_params, options.get('pool', {}))
+        connection = self.pool.getconn()
+        if 'isolation_level' in options:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    @async_unsafe
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection) # Returned to the pool rather than closed
@@ -0,0 +1,122 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+import weakref
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import connection
+from api import metrics
+from api.models import TriviaBank
+from api.questions import bump_version
+
+# Per question statistics of the trivia matches. Answers are counted in memory by the consumers (record), at the cost of a
+# dictionary update, and every worker adds its counts to the bank in a single statement every QUESTION_STATS_FLUSH_INTERVAL
+# seconds. The same statement moves each question to the difficulty bucket its correct rate now puts it in, and the workers'
+# question banks are reloaded (at most every QUESTION_STATS_RELOAD_INTERVAL seconds) when any question changed bucket.
+# Counts recorded since the last flush are lost if the worker dies.
+
+logger = logging.getLogger('api.performance')
+
+MIN_ATTEMPTS = 20 # Attempts before a question's correct rate decides its difficulty
+EASY_RATE = 0.7 # Correct rates from here up are easy
+HARD_RATE = 0.35 # and from here down hard
+
+STATS_FLUSHES = metrics.counter('question_stats_flushes_total', 'Question statistic flushes', ('outcome',))
+STATS_FLUSHED = metrics.counter('question_stats_answers_flushed_total', 'Answers added to the question statistics')
+STATS_PENDING = metrics.gauge('question_stats_pending_questions', 'Questions with answers not yet flushed', function=lambda: {(): len(question_stats.pending)})
+
+running_flushers = weakref.WeakKeyDictionary() # Event loop -> its flusher task
+
+
+class QuestionStats:
+    ''' Answer counts waiting to be flushed, safe to share between the threads of a worker '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {} # Question id -> [attempts, correct, count per answer time bucket...]
+        self.last_reload = 0 # When a difficulty change last reloaded the question banks (monotonic)
+
+    def record(self, question_id, correct, answer_time):
+        ''' Count an answer and how many seconds it took '''
+        bucket = bisect.bisect_left(TriviaBank.ANSWER_TIME_BUCKETS, answer_time)
+        with self.lock:
+            counts = self.pending.get(question_id)
+            if counts is None:
+                counts = self.pending[question_id] = [0] * (len(TriviaBank.ANSWER_TIME_BUCKETS) + 3)
+            counts[0] += 1
+            counts[1] += correct
+            counts[2 + bucket] += 1
+
+    def flush(self):
+        ''' Add the pending counts to the bank, returning how many questions changed difficulty '''
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        try:
+            changed = self.write(pending)
+        except Exception:
+            with self.lock: # Put the counts back, to be added by the next flush
+                for question_id, counts in pending.items():
+                    merged = self.pending.setdefault(question_id, [0] * len(counts))
+                    merged[:] = [a + b for a, b in zip(merged, counts)]
+            STATS_FLUSHES.inc('failed')
+            raise
+        STATS_FLUSHES.inc('flushed')
+        STATS_FLUSHED.inc(amount=sum(counts[0] for counts in pending.values()))
+
+        now = time.monotonic()
+        if changed and now - self.last_reload >= settings.QUESTION_STATS_RELOAD_INTERVAL:
+            self.last_reload = now
+            bump_version() # The question banks pick up the new difficulty buckets
+        return changed
+
+    def write(self, pending):
+        ''' A single UPDATE for every pending question, returning how many changed difficulty '''
+        table = connection.ops.quote_name(TriviaBank._meta.db_table)
+        rows, params = [], []
+        for question_id, counts in pending.items():
+            rows.append('(%s, %s, %s, %s::integer[])')
+            params += [question_id, counts[0], counts[1], counts[2:]]
+        with connection.cursor() as cursor:
+            # The FROM copy of the table still holds the values before the update, to tell which difficulties changed
+            cursor.execute(f'''
+                UPDATE {table} AS question SET
+                    attempts = question.attempts + stats.attempts,
+                    correct = question.correct + stats.correct,
+                    answer_times = ARRAY(SELECT COALESCE(old, 0) + COALESCE(new, 0)
+                                         FROM unnest(question.answer_times, stats.answer_times) WITH ORDINALITY AS times(old, new, position)
+                                         ORDER BY position),
+                    difficulty = CASE
+                        WHEN question.attempts + stats.attempts < %s THEN {TriviaBank.MEDIUM}
+                        WHEN question.correct + stats.correct >= %s * (question.attempts + stats.attempts) THEN {TriviaBank.EASY}
+                        WHEN question.correct + stats.correct <= %s * (question.attempts + stats.attempts) THEN {TriviaBank.HARD}
+                        ELSE {TriviaBank.MEDIUM} END
+                FROM (VALUES {', '.join(rows)}) AS stats(id, attempts, correct, answer_times), {table} AS before
+                WHERE question.id = stats.id AND before.id = stats.id
+                RETURNING question.difficulty <> before.difficulty''', [MIN_ATTEMPTS, EASY_RATE, HARD_RATE] + params)
+            return sum(changed for changed, in cursor.fetchall())
+
+
+question_stats = QuestionStats()
+
+
+async def run_flusher():
+    ''' Flush the statistics every QUESTION_STATS_FLUSH_INTERVAL seconds, for as long as the event loop runs '''
+    while True:
+        await asyncio.sleep(settings.QUESTION_STATS_FLUSH_INTERVAL)
+        try:
+            await database_sync_to_async(question_stats.flush)()
+        except Exception:
+            logger.exception('Question statistics flush failed')
+
+
+def start_stats_flusher():
+    ''' Start the flusher once per event loop '''
+    if not settings.QUESTION_STATS_FLUSH_INTERVAL:
+        return
+    loop = asyncio.get_running_loop()
+    if loop not in running_flushers:
+        running_flushers[loop] = loop.create_task(run_flusher())
@@ -0,0 +1,186 @@
+import bisect
+import logging
+import random
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from api import metrics
+from api.models import TriviaBank
+
+# Process-wide cache of the trivia bank, which is read-only at runtime. Every worker keeps the question ids in a sorted array,
+# and the questions themselves in pages of consecutive ids. A bank of up to QUESTION_BANK_PRELOAD questions is loaded whole,
+# so starting a match or checking an answer never reads the database. A larger one keeps a hot subset of that many questions
+# in random pages, swapping one page for another at every version check so matches cycle through the whole bank, and loads
+# any other page lazily when one of its questions is asked for. Resident questions are also split by difficulty, so a match
+# gets a balanced curve by drawing a few questions from each.
+#
+# Changes to the bank bump a version stamp in the shared cache (bump_version), and every worker reloads once it sees it.
+
+logger = logging.getLogger('api.performance')
+
+VERSION_KEY = 'trivia_bank_version'
+PAGE_SIZE = 500 # Questions per page
+MAX_DRAWS = 20 # Random draws per question before excluded questions are used
+DIFFICULTY_MIX = (0.3, 0.4, 0.3) # Share of easy, medium and hard questions in a match, asked in that order
+
+Question = namedtuple('Question', 'id question answers') # answers holds the accepted answers, upper-cased
+
+QUESTION_BANK_LOADS = metrics.counter('question_bank_loads_total', 'Question bank reloads', ('reason',))
+QUESTION_BANK_PAGE_LOADS = metrics.counter('question_bank_page_loads_total', 'Pages of questions read from the database after the load', ('reason',))
+QUESTION_BANK_SIZE = metrics.gauge('question_bank_questions', 'Questions held by the question bank cache', function=lambda: {(): question_bank.resident_count()})
+
+
+def draw(population, count, exclude=None):
+    '''
+    Distinct random items of the population, avoiding the excluded ones while it can. Each draw is O(1), and while most of the
+    population isn't excluded few are wasted. Excluded items fill the gap when MAX_DRAWS per item weren't enough
+    '''
+    count = min(count, len(population))
+    chosen, excluded, drawn = [], [], set()
+    for _ in range(count * MAX_DRAWS):
+        if len(chosen) == count:
+            return chosen
+        item = population[random.randrange(len(population))]
+        if item in drawn:
+            continue
+        drawn.add(item)
+        (excluded if exclude and exclude(item) else chosen).append(item)
+    chosen.extend(excluded[:count - len(chosen)]) # A repeat is better than a short match
+    if len(chosen) < count: # Only a tiny population gets here, so the scan is cheap
+        chosen.extend(random.sample([item for item in population if item not in drawn], count - len(chosen)))
+    return chosen
+
+
+def difficulty_curve(count):
+    ''' How many questions of each difficulty a match of count questions has, easiest first '''
+    easy, hard = round(count * DIFFICULTY_MIX[0]), round(count * DIFFICULTY_MIX[2])
+    return [(TriviaBank.EASY, easy), (TriviaBank.MEDIUM, count - easy - hard), (TriviaBank.HARD, hard)]
+
+
+def warm_question_bank():
+    ''' Load the bank when the worker starts. A worker still starts when it can't (e.g. the database isn't migrated yet), and loads it on first use '''
+    try:
+        question_bank.warm()
+    except DatabaseError:
+        logger.exception('Could not preload the question bank')
+
+
+def bump_version():
+    ''' Tell every worker to reload the bank (called after it was edited from the admin or a loader) '''
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+class QuestionBank:
+    ''' Cache of the trivia questions, safe to share between the threads of a worker '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.version = None
+        self.checked = 0 # When the version stamp was last read (monotonic)
+        self.ids = array('q') # Every question id, ascending
+        self.pages = OrderedDict() # Page number -> (question texts, answer sets), in the order they were loaded
+        self.hot = array('q') # Positions in ids of the questions resident in pages, that matches are drawn from
+        self.hot_by_difficulty = {} # The same positions split by the questions' difficulty
+
+    def resident_count(self):
+        return len(self.hot)
+
+    def warm(self):
+        ''' Load the bank ahead of the first match (at worker startup) '''
+        with self.lock:
+            self.refresh(force=True)
+
+    def sample(self, count, exclude=None):
+        '''
+        Random questions for a match from the resident ones, easy ones first and hard ones last (DIFFICULTY_MIX). Questions whose
+        id is excluded are only used when too few are left, and a difficulty short of questions is made up from the others
+        '''
+        with self.lock:
+            self.refresh()
+            excluded = exclude and (lambda position: exclude(self.ids[position]))
+            positions = []
+            for difficulty, wanted in difficulty_curve(count):
+                positions += draw(self.hot_by_difficulty.get(difficulty, ()), wanted, excluded)
+            if len(positions) < min(count, len(self.hot)): # Only a small bank gets here, so the scan is cheap
+                chosen = set(positions)
+                positions += draw([position for position in self.hot if position not in chosen], count - len(positions), excluded)
+            return [self.question(position) for position in positions]
+
+    def get(self, question_id):
+        ''' The question with the id, loading its page if it isn't resident. None when there's no such question '''
+        with self.lock:
+            self.refresh()
+            position = bisect.bisect_left(self.ids, question_id)
+            if position == len(self.ids) or self.ids[position] != question_id:
+                return None
+            if position // PAGE_SIZE not in self.pages:
+                self.load_page(position // PAGE_SIZE, 'miss')
+            return self.question(position)
+
+    def question(self, position):
+        texts, answers, _ = self.pages[position // PAGE_SIZE]
+        return Question(self.ids[position], texts[position % PAGE_SIZE], answers[position % PAGE_SIZE])
+
+    def refresh(self, force=False):
+        ''' Reload when the version stamp changed, reading it at most every QUESTION_BANK_CHECK_INTERVAL seconds. Called with the lock held '''
+        now = time.monotonic()
+        if self.loaded and not force and now - self.checked < settings.QUESTION_BANK_CHECK_INTERVAL:
+            return
+        self.checked = now
+        version = cache.get(VERSION_KEY)
+        if self.loaded and not force and version == self.version:
+            self.rotate()
+            return
+        self.load(version, 'startup' if not self.loaded else 'version')
+
+    def load(self, version, reason):
+        ''' Load the ids, then every page or a random hot subset of them '''
+        self.ids = array('q', TriviaBank.objects.order_by('id').values_list('id', flat=True))
+        self.pages = OrderedDict()
+        page_count = -(-len(self.ids) // PAGE_SIZE)
+        resident = max(settings.QUESTION_BANK_PRELOAD // PAGE_SIZE, 1)
+        if page_count <= resident:
+            pages = range(page_count)
+        else:
+            pages = random.sample(range(page_count), resident)
+        for page in pages:
+            self.load_page(page, None)
+        self.version, self.loaded = version, True
+        QUESTION_BANK_LOADS.inc(reason)
+
+    def load_page(self, page, reason):
+        ''' Read a page of questions, evicting the oldest page once more than the hot subset is resident '''
+        page_ids = self.ids[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        rows = {question_id: row for question_id, *row in # The page's ids are consecutive in the index
+                TriviaBank.objects.filter(id__range=(page_ids[0], page_ids[-1])).values_list('id', 'answer', 'question', 'difficulty')}
+        texts, answers, difficulties = [], [], array('b')
+        for question_id in page_ids:
+            answer, text, difficulty = rows.get(question_id, ([], '', TriviaBank.MEDIUM)) # Deleted since the ids were read, it only stays until the next reload
+            texts.append(text)
+            answers.append(frozenset(accepted.upper() for accepted in answer))
+            difficulties.append(difficulty)
+        self.pages[page] = (tuple(texts), tuple(answers), difficulties)
+        if reason:
+            QUESTION_BANK_PAGE_LOADS.inc(reason)
+        while len(self.pages) > max(settings.QUESTION_BANK_PRELOAD // PAGE_SIZE, 1):
+            self.pages.popitem(last=False)
+        self.hot = array('q', (position for page in self.pages for position in
+                               range(page * PAGE_SIZE, min((page + 1) * PAGE_SIZE, len(self.ids)))))
+        self.hot_by_difficulty = {difficulty: array('q') for difficulty, _ in TriviaBank.DIFFICULTIES}
+        for position in self.hot:
+            self.hot_by_difficulty[self.pages[position // PAGE_SIZE][2][position % PAGE_SIZE]].append(position)
+
+    def rotate(self):
+        ''' Swap the oldest hot page for another, when only a subset of the bank is resident '''
+        page_count = -(-len(self.ids) // PAGE_SIZE)
+        if len(self.pages) < page_count:
+            self.load_page(random.choice([page for page in range(page_count) if page not in self.pages]), 'rotation')
+
+
+question_bank = QuestionBank()
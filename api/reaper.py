@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import time
+import weakref
+from datetime import timedelta
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from api import metrics
+from api.games import STATE_TIMEOUT
+from api.models import MatchmakingQueue, Trivia, BoxToBox, GuessTheSide
+
+# Cleans up the rows left behind when the process or sockets that should have removed them are gone: queue entries whose
+# consumer stopped its heartbeat, matches still active long after their end, and solo sessions whose cached state expired.
+# Every step is idempotent and works in batches of short transactions, so several workers (or a cron job) can reap at once.
+
+logger = logging.getLogger('api.performance')
+
+MATCH_GRACE = 60 # Seconds after its scheduled end before an active match counts as abandoned
+
+REAPED = metrics.counter('reaper_rows_total', 'Stale rows cleaned up by the reaper', ('kind',))
+REAPER_DURATION = metrics.histogram('reaper_pass_seconds', 'Time taken by a reaper pass')
+REAPER_FAILURES = metrics.counter('reaper_failures_total', 'Reaper passes that raised an error')
+
+running_reapers = weakref.WeakKeyDictionary() # Event loop -> its reaper task
+
+
+def heartbeat_timeout():
+    ''' Seconds without a heartbeat before a queue entry expires (three missed beats) '''
+    return settings.MATCHMAKING_HEARTBEAT_INTERVAL * 3
+
+
+def expire_queue_entries(now, batch_size):
+    ''' Delete the queue entries whose heartbeat stopped, so no one gets matched with a ghost. Returns how many were deleted '''
+    cutoff = now - timedelta(seconds=heartbeat_timeout())
+    expired = 0
+    while True:
+        ids = list(MatchmakingQueue.objects.filter(last_seen__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return expired
+        deleted, _ = MatchmakingQueue.objects.filter(id__in=ids, last_seen__lt=cutoff).delete() # Skips entries revived in the meantime
+        expired += deleted
+        REAPED.inc('queue_entries', amount=deleted)
+
+
+def finalize_abandoned_matches(now, batch_size):
+    '''
+    End the matches still active well after their scheduled end, as both sockets went before end_game ran. Matches where
+    someone scored are finalised as usual, those never played are closed without counting towards either player's history
+    '''
+    from api.consumers import TriviaGameConsumer # The consumers start the reaper, so they're imported late
+    cutoff = now - timedelta(seconds=TriviaGameConsumer.game_duration + MATCH_GRACE)
+    finalized = 0
+    while True:
+        with transaction.atomic():
+            games = list(Trivia.objects.select_related('player_one', 'player_two')
+                         .select_for_update(skip_locked=True, of=('self',)) # Another reaper takes the next batch instead of waiting
+                         .filter(is_active=True, created_at__lt=cutoff).order_by('created_at')[:batch_size])
+            for game in games:
+                if game.score_playerOne or game.score_playerTwo:
+                    game.finalize_game()
+                    REAPED.inc('abandoned_matches')
+                else:
+                    game.is_active, game.statistics_updated, game.end_time = False, True, now
+                    game.save(update_fields=['is_active', 'statistics_updated', 'end_time'])
+                    REAPED.inc('unplayed_matches')
+        finalized += len(games)
+        if len(games) < batch_size:
+            return finalized
+
+
+def purge_orphaned_sessions(now, batch_size):
+    '''
+    Delete the BoxToBox and GuessTheSide sessions whose cached state expired, which the views would otherwise only delete when
+    the user comes back. A completed game's score is kept by GameProgress, so its session goes too. Returns how many were deleted
+    '''
+    cutoff = now - timedelta(seconds=STATE_TIMEOUT)
+    purged = 0
+    for model in (BoxToBox, GuessTheSide):
+        while True:
+            ids = list(model.objects.filter(updated_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted, _ = model.objects.filter(id__in=ids, updated_at__lt=cutoff).delete() # Skips sessions played in the meantime
+            purged += deleted
+            REAPED.inc(f'orphaned_{model._meta.model_name}_sessions', amount=deleted)
+    return purged
+
+
+def reap(batch_size=None):
+    ''' Run every cleanup once, returning how many rows each one handled '''
+    batch_size = batch_size or settings.REAPER_BATCH_SIZE
+    now = timezone.now()
+    start = time.perf_counter()
+    try:
+        return {
+            'queue_entries': expire_queue_entries(now, batch_size),
+            'matches': finalize_abandoned_matches(now, batch_size),
+            'sessions': purge_orphaned_sessions(now, batch_size),
+        }
+    finally:
+        REAPER_DURATION.observe(time.perf_counter() - start)
+
+
+async def run_reaper():
+    ''' Reap every REAPER_INTERVAL seconds, for as long as the event loop runs '''
+    while True:
+        await asyncio.sleep(settings.REAPER_INTERVAL)
+        try:
+            await database_sync_to_async(reap)()
+        except Exception:
+            REAPER_FAILURES.inc()
+            logger.exception('Reaper pass failed')
+
+
+def start_reaper():
+    ''' Start the reaper once per event loop '''
+    if not settings.REAPER_INTERVAL:
+        return
+    loop = asyncio.get_running_loop()
+    if loop not in running_reapers:
+        running_reapers[loop] = loop.create_task(run_reaper())
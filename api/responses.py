@@ -0,0 +1,65 @@
+import json
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError: # Optional, the standard library encoder is used without it
+    orjson = None
+
+# The JSON layer of the views and consumers. Everything is encoded by one of ENCODERS, picked by the JSON_ENCODER setting
+# ('auto' takes orjson when it's installed, several times faster than the standard library). Solo game content is compiled
+# into JSON fragments once (see content_cache.py), and a response only encodes its small per user fields around them: the
+# RawJSON values of a response's top level are written into it as they are.
+#
+# Output is compact (no spaces after separators). JsonResponse's DjangoJSONEncoder types (dates, decimals, UUIDs...) are
+# encoded the same way by every encoder.
+
+
+class RawJSON(bytes):
+    ''' Already encoded JSON, written into a response as it is '''
+
+
+django_encoder = DjangoJSONEncoder()
+
+
+def stdlib_dumps(value):
+    return json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+
+def orjson_dumps(value):
+    # Datetimes are passed to DjangoJSONEncoder too, which rounds them to milliseconds unlike orjson
+    return orjson.dumps(value, default=django_encoder.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+ENCODERS = {'json': stdlib_dumps}
+if orjson is not None:
+    ENCODERS['orjson'] = orjson_dumps
+
+
+def get_encoder(name):
+    if name == 'auto':
+        return ENCODERS.get('orjson', stdlib_dumps)
+    return ENCODERS[name]
+
+
+dumps = get_encoder(settings.JSON_ENCODER) # Value -> JSON bytes
+
+
+def encode(value, dumps=None):
+    ''' JSON bytes of a value, writing the RawJSON values of a top level dict into it as they are '''
+    dumps = dumps or globals()['dumps']
+    if not isinstance(value, dict) or not any(isinstance(item, RawJSON) for item in value.values()):
+        return dumps(value)
+    return b'{' + b','.join(dumps(str(key)) + b':' + (item if isinstance(item, RawJSON) else dumps(item)) for key, item in value.items()) + b'}'
+
+
+def encode_text(value):
+    ''' The encoded value as text, for a websocket text frame '''
+    return encode(value).decode()
+
+
+def json_response(data, status=200):
+    ''' The JsonResponse of the views, encoded by the configured encoder and able to hold RawJSON parts '''
+    return HttpResponse(encode(data), status=status, content_type='application/json')
@@ -0,0 +1,10 @@
+from rest_framework.routers import DefaultRouter
+from .rest_views import UserProfileHistoryView, UserViewSet
+
+# The routes served by the REST framework, included lazily by urls.py
+
+router = DefaultRouter()
+router.register(r'check_auth', UserProfileHistoryView, basename='check_auth')
+router.register(r'users', UserViewSet, basename='users')
+
+urlpatterns = router.urls
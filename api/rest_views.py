@@ -0,0 +1,74 @@
+from rest_framework import viewsets, permissions
+from rest_framework.response import Response
+from .models import User, UserHistory
+from .serializers import UserSerializer, HistorySerializer
+from .responses import json_response
+from .http_cache import bump_leaderboard
+
+# The REST framework viewsets, routed by rest_urls.py. Kept out of views.py so the framework is only imported once one of
+# their routes is resolved, not when a worker starts.
+
+
+class UserProfileHistoryView(viewsets.ModelViewSet):
+    '''
+    API view to retrieve user profile and game history data.
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        '''
+        Override the list method to provide combined user and history data.
+        '''
+        user = request.user # Current user
+        user_serializer = UserSerializer(user)
+        
+        try:
+            user_history, created = UserHistory.objects.get_or_create(user=user) # Create user history object if it doesn't exist
+            if created:
+                bump_leaderboard() # The user is now on the leaderboard
+            history_serializer = HistorySerializer(user_history)
+        except UserHistory.DoesNotExist:
+            # Initialize an empty history if not available
+            history_serializer = HistorySerializer(UserHistory())
+
+        response_data = {
+            'authenticated': True,
+            'user': user_serializer.data,
+            'history': history_serializer.data
+        }
+
+        return json_response(response_data)
+
+
+class UserViewSet(viewsets.ModelViewSet):
+    ''' Custom user view set that serialises user data and allows for creation/updates of users'''
+    queryset = User.objects.all()
+    serializer_class = UserSerializer
+    permission_classes = [permissions.IsAuthenticated] # Only logged in users can access this view
+
+    def get_queryset(self):
+        ''' Return the user object for the current authenticated user '''
+        return User.objects.filter(pk=self.request.user.pk)
+
+    def create(self, request, *args, **kwargs):
+        ''' Create a new user '''
+        instance = self.request.user
+        serializer = self.get_serializer(instance, data=request.data, partial=False)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
+    def update(self, request, *args, **kwargs):
+        ''' Update the user object '''
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=False)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
+    def partial_update(self, request, *args, **kwargs):
+        ''' Partially update the user object (i.e. just email or password) ''' 
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
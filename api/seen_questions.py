@@ -0,0 +1,74 @@
+from api.models import QuestionHistory
+from api.questions import question_bank
+
+# Tracks the trivia questions each user has seen recently, so a match can be given questions neither player has seen.
+# Keeping every seen id per user would grow without bound, and excluding them with NOT IN would slow every match start, so
+# each user has a fixed size structure instead: two bloom filters, the current one taking the newest questions and the
+# previous one remembering the ones before. Once the current filter holds CAPACITY questions it becomes the previous one,
+# so a question is forgotten after between CAPACITY and 2 * CAPACITY more have been seen (five to ten matches).
+#
+# A bloom filter never misses a question that was added, but may claim one that wasn't (about 1.5% of the time at
+# capacity). That only skips a question that could have been asked, never lets a repeat through.
+
+BITS = 512 # Bits per filter
+HASHES = 3 # Bits set per question
+CAPACITY = 50 # Questions added to the current filter before it becomes the previous one
+SIZE = 2 + 2 * BITS // 8 # Bytes stored per user: the current filter's count, then the current and previous filters
+
+MASK_64 = (1 << 64) - 1
+BIT_INDEX_WIDTH = BITS.bit_length() - 1 # Bits of the hash used per bit index (BITS is a power of two)
+
+
+def question_mask(question_id):
+    ''' The filter bits of a question, as an integer with HASHES bits set, all taken from a single 64 bit mix of the id '''
+    h = (question_id * 0x9E3779B97F4A7C15) & MASK_64 # splitmix64 finaliser, so consecutive ids land far apart
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & MASK_64
+    h ^= h >> 31
+    mask = 0
+    for i in range(HASHES):
+        mask |= 1 << ((h >> (i * BIT_INDEX_WIDTH)) & (BITS - 1))
+    return mask
+
+
+class SeenQuestions:
+    ''' A user's recently seen questions. Filters are Python integers, so a lookup is a couple of AND operations '''
+
+    def __init__(self, data=b''):
+        data = bytes(data or b'')
+        if len(data) != SIZE: # No questions seen yet
+            data = bytes(SIZE)
+        half = BITS // 8
+        self.count = int.from_bytes(data[:2], 'little')
+        self.current = int.from_bytes(data[2:2 + half], 'little')
+        self.previous = int.from_bytes(data[2 + half:], 'little')
+
+    def __contains__(self, question_id):
+        mask = question_mask(question_id)
+        return self.current & mask == mask or self.previous & mask == mask
+
+    def add(self, question_id):
+        if self.count >= CAPACITY:
+            self.previous, self.current, self.count = self.current, 0, 0
+        self.current |= question_mask(question_id)
+        self.count += 1
+
+    def to_bytes(self):
+        half = BITS // 8
+        return self.count.to_bytes(2, 'little') + self.current.to_bytes(half, 'little') + self.previous.to_bytes(half, 'little')
+
+
+def choose_questions(players, count):
+    '''
+    Pick the questions of a match between the players, avoiding those any of them saw recently, and record them as seen.
+    One query reads the players' filters and one writes them back, whether or not they have a row yet
+    '''
+    seen = {user_id: SeenQuestions(data) for user_id, data in QuestionHistory.objects.filter(user__in=players).values_list('user_id', 'seen_questions')}
+    filters = [seen.get(player.pk) or SeenQuestions() for player in players]
+    questions = question_bank.sample(count, exclude=lambda question_id: any(question_id in seen_filter for seen_filter in filters))
+    for seen_filter in filters:
+        for question in questions:
+            seen_filter.add(question.id)
+    QuestionHistory.objects.bulk_create([QuestionHistory(user=player, seen_questions=seen_filter.to_bytes()) for player, seen_filter in zip(players, filters)],
+                                        update_conflicts=True, unique_fields=['user'], update_fields=['seen_questions'])
+    return [question.id for question in questions]
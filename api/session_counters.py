@@ -0,0 +1,272 @@
+import atexit
+import logging
+import os
+import socket
+import struct
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from api import metrics
+from api.models import BoxToBox, CareerPath, GuessTheSide
+from api.games import STATE_TIMEOUT
+
+# Write-behind storage of the solo game session counters (guesses, correct scores, result and points). A guess no longer saves
+# its session row: the counters are cached next to the game's state, where the views read them back over the row (restore),
+# and are appended to this process's journal. A writer thread per process writes the latest counters of every session it
+# played to the database in one UPDATE per game type, every SESSION_WRITE_BEHIND_INTERVAL seconds, or sooner when more than
+# SESSION_WRITE_BEHIND_MAX_PENDING sessions are waiting. A game that ends is written through at once, before it's finalized.
+#
+# Counters only grow, so an update never takes a row's guesses backwards: a session written by another process (or by a
+# solo game websocket) since keeps its newer counters, and replaying a journal twice changes nothing. The journal of a
+# process is swapped for a new one at every flush and deleted once the flush is written; the journals of dead processes are
+# replayed by the next writer thread to start on the host (or by the replay_session_journal command). The models' tamper
+# checks (their invariants, points_received limits included) run on every session at flush time, and a session failing them
+# isn't written.
+
+logger = logging.getLogger('api.performance')
+
+MODELS = (BoxToBox, CareerPath, GuessTheSide) # Stored in the journal as their position
+FIELDS = { # The counters a guess changes, per model
+    BoxToBox: ('guesses', 'correct_scores'),
+    CareerPath: ('guesses', 'result', 'points_received'),
+    GuessTheSide: ('guesses', 'correct_scores', 'result'),
+}
+RECORD = struct.Struct('<Bqhhh?d') # Model, then the Counters
+Counters = namedtuple('Counters', 'pk guesses correct_scores points_received result time') # Time is the Unix time of the guess
+
+COUNTER_FLUSHES = metrics.counter('session_counter_flushes_total', 'Write-behind flushes of the session counters', ('outcome',))
+COUNTERS_WRITTEN = metrics.counter('session_counters_written_total', 'Session counters written by the flushes', ('source',))
+COUNTERS_REJECTED = metrics.counter('session_counters_rejected_total', 'Session counters failing the tamper checks at flush time')
+COUNTERS_PENDING = metrics.gauge('session_counters_pending', 'Sessions with counters not yet written', function=lambda: {(): len(session_counters.pending)})
+
+
+def counters_key(model, game_id, user_id):
+    ''' Cache key of a session's counters, next to its game's state '''
+    return f"counters_{model._meta.model_name}_{game_id}_{user_id}"
+
+
+def session_key(session):
+    return counters_key(type(session), session.gameID, session.user_id)
+
+
+def snapshot(session):
+    return Counters(session.pk, session.guesses, getattr(session, 'correct_scores', 0), session.points_received, session.result if hasattr(session, 'result') else False, datetime.now(timezone.utc).timestamp())
+
+
+def restore(session, counters):
+    ''' Bring a session read from the database up to its cached counters, when they're ahead of the row '''
+    if counters is not None and counters.pk == session.pk and counters.guesses > session.guesses:
+        for field in FIELDS[type(session)]:
+            setattr(session, field, getattr(counters, field))
+    return session
+
+
+def load_counters(session):
+    ''' restore, reading the counters on their own '''
+    return restore(session, cache.get(session_key(session)))
+
+
+def database_name():
+    return connection.settings_dict['NAME']
+
+
+def journal_dir(database):
+    ''' Journals of a database written on this host (process ids are only meaningful on their host) '''
+    return Path(settings.SESSION_JOURNAL_DIR) / socket.gethostname() / database
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def latest(merged, key, counters):
+    ''' Keep the counters furthest into the game (the last guess of a session) '''
+    current = merged.get(key)
+    if current is None or counters.guesses >= current.guesses:
+        merged[key] = counters
+
+
+class SessionCounters:
+    ''' Counters waiting to be written, the journal of this process and the thread writing them '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pending = {} # (Model position, session pk) -> Counters
+        self.journal = None # File descriptor of the journal being appended to
+        self.journal_path = None
+        self.journal_pid = None
+        self.database = None # Name of the database the pending counters belong to
+        self.swapped = [] # Journals swapped out whose counters aren't written yet
+        self.sequence = 0
+        self.thread = None
+        atexit.register(self.flush_at_exit)
+
+    def store(self, session, state=None, finished=False):
+        ''' Keep a session's counters after a guess, caching them with its game state (cache key -> value) in one write.
+            A finished game, or every game when write-behind is off, is saved to the database at once '''
+        model = type(session)
+        counters = snapshot(session)
+        cache.set_many({**(state or {}), session_key(session): counters}, timeout=STATE_TIMEOUT) # New 24 hour timer set on guess
+        if finished or not settings.SESSION_WRITE_BEHIND_INTERVAL:
+            session.save(update_fields=[*FIELDS[model], *(['updated_at'] if hasattr(session, 'updated_at') else [])]) # Validated by the model
+            with self.lock:
+                self.pending.pop((MODELS.index(model), session.pk), None) # Its journal entries are now behind the row
+            return
+
+        index = MODELS.index(model)
+        with self.lock:
+            os.write(self.journal_fd(), RECORD.pack(index, *counters))
+            if settings.SESSION_JOURNAL_FSYNC:
+                os.fsync(self.journal)
+            latest(self.pending, (index, session.pk), counters)
+            full = len(self.pending) >= settings.SESSION_WRITE_BEHIND_MAX_PENDING
+        if full:
+            self.wake.set() # Evict everything waiting now rather than at the next interval
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='session-counters-writer', daemon=True)
+                    self.thread.start()
+
+    def journal_fd(self):
+        ''' This process's journal, opened on first use (a forked worker starts its own, called by the lock holder) '''
+        if self.journal is None or self.journal_pid != os.getpid():
+            self.database = database_name()
+            directory = journal_dir(self.database)
+            directory.mkdir(parents=True, exist_ok=True)
+            self.journal_path = directory / f'{os.getpid()}.journal'
+            self.journal = os.open(self.journal_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            self.journal_pid = os.getpid()
+            self.swapped = []
+        return self.journal
+
+    def run(self):
+        try:
+            self.replay()
+        except Exception:
+            logger.exception('Session journal replay failed')
+        while True:
+            self.wake.wait(settings.SESSION_WRITE_BEHIND_INTERVAL)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Session counters flush failed')
+            finally:
+                connection.close() # The thread's connection isn't kept between flushes
+
+    def flush(self):
+        ''' Write the pending counters, returning how many sessions were written '''
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.journal is not None and self.journal_pid == os.getpid():
+                os.close(self.journal)
+                self.journal = None
+                self.sequence += 1
+                swapped = self.journal_path.with_name(f'{os.getpid()}-{self.sequence}.flushing')
+                os.replace(self.journal_path, swapped)
+                self.swapped.append(swapped)
+            swapped = list(self.swapped)
+        if self.database is not None and self.database != database_name():
+            return 0 # The database was switched (a test database destroyed), its journals are left to replay into it
+
+        try:
+            written = self.write(pending)
+        except Exception:
+            with self.lock: # Put the counters back for the next flush, unless newer ones arrived since
+                for key, counters in pending.items():
+                    latest(self.pending, key, counters)
+            COUNTER_FLUSHES.inc('failed')
+            raise
+        if pending:
+            COUNTER_FLUSHES.inc('flushed')
+            COUNTERS_WRITTEN.inc('flush', amount=written)
+
+        with self.lock:
+            self.swapped = [path for path in self.swapped if path not in swapped]
+        for path in swapped: # Every counter they hold is written (or superseded by a write through)
+            path.unlink(missing_ok=True)
+        return written
+
+    def flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.warning('Session counters left in the journal at exit', exc_info=True) # Replayed by the next writer to start
+
+    def write(self, pending):
+        ''' One UPDATE per model of the pending counters that pass the tamper checks, returning how many were written '''
+        by_model = {}
+        for (index, pk), counters in pending.items():
+            model = MODELS[index]
+            try:
+                model.invariants.check(counters) # The counters carry the session's fields
+            except ValidationError as error:
+                COUNTERS_REJECTED.inc()
+                logger.warning('Rejected the counters of %s %s: %s', model.__name__, pk, error)
+                continue
+            by_model.setdefault(model, []).append(counters)
+        if not by_model:
+            return 0
+
+        written = 0
+        with connection.cursor() as cursor:
+            for model, rows in by_model.items():
+                written += self.update(cursor, model, rows)
+        return written
+
+    def update(self, cursor, model, rows):
+        quote = connection.ops.quote_name
+        fields = FIELDS[model]
+        columns = ['id', *fields]
+        if any(field.name == 'updated_at' for field in model._meta.fields):
+            columns.append('updated_at')
+        values, params = [], []
+        for counters in rows:
+            values.append(f"({', '.join(['%s'] * len(columns))})")
+            params += [counters.pk, *(getattr(counters, field) for field in fields)]
+            if 'updated_at' in columns:
+                params.append(datetime.fromtimestamp(counters.time, timezone.utc))
+        assignments = ', '.join(f'{quote(column)} = counters.{quote(column)}' for column in columns[1:])
+        # A row already at (or past) these guesses is left alone, the counters only ever grow
+        cursor.execute(f'''
+            UPDATE {quote(model._meta.db_table)} AS session SET {assignments}
+            FROM (VALUES {', '.join(values)}) AS counters({', '.join(quote(column) for column in columns)})
+            WHERE session.id = counters.id AND session.guesses < counters.guesses''', params)
+        return cursor.rowcount
+
+    def replay(self):
+        ''' Write the counters journaled by the processes of this host that are gone, returning how many sessions were written '''
+        directory = journal_dir(database_name())
+        if not directory.is_dir():
+            return 0
+        journals = [path for path in directory.iterdir()
+                    if path.suffix in ('.journal', '.flushing') and not process_alive(int(path.stem.split('-')[0]))]
+        recovered = {}
+        for path in journals:
+            data = path.read_bytes()
+            data = data[:len(data) - len(data) % RECORD.size] # A record torn by the crash is dropped
+            for index, *counters in RECORD.iter_unpack(data):
+                counters = Counters(*counters)
+                latest(recovered, (index, counters.pk), counters)
+
+        written = self.write(recovered)
+        COUNTERS_WRITTEN.inc('replay', amount=written)
+        for path in journals:
+            path.unlink(missing_ok=True)
+        return written
+
+
+session_counters = SessionCounters()
@@ -0,0 +1,141 @@
+from django.core.cache import cache
+from django.utils import timezone
+from .models import BoxToBox, CareerPath, GuessTheSide
+from .career_paths import career_paths
+from .formations import formations, formation_mask, masked_formation
+from .batch_guesses import NOT_FOUND
+from .session_counters import load_counters
+from .games import (
+    box2box_keys, guess_the_side_key, play_box2box, play_career_path, play_guess_the_side,
+    finalize_box2box, finalize_career_path, finalize_guess_the_side,
+    BOX2BOX_GUESSES, CAREER_PATH_GUESSES, GUESS_THE_SIDE_GUESSES, STATE_TIMEOUT, EXPIRED,
+)
+
+# A solo game held in memory by its websocket (SoloGameConsumer). The game is loaded once when the socket connects, and its
+# guesses are played against the in-memory session and state with the rules the views use (the play_* functions of games.py).
+# Storing is left to the consumer, which writes a snapshot of the game behind the guesses: the session row is updated (unless
+# guesses over HTTP moved it further already) and the cached state refreshed in place, so the views see the same game once the
+# socket is gone.
+#
+# load and store block on the database and cache, and run on the async views' storage pool.
+
+
+class SoloGame:
+    ''' A started game of one user, loaded from its session row and cached state '''
+    name = None # Game type, as in the guess log
+    max_guesses = 0
+    model = None
+
+    def __init__(self, user, game_id):
+        self.user = user
+        self.game_id = game_id
+        self.session = None
+
+    def load(self):
+        ''' Read the game, returning the error to send when it can't be played over the socket (None otherwise) '''
+        self.session = self.model.objects.filter(gameID=self.game_id, user=self.user).first()
+        if self.session is None:
+            return NOT_FOUND
+        load_counters(self.session) # Guesses made over HTTP may not be written yet
+        if self.over():
+            return {'game_over': True, 'message': 'Game already concluded.'} # Its cached state may be gone already
+        return self.load_state()
+
+    def store(self, snapshot, finalize):
+        ''' Write a snapshot of the game, and record the result once it's over. The row is only written while it's behind the
+        snapshot: guesses made over HTTP in the meantime are kept, and the game is then finalized by them '''
+        fields, state = snapshot
+        if not self.model.objects.filter(pk=self.session.pk, guesses__lt=fields['guesses']).update(**fields):
+            return
+        if state:
+            cache.set_many(state, timeout=STATE_TIMEOUT) # New 24 hour timer set on guess
+        if finalize:
+            self.finalize() # Records the result once, whoever finalizes first
+
+    def response(self, result):
+        ''' What a single guess over HTTP would have answered: the result and the state left by the guess '''
+        return {**result, **self.state()} if 'correct' in result else result
+
+
+class BoxToBoxGame(SoloGame):
+    name = 'box2box'
+    max_guesses = BOX2BOX_GUESSES
+    model = BoxToBox
+
+    def load_state(self):
+        self.answers_key, self.grid_key = box2box_keys(self.game_id, self.user.id)
+        state = cache.get_many([self.answers_key, self.grid_key])
+        self.answers, self.grid = state.get(self.answers_key), state.get(self.grid_key)
+        return EXPIRED if not self.answers or not self.grid else None
+
+    def play(self, guesses):
+        return play_box2box(self.session, self.answers, self.grid, guesses)
+
+    def over(self):
+        return self.session.guesses >= BOX2BOX_GUESSES or self.session.correct_scores == 9 # A cell is filled by every correct guess
+
+    def state(self):
+        return {'grid': dict(self.grid)}
+
+    def snapshot(self):
+        fields = {'guesses': self.session.guesses, 'correct_scores': self.session.correct_scores, 'updated_at': timezone.now()}
+        return fields, {self.grid_key: dict(self.grid), self.answers_key: self.answers}
+
+    def finalize(self):
+        finalize_box2box(self.game_id, self.user)
+
+
+class CareerPathGame(SoloGame):
+    name = 'careerPath'
+    max_guesses = CAREER_PATH_GUESSES
+    model = CareerPath
+
+    def load_state(self):
+        self.payload = career_paths.get(self.game_id)
+        return EXPIRED if self.payload is None else None
+
+    def play(self, guesses):
+        return play_career_path(self.session, self.payload.names, guesses)
+
+    def over(self):
+        return self.session.guesses >= CAREER_PATH_GUESSES or self.session.result
+
+    def state(self):
+        return {}
+
+    def snapshot(self):
+        return {'guesses': self.session.guesses, 'result': self.session.result, 'points_received': self.session.points_received}, {}
+
+    def finalize(self):
+        finalize_career_path(self.game_id, self.user)
+
+
+class GuessTheSideGame(SoloGame):
+    name = 'formations'
+    max_guesses = GUESS_THE_SIDE_GUESSES
+    model = GuessTheSide
+
+    def load_state(self):
+        self.answers_key = guess_the_side_key(self.game_id, self.user.id)
+        self.mask, self.template = formation_mask(cache.get(self.answers_key)), formations.get(self.game_id)
+        return EXPIRED if self.mask is None or self.template is None else None
+
+    def play(self, guesses):
+        results, self.mask, played = play_guess_the_side(self.session, self.template, self.mask, guesses)
+        return results, played
+
+    def over(self):
+        return self.session.guesses >= GUESS_THE_SIDE_GUESSES or self.session.correct_scores == 11
+
+    def state(self):
+        return {'guessed_players': self.template.full if self.over() else masked_formation(self.template, self.mask)}
+
+    def snapshot(self):
+        fields = {'guesses': self.session.guesses, 'correct_scores': self.session.correct_scores, 'result': self.session.result, 'updated_at': timezone.now()}
+        return fields, {self.answers_key: self.mask}
+
+    def finalize(self):
+        finalize_guess_the_side(self.game_id, self.user)
+
+
+GAMES = {'box2box': BoxToBoxGame, 'career_path': CareerPathGame, 'guess_the_side': GuessTheSideGame} # By url prefix, as the views'
@@ -0,0 +1,114 @@
+import gzip
+import hashlib
+import threading
+from pathlib import Path
+from django.conf import settings
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+try:
+    import brotli
+except ImportError: # Optional, the shell is only offered gzipped without it
+    brotli = None
+
+# The shell of the Vue SPA (api/spa/index.html), answering every navigation of the site. It has no per request content, so it
+# is rendered once at build time by the build_spa_shell command (after collectstatic) into SPA_SHELL_PATH, and read by each
+# worker on its first navigation (rendered there instead when it wasn't built). The worker keeps it in memory with its
+# Brotli and gzip encodings, and serves the one the request accepts under an ETag, revalidated on every navigation: the
+# assets it links to are content hashed and cached forever (WHITENOISE_IMMUTABLE_FILE_TEST), so only the shell can change.
+#
+# SpaShellMiddleware (api/middleware.py) answers the navigations near the top of the middleware stack, before the sessions,
+# authentication and CSRF middleware run: a browser's GET or HEAD whose path resolves to the SPA's views (main_spa, on '/' and the
+# catch-all route) gets the shell without a template render or session load.
+
+TEMPLATE = 'api/spa/index.html'
+ENCODINGS = ('br', 'gzip') # Preferred first, when the request accepts several
+
+
+def render_shell():
+    return render_to_string(TEMPLATE).encode()
+
+
+def compress(body):
+    ''' The encodings of the shell, by Content-Encoding (None for the body as it is) '''
+    variants = {None: body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, mode=brotli.MODE_TEXT)
+    return variants
+
+
+def accepted_encodings(request):
+    ''' Content codings of the request's Accept-Encoding, those it refuses (q=0) left out '''
+    accepted = set()
+    for coding in request.headers.get('Accept-Encoding', '').replace(' ', '').lower().split(','):
+        name, _, quality = coding.partition(';q=')
+        try:
+            refused = quality != '' and float(quality) == 0
+        except ValueError:
+            refused = False
+        if name and not refused:
+            accepted.add(name)
+    return accepted
+
+
+def is_navigation(request):
+    ''' Whether the request is for the shell: a browser's GET or HEAD of a path routed to the SPA. Sets the request's resolver
+    match. The API calls of the SPA don't accept HTML, so they aren't resolved twice '''
+    if request.method not in ('GET', 'HEAD') or 'text/html' not in request.headers.get('Accept', ''):
+        return False
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    from .views import main_spa # Imported on the first navigation, as the url configuration is
+    if match.func is not main_spa:
+        return False
+    request.resolver_match = match # Labels the request's metrics as the view would have
+    return True
+
+
+class SpaShell:
+    ''' The shell held in memory, loaded once per process '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.variants = None
+        self.etag = None
+
+    def load(self):
+        if self.variants is None:
+            with self.lock:
+                if self.variants is None:
+                    path = Path(settings.SPA_SHELL_PATH)
+                    body = path.read_bytes() if path.is_file() else render_shell()
+                    self.etag = quote_etag(hashlib.blake2b(body, digest_size=12).hexdigest())
+                    self.variants = compress(body)
+        return self.variants
+
+    def reset(self):
+        ''' Forget the shell, reading it again on the next navigation '''
+        with self.lock:
+            self.variants = self.etag = None
+
+    def response(self, request):
+        ''' The shell in the best encoding the request accepts, or a 304 when it still has it '''
+        variants = self.load()
+        response = get_conditional_response(request, etag=self.etag)
+        if response is None:
+            accepted = accepted_encodings(request)
+            encoding = next((encoding for encoding in ENCODINGS if encoding in accepted and encoding in variants), None)
+            response = HttpResponse(variants[encoding], content_type='text/html; charset=utf-8')
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+            response.headers['Content-Length'] = len(variants[encoding])
+        response.headers['ETag'] = self.etag
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Frame-Options'] = getattr(settings, 'X_FRAME_OPTIONS', 'DENY') # The clickjacking middleware is skipped
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+spa_shell = SpaShell()
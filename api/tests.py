@@ -1,7 +1,50 @@
-from django.test import TestCase, Client
-from django.urls import resolve, reverse
+from django.test import TestCase, TransactionTestCase, Client, AsyncClient, override_settings
+from django.urls import path, resolve, reverse
+from channels.routing import URLRouter
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.conf import settings
+from django.core.cache import cache
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from .consumers import MatchmakingConsumer, SoloGameConsumer, QUEUE_DEPTH, WS_CONNECTIONS, WS_MESSAGES_RECEIVED, action_label
+from .benchmarks import STARTUP_BUDGET, SoloBenchmark, profile_startup, seed_catalogue
+import json
+import tempfile
+import types
+from unittest import mock
+from .async_views import AsyncBoxToBoxView, AsyncCareerPathView, AsyncGuessTheSideView, close_pool_connections
+from .urls import solo_game_urls
 from .views import main_spa, login_view, signup_view, leaderboard
+from .models import QuestionHistory, BoxToBox, CareerPath, GuessTheSide, GameProgress, PlayerBank, CareerBank, ClubBank, FormationBank, UserHistory, Trivia, MatchmakingQueue, TriviaBank
+from .questions import QuestionBank, Question, bump_version, question_bank
+from . import backends, metrics, seen_questions, throttling
+from .seen_questions import SeenQuestions, choose_questions
+from .question_stats import QuestionStats
+from .career_paths import career_paths, load_career_path
+from .content_cache import ContentCache
+from .responses import ENCODERS, RawJSON, encode, json_response
+from .spa_shell import spa_shell
+from .formations import formation_mask, guess_players, load_formation, masked_formation
+from .games import GUESS_THE_SIDE_GUESSES, finalize_career_path
+from .solo_games import CareerPathGame
+from .guess_log import GuessLog, answer_hash, spool_dir
+from .guess_chunks import aggregate, answer_texts, chunks, roll, split_item_key
+from .session_counters import Counters, MODELS, RECORD, SessionCounters, journal_dir, session_counters
+from django.core.management import call_command
+from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
+from datetime import timedelta
+import gzip
+import io
+import gc
+import threading
+import os
+import subprocess
+import time
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from .postgres_pool.base import ConnectionPool, PoolTimeout
 
 class URLTest(TestCase):
     ''' Test to ensure urls are correctly resolved '''
@@ -66,4 +109,998 @@ class AuthenticationTest(TestCase):
         response = self.client.post(reverse('api:logout')) # Log the user out
 
         self.assertEqual(response.status_code, 302) # Check that the response has a status code of 302 (redirect)
-        self.assertNotIn('_auth_user_id', self.client.session) # Check that the user is not authenticated in the session anymore
\ No newline at end of file
+        self.assertNotIn('_auth_user_id', self.client.session) # Check that the user is not authenticated in the session anymore
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}) # Throttle counters must not leak between test runs
+class LoginThrottleTest(TestCase):
+    ''' Test the email backend's case-insensitive lookup, throttling and hash upgrades '''
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='awais03', email='Test@Test03.com', password='Test2003')
+
+    def test_login_is_case_insensitive(self):
+        ''' The email is matched regardless of the case it was entered in '''
+        response = self.client.post(reverse('api:login'), {'email': 'test@TEST03.com', 'password': 'Test2003'})
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(LOGIN_THROTTLE_RATES={'email': (2, 60), 'ip': (30, 2)})
+    def test_login_is_throttled_per_email(self):
+        ''' Once the email's attempts are used up, even the correct password is refused '''
+        for attempt in range(2):
+            response = self.client.post(reverse('api:login'), {'email': 'test@test03.com', 'password': 'wrong'})
+            self.assertEqual(response.status_code, 200) # Form is shown again with an error
+
+        response = self.client.post(reverse('api:login'), {'email': 'test@test03.com', 'password': 'Test2003'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_concurrent_attempts_share_the_window(self):
+        ''' Attempts racing from several threads are each counted, so only the window's capacity of them gets through '''
+        window = throttling.AttemptWindow('test', 3, 60)
+        barrier = threading.Barrier(8)
+        allowed = []
+
+        def attempt():
+            barrier.wait()
+            allowed.append(window.consume('test@test03.com'))
+
+        threads = [threading.Thread(target=attempt) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(allowed.count(True), 3)
+
+    def test_outdated_hash_is_upgraded(self):
+        ''' A hash with a different iteration count is replaced by the preferred hasher on login '''
+        hasher = PBKDF2PasswordHasher()
+        hasher.iterations = settings.PASSWORD_HASH_ITERATIONS // 2
+        self.user.password = hasher.encode('Test2003', hasher.salt())
+        self.user.save()
+
+        self.assertTrue(self.client.login(username='test@test03.com', password='Test2003'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith(f'pbkdf2_sha256${settings.PASSWORD_HASH_ITERATIONS}$'))
+
+    def test_failed_logins_hash_once_and_stop(self):
+        ''' A missing account and a wrong password each cost one hash in the pool, and never reach the default backend '''
+        with mock.patch('django.contrib.auth.backends.ModelBackend.authenticate') as default_backend, \
+                mock.patch.object(backends.hashing_pool, 'submit', wraps=backends.hashing_pool.submit) as submit:
+            self.assertFalse(self.client.login(username='nobody@test03.com', password='Test2003'))
+            self.assertEqual(submit.call_count, 1)
+            self.assertFalse(self.client.login(username='test@test03.com', password='wrong'))
+            self.assertEqual(submit.call_count, 2)
+        default_backend.assert_not_called()
+        self.assertTrue(self.client.login(username='awais03', password='Test2003')) # The admin logs in by username
+
+
+class MetricsTest(TestCase):
+    ''' Test the request instrumentation and the Prometheus endpoint '''
+
+    def test_metrics_require_staff(self):
+        ''' Anonymous users cannot read the metrics '''
+        response = self.client.get(reverse('api:metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_requests_are_recorded_per_endpoint(self):
+        ''' A request to the leaderboard shows up under its url name, with its latency and query count '''
+        User = get_user_model()
+        User.objects.create_superuser(username='admin', email='admin@test.com', password='Admin1234')
+        self.client.login(username='admin@test.com', password='Admin1234')
+
+        self.client.get(reverse('api:leaderboard'))
+        self.client.generic('BREW', reverse('api:leaderboard')) # Unknown methods share one label
+        response = self.client.get(reverse('api:metrics'))
+        body = response.content.decode()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_requests_total{endpoint="api:leaderboard",method="GET",status="200"}', body)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="api:leaderboard",le="+Inf"}', body)
+        self.assertIn('http_request_db_queries_count{endpoint="api:leaderboard"}', body)
+        self.assertIn('http_requests_total{endpoint="api:leaderboard",method="other",', body)
+        self.assertNotIn('BREW', body)
+
+    def test_shards_of_exited_threads_are_merged(self):
+        ''' The values of finished threads are kept, while their shards are dropped '''
+        requests = metrics.Counter('test_thread_requests_total', 'Requests of short lived threads')
+        latency = metrics.Histogram('test_thread_latency_seconds', 'Latency of short lived threads')
+        for _ in range(50):
+            thread = threading.Thread(target=lambda: (requests.inc('GET'), latency.observe(0.2)))
+            thread.start()
+            thread.join()
+        requests.inc('GET')
+        gc.collect()
+
+        self.assertEqual(requests.collect(), {('GET',): 51})
+        self.assertEqual(sum(latency.collect()[()][:-1]), 50)
+        self.assertLessEqual(len(requests.shards), 2) # This thread's, and maybe the last thread's until it's collected
+
+
+class ConsumerMetricsTest(TransactionTestCase):
+    ''' Test the metrics recorded by the websocket consumers '''
+
+    def test_matchmaking_records_connection_and_queue_depth(self):
+        ''' Joining the queue counts the connection, and the queue depth counts the user until they leave '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais03', email='test@test03.com', password='Test2003')
+
+        async def join_and_leave():
+            communicator = WebsocketCommunicator(MatchmakingConsumer.as_asgi(), '/ws/matchmaking/')
+            communicator.scope['user'] = user
+            await communicator.connect()
+            message = await communicator.receive_json_from()
+            depth = (await sync_to_async(QUEUE_DEPTH.collect)()).get((), 0) # Counted off the event loop
+            stale = QUEUE_DEPTH.collect()[()] # On the loop, the last count
+            await communicator.disconnect()
+            return message, depth, stale
+
+        connections = WS_CONNECTIONS.collect().get(('MatchmakingConsumer',), 0)
+        with override_settings(MATCHMAKING_QUEUE_DEPTH_INTERVAL=0):
+            message, depth, stale = async_to_sync(join_and_leave)()
+            self.assertEqual(QUEUE_DEPTH.collect().get((), 0), 0)
+
+        self.assertIn('waiting list', message['message'])
+        self.assertEqual(WS_CONNECTIONS.collect()[('MatchmakingConsumer',)], connections + 1)
+        self.assertEqual((depth, stale), (1, 1))
+
+    def test_message_labels_are_bounded(self):
+        ''' Actions sent by clients are labelled from a fixed set, whatever they hold '''
+        self.assertEqual([action_label(action) for action in ('submit_answer', 'guesses', 'drop table', None, ['guess'])],
+                         ['submit_answer', 'guesses', 'other', 'other', 'other'])
+
+
+class ConnectionPoolTest(TestCase):
+    ''' Test the database connection pool behind the api.postgres_pool backend '''
+
+    def setUp(self):
+        self.pool = ConnectionPool('test', connection.get_connection_params(), max_size=2, timeout=0.1, check_after=0)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_connections_are_reused(self):
+        ''' A returned connection is handed out again rather than a new one being opened '''
+        first = self.pool.getconn()
+        self.pool.putconn(first)
+        second = self.pool.getconn()
+        self.pool.putconn(second)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.pool.size, 1)
+
+    def test_broken_connection_is_replaced(self):
+        ''' A connection that died while idle fails its health check and is replaced by a new one '''
+        first = self.pool.getconn()
+        self.pool.putconn(first)
+        with connection.cursor() as cursor: # The server drops the idle connection
+            cursor.execute('SELECT pg_terminate_backend(%s)', [first.get_backend_pid()])
+        second = self.pool.getconn()
+
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+        self.assertIsNot(first, second)
+        self.pool.putconn(second)
+        self.assertEqual(self.pool.size, 1)
+
+    def test_checkout_times_out_when_exhausted(self):
+        ''' Once max_size connections are in use, a checkout waits for the timeout and then fails '''
+        held = [self.pool.getconn(), self.pool.getconn()]
+        with self.assertRaises(PoolTimeout):
+            self.pool.getconn()
+        for held_connection in held:
+            self.pool.putconn(held_connection)
+
+class QueryBudgetTest(TestCase):
+    ''' Test that the solo game endpoints stay within their query budgets '''
+
+    def test_solo_games_within_query_budgets(self):
+        ''' Play a few games of each type on a small synthetic catalogue, checking every request's query count '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais03', email='test@test03.com', password='Test2003')
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                GAME_FILES_DIR=directory, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            catalogue = seed_catalogue(directory, players=5, clubs=5, box2box_games=5)
+            self.client.force_login(user)
+            benchmark = SoloBenchmark(self.client)
+            benchmark.run(catalogue, games_per_type=2)
+
+        self.assertEqual(benchmark.budget_violations(), [])
+
+
+class ResponsesTest(TestCase):
+    ''' Test the JSON layer shared by the views and consumers '''
+
+    def test_encoders_agree(self):
+        ''' Every encoder writes the same JSON as JsonResponse, with RawJSON parts written as they are '''
+        moment = timezone.now()
+        value = {'grid': {0: False, 'x1y1': True}, 'when': moment, 'players': RawJSON(b'[{"position":"GK"}]'), 'left': 3}
+        expected = {'grid': {'0': False, 'x1y1': True}, 'when': DjangoJSONEncoder().default(moment), 'players': [{'position': 'GK'}], 'left': 3}
+        for name, encoder in ENCODERS.items():
+            with self.subTest(encoder=name):
+                self.assertEqual(json.loads(encode(value, encoder)), expected)
+                self.assertEqual(json.loads(encode([1, 'two'], encoder)), [1, 'two'])
+
+        response = json_response({'error': 'Game not found.'}, status=404)
+        self.assertEqual((response.status_code, response['Content-Type'], json.loads(response.content)),
+                         (404, 'application/json', {'error': 'Game not found.'}))
+
+
+class CareerPathCacheTest(TestCase):
+    ''' Test the read-through cache of rendered career paths '''
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, CONTENT_CACHE_CHECK_INTERVAL=0)
+    def test_payloads_are_cached_until_the_bank_changes(self):
+        ''' A payload is read from the database once, shared between workers, and rebuilt after a version bump '''
+        player = PlayerBank.objects.create(player_names=['Harry Kane', 'Kane'])
+        CareerBank.objects.create(player=player, team_name='Spurs', appearances=435, goals=280, assists=64, season='2009')
+        worker, other_worker = ContentCache('career_path', load_career_path), ContentCache('career_path', load_career_path)
+
+        with self.assertNumQueries(2):
+            payload = worker.get(player.id)
+        self.assertEqual(json.loads(payload.career_path), [{'team_name': 'Spurs', 'appearances': 435, 'goals': 280, 'assists': 64, 'is_loan': False, 'season': '2009'}])
+        self.assertEqual(payload.names, ('harry kane', 'kane'))
+        with self.assertNumQueries(0):
+            self.assertEqual(worker.get(player.id), payload)
+            self.assertEqual(other_worker.get(player.id), payload) # From the shared cache
+        self.assertIsNone(worker.get(player.id + 1))
+
+        player.player_names = ['Harry Kane']
+        player.save()
+        career_paths.bump_version()
+        self.assertEqual(other_worker.get(player.id).names, ('harry kane',))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_responses_splice_the_rendered_clubs(self):
+        ''' Starting and resuming a game return the same JSON as before, with the clubs read from the cache '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais06', email='test@test06.com', password='Test2006')
+        player = PlayerBank.objects.create(player_names=['Harry Kane'])
+        CareerBank.objects.create(player=player, team_name='Spurs', appearances=435, goals=280, assists=64, season='2009')
+        career_paths.bump_version()
+        self.client.force_login(user)
+
+        started = self.client.post(f'/career_path/game/{player.id}')
+        self.assertEqual(started['Content-Type'], 'application/json')
+        self.assertEqual(started.json(), {'message': 'Game Started', 'session_id': player.id, 'career_path': [
+            {'team_name': 'Spurs', 'appearances': 435, 'goals': 280, 'assists': 64, 'is_loan': False, 'season': '2009'}], 'guesses_left': 5})
+        self.assertEqual(self.client.post(f'/career_path/game/{player.id}').json()['message'], 'Existing Game Resumed')
+        self.assertEqual(self.client.post(f'/career_path/guess/{player.id}', data=json.dumps({'guess': 'harry KANE'}),
+                                          content_type='application/json').json()['correct'], 'yes')
+
+
+class FormationTemplateTest(TestCase):
+    ''' Test the compiled guess the side formations '''
+
+    def test_guesses_update_the_mask(self):
+        ''' A name marks every player known by it once, and the rendered formation only reveals guessed players '''
+        club = ClubBank.objects.create(team_name='Arsenal', description='Invincibles')
+        FormationBank.objects.bulk_create([
+            FormationBank(club=club, position='GK', player_names=['Jens Lehmann', 'Lehmann']),
+            FormationBank(club=club, position='CB', player_names=['Kolo Toure', 'Toure']),
+            FormationBank(club=club, position='CM', player_names=['Yaya Toure', 'Toure']),
+        ])
+        template = load_formation(club.id)
+        self.assertEqual((template.team_name, template.description, template.size), ('Arsenal', 'Invincibles', 3))
+        self.assertIsNone(load_formation(club.id + 1))
+
+        mask, newly_guessed = guess_players(template, 0, 'TOURE')
+        self.assertEqual((mask, newly_guessed), (0b110, 2))
+        self.assertEqual(guess_players(template, mask, 'kolo toure'), (0b110, 0)) # Already guessed
+        self.assertEqual(json.loads(masked_formation(template, mask)), [
+            {'position': 'GK', 'playerNames': [], 'guessed': False},
+            {'position': 'CB', 'playerNames': ['Kolo Toure', 'Toure'], 'guessed': True},
+            {'position': 'CM', 'playerNames': ['Yaya Toure', 'Toure'], 'guessed': True},
+        ])
+        self.assertEqual(json.loads(template.full)[0], {'position': 'GK', 'playerNames': ['Jens Lehmann', 'Lehmann']})
+
+    def test_cached_states_are_read_as_masks(self):
+        ''' Masks are kept as they are, an expired state is None, and a list of players from before masks becomes one '''
+        self.assertEqual(formation_mask(0), 0)
+        self.assertIsNone(formation_mask(None))
+        self.assertIsNone(formation_mask([]))
+        self.assertEqual(formation_mask([{'guessed': True}, {'guessed': False}, {'guessed': True}]), 0b101)
+
+
+class ConditionalGetTest(TestCase):
+    ''' Test the validators and caching policies of the listings and the leaderboard '''
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_listings_are_not_modified_until_the_progress_changes(self):
+        ''' A revalidated listing is a 304 without reading the games, until the user completes one or the content changes '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais07', email='test@test07.com', password='Test2007')
+        player = PlayerBank.objects.create(player_names=['Harry Kane'])
+        self.client.force_login(user)
+
+        listing = self.client.get('/career_path/game/')
+        self.assertEqual(listing.json(), {'games': [{'game_id': player.id, 'status': 'available'}]})
+        self.assertEqual(listing['Cache-Control'], 'private, no-cache')
+        self.assertIn('Last-Modified', listing)
+        with self.assertNumQueries(2): # The session and the user
+            revalidated = self.client.get('/career_path/game/', HTTP_IF_NONE_MATCH=listing['ETag'])
+        self.assertEqual((revalidated.status_code, revalidated['ETag']), (304, listing['ETag']))
+
+        with self.captureOnCommitCallbacks(execute=True): # Bumped once the completion commits
+            GameProgress.mark_completed(user, 'careerPath', player.id, 1)
+        completed = self.client.get('/career_path/game/', HTTP_IF_NONE_MATCH=listing['ETag'])
+        self.assertEqual(completed.json(), {'games': [{'game_id': player.id, 'status': 'completed'}]})
+        career_paths.bump_version()
+        self.assertEqual(self.client.get('/career_path/game/', HTTP_IF_NONE_MATCH=completed['ETag']).status_code, 200)
+        self.assertEqual(self.client.get('/guess_the_side/game/', HTTP_IF_NONE_MATCH=completed['ETag']).status_code, 200) # Each type has its own
+
+        self.client.force_login(User.objects.create_user(username='awais08', email='test@test08.com', password='Test2008'))
+        self.assertEqual(self.client.get('/career_path/game/', HTTP_IF_NONE_MATCH=completed['ETag']).status_code, 200) # Another user's listing
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, LEADERBOARD_MAX_AGE=10)
+    def test_leaderboard_is_shared_until_a_result_changes(self):
+        ''' The leaderboard can be cached by a shared cache, and revalidates without queries until a game is finalized '''
+        User = get_user_model()
+        player_one = User.objects.create_user(username='awais09', email='test@test09.com', password='Test2009')
+        player_two = User.objects.create_user(username='awais10', email='test@test10.com', password='Test2010')
+
+        board = self.client.get('/leaderboard')
+        self.assertEqual(board['Cache-Control'], 'public, max-age=10')
+        self.assertEqual(board['Vary'], 'origin') # Not the cookie, the response is the same for every user
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/leaderboard', HTTP_IF_NONE_MATCH=board['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Trivia.objects.create(player_one=player_one, player_two=player_two, score_playerOne=2, score_playerTwo=1).finalize_game()
+            # Until the results commit, a poll keeps the old validators rather than caching the old rows under new ones
+            self.assertEqual(self.client.get('/leaderboard', HTTP_IF_NONE_MATCH=board['ETag']).status_code, 304)
+        changed = self.client.get('/leaderboard', HTTP_IF_NONE_MATCH=board['ETag'])
+        self.assertEqual([row['username'] for row in changed.json()['leaderboard']], ['awais09', 'awais10'])
+
+
+class BatchGuessTest(TestCase):
+    ''' Test that a batch of guesses plays exactly as the same guesses made one by one '''
+
+    STATE = ('grid', 'guessed_players') # Left out of the results of a batch, which only give the final state
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_batches_match_single_guesses(self):
+        ''' Every result, the final state and the stored progress are those of the single guesses, including guesses made after the game ended '''
+        User = get_user_model()
+        single_user = User.objects.create_user(username='awais11', email='test@test11.com', password='Test2011')
+        batch_user = User.objects.create_user(username='awais12', email='test@test12.com', password='Test2012')
+        single, batch = Client(), Client()
+        single.force_login(single_user)
+        batch.force_login(batch_user)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(GAME_FILES_DIR=directory):
+            catalogue = seed_catalogue(directory, players=1, clubs=1, box2box_games=1)
+            for game, games in catalogue.items():
+                game_id, answers = next(iter(games.items()))
+                guesses = ['Nobody', answers, 'Nobody'] if game == 'career_path' else ['Nobody'] + answers
+                single.post(f'/{game}/game/{game_id}')
+                batch.post(f'/{game}/game/{game_id}')
+
+                expected = [single.post(f'/{game}/guess/{game_id}', data=json.dumps({'guess': guess}), content_type='application/json').json() for guess in guesses]
+                response = batch.post(f'/{game}/guesses/{game_id}', data=json.dumps({'guesses': guesses}), content_type='application/json').json()
+                self.assertEqual(response['results'], [{key: value for key, value in result.items() if key not in self.STATE} for result in expected], game)
+                last_played = [result for result in expected if 'correct' in result][-1]
+                self.assertEqual({key: value for key, value in response.items() if key not in ('results', 'correct')},
+                                 {key: value for key, value in last_played.items() if key != 'correct'}, game)
+                self.assertEqual(batch.post(f'/{game}/game/{game_id}').json(), single.post(f'/{game}/game/{game_id}').json(), game)
+
+        self.assertEqual(GameProgress.completed_ids(batch_user, 'formations'), GameProgress.completed_ids(single_user, 'formations'))
+        self.assertEqual(UserHistory.objects.get(user=batch_user).matches_won, UserHistory.objects.get(user=single_user).matches_won)
+
+    def test_batches_are_validated(self):
+        ''' A batch must be a list of 1 to the game's allowed guesses '''
+        User = get_user_model()
+        self.client.force_login(User.objects.create_user(username='awais13', email='test@test13.com', password='Test2013'))
+        for body in ({'guesses': []}, {'guesses': ['Kane'] * 6}, {'guesses': 'Kane'}, {'guesses': [1]}, ['Kane']):
+            response = self.client.post('/career_path/guesses/1', data=json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        response = self.client.post('/career_path/guesses/1', data=json.dumps({'guesses': ['Kane']}), content_type='application/json')
+        self.assertEqual(response.status_code, 418) # The 404 of a game that wasn't started, as the middleware shows it to a signed in user
+
+
+class GameProgressTest(TestCase):
+    ''' Test the bitset of completed games '''
+
+    def test_completed_games_are_kept(self):
+        ''' Completing games one at a time keeps the earlier ones, however far apart their ids are '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais03', email='test@test03.com', password='Test2003')
+
+        for game_id in (3, 0, 8, 1000):
+            GameProgress.mark_completed(user, 'careerPath', game_id, score=game_id % 2)
+        GameProgress.mark_completed(user, 'box2box', 7)
+
+        self.assertEqual(GameProgress.completed_ids(user, 'careerPath'), {0, 3, 8, 1000})
+        self.assertTrue(GameProgress.is_completed(user, 'careerPath', 1000))
+        self.assertFalse(GameProgress.is_completed(user, 'careerPath', 7))
+        self.assertFalse(GameProgress.is_completed(user, 'careerPath', 5000)) # Past the end of the bitset
+        self.assertEqual(GameProgress.final_score(user, 'careerPath', 3), 1)
+        self.assertEqual(GameProgress.final_score(user, 'careerPath', 1000), 0)
+        self.assertIsNone(GameProgress.final_score(user, 'careerPath', 7))
+        self.assertEqual(GameProgress.completed_ids(user, 'box2box'), {7})
+        self.assertEqual(GameProgress.completed_ids(user, 'formations'), set())
+        self.assertEqual(GameProgress.objects.filter(user=user).count(), 2) # One row per game type
+
+    def test_games_are_finalized_once(self):
+        ''' Completing a game again reports it, keeps the first score, and its result is recorded once '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais03', email='test@test03.com', password='Test2003')
+        player = PlayerBank.objects.create(player_names=['Harry Kane'])
+        CareerPath.objects.create(user=user, gameID=player.id, player_guess=player.player_names, guesses=2, result=True)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(GameProgress.mark_completed(user, 'box2box', 12, 9))
+            self.assertFalse(GameProgress.mark_completed(user, 'box2box', 12, 4))
+            for attempt in range(2): # The socket and a guess over HTTP both seeing the game end
+                finalize_career_path(player.id, user)
+        self.assertEqual(GameProgress.final_score(user, 'box2box', 12), 9)
+        history = UserHistory.objects.get(user=user)
+        self.assertEqual((history.matches_played, history.matches_won), (1, 1))
+
+class ArchiveSessionsTest(TestCase):
+    ''' Test that finished matches and completed sessions are moved out of the live tables '''
+
+    def test_finished_rows_are_archived(self):
+        ''' Old finished matches go to the archive and completed sessions are deleted, while live ones stay '''
+        User = get_user_model()
+        one = User.objects.create_user(username='awais03', email='test@test03.com', password='Test2003')
+        two = User.objects.create_user(username='awais04', email='test@test04.com', password='Test2004')
+
+        old_finished = Trivia.objects.create(player_one=one, player_two=two)
+        old_active = Trivia.objects.create(player_one=one, player_two=two, is_active=True)
+        recent_finished = Trivia.objects.create(player_one=one, player_two=two)
+        Trivia.objects.filter(gameID__in=[old_finished.gameID, old_active.gameID]).update(created_at=timezone.now() - timedelta(days=90))
+
+        clubs = {f'club_{axis}': 'Club' for axis in ['x1', 'x2', 'x3', 'y1', 'y2', 'y3']}
+        completed = BoxToBox.objects.create(user=one, gameID=3, correct_scores=9, guesses=10, **clubs)
+        in_progress = BoxToBox.objects.create(user=one, gameID=4, **clubs)
+        GameProgress.mark_completed(one, 'box2box', 3, completed.correct_scores)
+
+        call_command('archive_sessions', days=30, batch_size=1, stdout=io.StringIO())
+
+        self.assertEqual(set(Trivia.objects.values_list('gameID', flat=True)), {old_active.gameID, recent_finished.gameID})
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT "gameID" FROM api_trivia_archive')
+            self.assertEqual(cursor.fetchall(), [(old_finished.gameID,)])
+        self.assertEqual(list(BoxToBox.objects.values_list('id', flat=True)), [in_progress.id])
+        self.assertEqual(GameProgress.final_score(one, 'box2box', 3), 9) # The result outlives the session
+
+    def test_game_ids_are_unique_across_partitions(self):
+        ''' Matches in different monthly partitions still get distinct game ids from the sequence, found by gameID alone '''
+        User = get_user_model()
+        one = User.objects.create_user(username='awais05', email='test@test05.com', password='Test2005')
+        two = User.objects.create_user(username='awais06', email='test@test06.com', password='Test2006')
+        matches = [Trivia.objects.create(player_one=one, player_two=two) for _ in range(4)]
+        Trivia.objects.filter(gameID__in=[matches[0].gameID, matches[1].gameID]).update(created_at=timezone.now() - timedelta(days=62))
+
+        game_ids = list(Trivia.objects.values_list('gameID', flat=True))
+        self.assertEqual(len(game_ids), len(set(game_ids)))
+        self.assertEqual(sorted(game_ids), [match.gameID for match in matches])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(DISTINCT tableoid) FROM api_trivia')
+            self.assertEqual(cursor.fetchone()[0], 2) # The moved matches are in another partition
+        for match in matches:
+            self.assertEqual(Trivia.objects.get(gameID=match.gameID).pk, match.gameID)
+
+class ReaperTest(TestCase):
+    ''' Test that rows left behind by dead workers and vanished sockets are cleaned up '''
+
+    def test_stale_rows_are_reaped(self):
+        ''' Expired queue entries, abandoned matches and orphaned sessions go, while live ones stay '''
+        User = get_user_model()
+        one = User.objects.create_user(username='awais03', email='test@test03.com', password='Test2003')
+        two = User.objects.create_user(username='awais04', email='test@test04.com', password='Test2004')
+        long_ago = timezone.now() - timedelta(days=2)
+
+        MatchmakingQueue.objects.create(user=one, last_seen=long_ago)
+        live_entry = MatchmakingQueue.objects.create(user=two)
+
+        played = Trivia.objects.create(player_one=one, player_two=two, is_active=True, score_playerOne=3)
+        unplayed = Trivia.objects.create(player_one=one, player_two=two, is_active=True)
+        in_progress = Trivia.objects.create(player_one=one, player_two=two, is_active=True)
+        Trivia.objects.filter(gameID__in=[played.gameID, unplayed.gameID]).update(created_at=long_ago)
+
+        clubs = {f'club_{axis}': 'Club' for axis in ['x1', 'x2', 'x3', 'y1', 'y2', 'y3']}
+        orphaned = BoxToBox.objects.create(user=one, gameID=3, **clubs)
+        live_session = BoxToBox.objects.create(user=one, gameID=4, **clubs)
+        BoxToBox.objects.filter(id=orphaned.id).update(updated_at=long_ago)
+
+        out = io.StringIO()
+        call_command('reap_stale', batch_size=1, stdout=out)
+        self.assertIn('Expired 1 queue entries, ended 2 abandoned matches, deleted 1 orphaned sessions', out.getvalue())
+
+        self.assertEqual(list(MatchmakingQueue.objects.values_list('id', flat=True)), [live_entry.id])
+        self.assertEqual(set(Trivia.objects.filter(is_active=True).values_list('gameID', flat=True)), {in_progress.gameID})
+        self.assertEqual(Trivia.objects.get(gameID=played.gameID).result, one) # Finalised with the scores it had
+        self.assertEqual(UserHistory.objects.get(user=one).matches_played, 1) # The unplayed match isn't counted
+        self.assertEqual(list(BoxToBox.objects.values_list('id', flat=True)), [live_session.id])
+
+class QuestionBankTest(TestCase):
+    ''' Test the process-wide cache of trivia questions '''
+
+    def test_questions_are_served_from_memory(self):
+        ''' Once loaded, match setup and answer checks read no questions, until the bank's version changes '''
+        TriviaBank.objects.bulk_create(TriviaBank(question=f'Question {i}?', answer=[f'Answer {i}']) for i in range(20))
+        bank = QuestionBank()
+        with override_settings(QUESTION_BANK_CHECK_INTERVAL=3600):
+            bank.warm()
+            with self.assertNumQueries(0):
+                questions = bank.sample(10)
+                question = bank.get(questions[0].id)
+        self.assertEqual(len({question.id for question in questions}), 10)
+        self.assertIn(question.question.replace('Question', 'ANSWER').rstrip('?'), question.answers) # Upper-cased for the comparison
+
+        added = TriviaBank.objects.create(question='New question?', answer=['New'])
+        bump_version()
+        with override_settings(QUESTION_BANK_CHECK_INTERVAL=0):
+            self.assertEqual(bank.get(added.id), Question(added.id, 'New question?', frozenset({'NEW'})))
+
+    @override_settings(QUESTION_BANK_PRELOAD=500, QUESTION_BANK_CHECK_INTERVAL=3600)
+    def test_large_bank_is_paged(self):
+        ''' A bank larger than the preload keeps a subset resident, and loads the other pages when asked for '''
+        TriviaBank.objects.bulk_create(TriviaBank(question=f'Question {i}?', answer=[f'Answer {i}']) for i in range(1200))
+        bank = QuestionBank()
+        bank.warm()
+        self.assertEqual(bank.resident_count(), len(bank.pages[next(iter(bank.pages))][0])) # A single page
+        with self.assertNumQueries(0):
+            bank.sample(10)
+
+        missing = next(question_id for position, question_id in enumerate(bank.ids) if position // 500 not in bank.pages)
+        with self.assertNumQueries(1):
+            question = bank.get(missing)
+        self.assertEqual(question.question, TriviaBank.objects.get(id=missing).question)
+        self.assertEqual(len(bank.pages), 1) # The oldest page made way for it
+
+class SeenQuestionsTest(TestCase):
+    ''' Test that matches avoid the questions their players saw recently '''
+
+    def test_filter_forgets_old_questions(self):
+        ''' Questions are remembered for at least CAPACITY more, and forgotten after twice that '''
+        seen = SeenQuestions()
+        for question_id in range(3 * seen_questions.CAPACITY):
+            seen.add(question_id)
+        seen = SeenQuestions(seen.to_bytes()) # As stored on the user's history
+        self.assertEqual(len(seen.to_bytes()), seen_questions.SIZE)
+        self.assertTrue(all(question_id in seen for question_id in range(2 * seen_questions.CAPACITY, 3 * seen_questions.CAPACITY)))
+        self.assertLess(sum(question_id in seen for question_id in range(seen_questions.CAPACITY)), 5) # Only false positives remain
+
+    @override_settings(QUESTION_BANK_CHECK_INTERVAL=3600)
+    def test_matches_avoid_seen_questions(self):
+        ''' Both players' next match has none of the questions either of them just had '''
+        User = get_user_model()
+        one = User.objects.create_user(username='awais03', email='test@test03.com', password='Test2003')
+        two = User.objects.create_user(username='awais04', email='test@test04.com', password='Test2004')
+        three = User.objects.create_user(username='awais05', email='test@test05.com', password='Test2005')
+        TriviaBank.objects.bulk_create(TriviaBank(question=f'Question {i}?', answer=[f'Answer {i}']) for i in range(40))
+        question_bank.warm()
+
+        with self.assertNumQueries(2): # Read the filters, write them back
+            first = choose_questions([one, two], 10)
+        second = choose_questions([two, three], 10)
+        self.assertEqual(len(set(first)), 10)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(QuestionHistory.objects.count(), 3) # Created for the players without one yet
+        self.assertEqual(UserHistory.objects.count(), 0) # Nobody is on the leaderboard before playing
+
+class QuestionStatsTest(TestCase):
+    ''' Test the answer statistics and difficulty of the trivia questions '''
+
+    def test_answers_are_flushed_in_one_statement(self):
+        ''' Recorded answers are added to the bank together, moving questions with enough attempts to their difficulty '''
+        easy = TriviaBank.objects.create(question='Easy?', answer=['Yes'])
+        new = TriviaBank.objects.create(question='New?', answer=['Yes'])
+        stats = QuestionStats()
+        for answer in range(25):
+            stats.record(easy.id, answer % 5 != 0, 2.5) # 80% correct
+        stats.record(new.id, False, 30)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(stats.flush(), 1) # Only the easy question changed difficulty
+        with self.assertNumQueries(0):
+            stats.flush() # Nothing left to write
+
+        easy.refresh_from_db()
+        self.assertEqual((easy.attempts, easy.correct, easy.difficulty), (25, 20, TriviaBank.EASY))
+        self.assertEqual(easy.median_answer_time, 3)
+        stats.record(easy.id, True, 0.5)
+        stats.flush()
+        easy.refresh_from_db()
+        self.assertEqual(easy.answer_times, [1, 0, 25, 0, 0, 0, 0, 0]) # Added to the earlier counts
+        new.refresh_from_db()
+        self.assertEqual((new.attempts, new.difficulty, new.median_answer_time), (1, TriviaBank.MEDIUM, float('inf')))
+
+    @override_settings(QUESTION_BANK_CHECK_INTERVAL=3600)
+    def test_matches_follow_the_difficulty_curve(self):
+        ''' A match starts with easy questions and ends with hard ones '''
+        TriviaBank.objects.bulk_create(TriviaBank(question=f'Question {i}?', answer=['Answer'], difficulty=i % 3) for i in range(30))
+        bank = QuestionBank()
+        bank.warm()
+        difficulties = dict(TriviaBank.objects.values_list('id', 'difficulty'))
+        questions = bank.sample(10)
+        self.assertEqual([difficulties[question.id] for question in questions], [0, 0, 0, 1, 1, 1, 1, 2, 2, 2])
+
+class GuessLogTest(TestCase):
+    ''' Test the guess log from recorded guesses to the per item statistics '''
+
+    def test_guesses_are_aggregated_per_item(self):
+        ''' Rolled guesses give each item's accuracy, attempts to solve, cell solves and most common wrong answer '''
+        with tempfile.TemporaryDirectory() as directory, override_settings(GUESS_LOG_DIR=directory):
+            log = GuessLog()
+            log.record('trivia', 7, 1, False, 1, 'Paris ')
+            log.record('trivia', 7, 2, False, 1, 'paris')
+            log.record('trivia', 7, 3, False, 1, 'Lyon')
+            log.record('trivia', 7, 4, True, 1, 'Marseille')
+            log.record('box2box', 7, 1, True, 3, 'Messi', cell=4) # The same id in another game is another item
+            log.flush()
+            log.record('careerPath', 2, 1, True, 5, 'Kane')
+            log.flush() # Appended to the same spool file
+
+            self.assertEqual(roll(), 0) # The current hour is still being written
+            self.assertEqual(roll(include_current=True), 6)
+            items, cells, wrong = aggregate(chunks())
+
+            games, ids = split_item_key(items['key'])
+            stats = {(int(game), int(item)): (int(attempts), int(correct), int(solve)) for game, item, attempts, correct, solve in
+                     zip(games, ids, items['attempts'], items['correct'], items['solve_attempts'])}
+            self.assertEqual(stats, {(0, 7): (4, 1, 1), (1, 7): (1, 1, 3), (2, 2): (1, 1, 5)})
+            self.assertEqual((cells['cell'].tolist(), cells['solved'].tolist()), ([4], [1]))
+            top = wrong['answer'][wrong['count'].argmax()]
+            self.assertEqual((int(top), int(wrong['count'].max())), (answer_hash('paris'), 2))
+            self.assertEqual(answer_texts(chunks(), [top]), {answer_hash('paris'): 'paris'})
+
+
+    def test_spool_files_per_process_on_a_dotted_host(self):
+        ''' A host name with dots keeps the process id in the spool file names, so workers never share a file '''
+        with tempfile.TemporaryDirectory() as directory, override_settings(GUESS_LOG_DIR=directory), \
+                mock.patch('api.guess_log.socket.gethostname', return_value='web-1.prod.example.com'):
+            log = GuessLog()
+            log.record('trivia', 7, 1, False, 1, 'Lyon')
+            log.flush()
+            names = sorted(path.name for path in spool_dir().iterdir())
+            self.assertEqual([name.split('-', 1)[1] for name in names],
+                             [f'web-1.prod.example.com-{os.getpid()}.answers', f'web-1.prod.example.com-{os.getpid()}.events'])
+
+            self.assertEqual(roll(include_current=True), 1)
+            chunk, = chunks()
+            self.assertEqual(chunk.name, names[1].removesuffix('.events'))
+            self.assertTrue((chunk / 'answers.tsv').exists())
+
+
+class IndexUsageTest(TestCase):
+    ''' Test that the hot queries of the solo games are answered by their indexes '''
+
+    def test_hot_queries_use_indexes(self):
+        ''' EXPLAIN the queries made by the solo game views on the seeded benchmark dataset, after a few games are played '''
+        User = get_user_model()
+        users = [User.objects.create_user(username=f'awais{i}', email=f'test@test{i}.com', password='Test2003') for i in range(3)]
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                GAME_FILES_DIR=directory, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            catalogue = seed_catalogue(directory)
+            for user in users:
+                self.client.force_login(user)
+                SoloBenchmark(self.client).run(catalogue, games_per_type=2)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute('SET LOCAL enable_seqscan = off') # The tables are tiny, so PostgreSQL would otherwise read them whole
+        user, player_id, club_id = users[0], next(iter(catalogue['career_path'])), next(iter(catalogue['guess_the_side']))
+        expected_plans = [ # The queries as the views make them: .first() orders by pk and takes one row, .exists() takes one row
+            (BoxToBox.objects.filter(user=user, gameID=1).order_by('pk')[:1], 'Index Scan using boxtobox_user_game_uniq'),
+            (CareerPath.objects.filter(user=user, gameID=player_id).order_by('pk')[:1], 'Index Scan using careerpath_user_game_uniq'),
+            (GuessTheSide.objects.filter(user=user, gameID=club_id).order_by('pk')[:1], 'Index Scan using guesstheside_user_game_uniq'),
+            (GameProgress.objects.filter(user=user, game_type='box2box').values_list('completed', flat=True).order_by('pk')[:1], 'Index Scan using gameprogress_user_type_uniq'),
+            (CareerBank.objects.filter(player_id=player_id).values('team_name', 'appearances', 'goals', 'assists', 'is_loan', 'season'), 'Index Only Scan using career_player_covering_idx'),
+            (FormationBank.objects.filter(club_id=club_id).values('player_names', 'position'), 'Index Only Scan using formation_club_covering_idx'),
+            (UserHistory.objects.order_by('-matches_won'), 'Index Scan using history_matches_won_idx'),
+        ]
+        for queryset, plan in expected_plans:
+            with self.subTest(query=str(queryset.query)):
+                self.assertIn(plan, queryset.explain())
+
+
+class AsyncSoloViewsTest(TransactionTestCase):
+    ''' Test that the async solo game views keep the JSON contract of the sync views '''
+
+    def tearDown(self):
+        close_pool_connections() # The pool threads hold connections of their own
+
+    def test_async_views_match_sync_views(self):
+        ''' Play the same games through both sets of views, and compare every response '''
+        User = get_user_model()
+        sync_user = User.objects.create_user(username='awais04', email='test@test04.com', password='Test2004')
+        async_user = User.objects.create_user(username='awais05', email='test@test05.com', password='Test2005')
+        urlconf = types.ModuleType('async_solo_urls')
+        urlconf.urlpatterns = solo_game_urls(AsyncBoxToBoxView, AsyncCareerPathView, AsyncGuessTheSideView)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                GAME_FILES_DIR=directory, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            catalogue = seed_catalogue(directory, players=1, clubs=1, box2box_games=1)
+            self.client.force_login(sync_user)
+            for game, games in catalogue.items():
+                game_id, answers = next(iter(games.items()))
+                steps = [(f'/{game}/game/', None), (f'/{game}/game/{game_id}', None), (f'/{game}/game/{game_id}', None),
+                         (f'/{game}/guess/{game_id}', 'Nobody')]
+                answers = answers if isinstance(answers, list) else [answers]
+                steps.append((f'/{game}/guesses/{game_id}', answers[:1])) # A batch of one
+                steps += [(f'/{game}/guess/{game_id}', guess) for guess in answers[1:]]
+                steps.append((f'/{game}/game/{game_id}', None))
+
+                expected = [self.decode(self.send(self.client, url, guess)) for url, guess in steps]
+                with override_settings(ROOT_URLCONF=urlconf):
+                    actual = async_to_sync(self.play_async)(async_user, steps)
+                self.assertEqual(actual, expected, game)
+
+    async def play_async(self, user, steps):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        return [self.decode(await self.send(client, url, guess)) for url, guess in steps]
+
+    def send(self, client, url, guess):
+        ''' GET a listing, or POST a game request with the guess (if any). Returns an awaitable for an AsyncClient '''
+        if url.endswith('/'):
+            return client.get(url)
+        elif guess is None:
+            return client.post(url)
+        elif isinstance(guess, list):
+            return client.post(url, data=json.dumps({'guesses': guess}), content_type='application/json')
+        return client.post(url, data=json.dumps({'guess': guess}), content_type='application/json')
+
+    def decode(self, response):
+        return response.status_code, response.json()
+
+
+class SoloWebsocketTest(TransactionTestCase):
+    ''' Test playing the solo games over a websocket '''
+
+    def tearDown(self):
+        close_pool_connections() # The writes run on the async views' pool
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, SOLO_WRITE_BEHIND_INTERVAL=60)
+    def test_socket_guesses_match_http_guesses(self):
+        ''' Every guess gets the answer of the guess endpoint, the game is written when the socket closes and finalized when it ends '''
+        User = get_user_model()
+        http_user = User.objects.create_user(username='awais14', email='test@test14.com', password='Test2014')
+        socket_user = User.objects.create_user(username='awais15', email='test@test15.com', password='Test2015')
+        application = URLRouter([path('ws/solo/<str:game_type>/<int:game_id>/', SoloGameConsumer.as_asgi())])
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(GAME_FILES_DIR=directory):
+            catalogue = seed_catalogue(directory, players=1, clubs=1, box2box_games=1)
+            game_id, answers = next(iter(catalogue['guess_the_side'].items()))
+            http, socket_client = Client(), Client()
+            http.force_login(http_user)
+            socket_client.force_login(socket_user)
+            http.post(f'/guess_the_side/game/{game_id}')
+            socket_client.post(f'/guess_the_side/game/{game_id}')
+
+            guesses = ['Nobody'] + answers[:5]
+            expected = [http.post(f'/guess_the_side/guess/{game_id}', data=json.dumps({'guess': guess}), content_type='application/json').json() for guess in guesses]
+
+            async def play(messages):
+                communicator = WebsocketCommunicator(application, f'/ws/solo/guess_the_side/{game_id}/')
+                communicator.scope['user'] = socket_user
+                await communicator.connect()
+                replies = [await communicator.receive_json_from()]
+                for message in messages:
+                    await communicator.send_json_to(message)
+                    replies.append(await communicator.receive_json_from())
+                await communicator.disconnect()
+                return replies
+
+            replies = async_to_sync(play)([{'action': 'guess', 'guess': guess} for guess in guesses])
+            self.assertEqual(replies[0]['guesses_left'], GUESS_THE_SIDE_GUESSES)
+            self.assertEqual(replies[1:], expected)
+            session = GuessTheSide.objects.get(user=socket_user, gameID=game_id)
+            self.assertEqual((session.guesses, session.correct_scores), (6, 5)) # Written when the socket closed
+            self.assertEqual(socket_client.post(f'/guess_the_side/game/{game_id}').json()['guesses_left'], GUESS_THE_SIDE_GUESSES - 6) # Resumed over HTTP
+
+            replies = async_to_sync(play)([{'action': 'guesses', 'guesses': answers[5:]}])
+            self.assertEqual((replies[0]['guesses_left'], replies[1]['game_over'], len(replies[1]['results'])), (GUESS_THE_SIDE_GUESSES - 6, True, 6))
+            self.assertEqual(GameProgress.final_score(socket_user, 'formations', game_id), 11) # Finalized as soon as it ended
+            self.assertEqual(async_to_sync(play)([]), [{'game_over': True, 'message': 'Game already concluded.'}])
+
+
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, SOLO_WRITE_BEHIND_INTERVAL=60)
+    def test_malformed_frames_are_answered(self):
+        ''' Frames that aren't a JSON object get an error, and the socket keeps playing '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais14', email='test@test14.com', password='Test2014')
+        application = URLRouter([path('ws/solo/<str:game_type>/<int:game_id>/', SoloGameConsumer.as_asgi())])
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(GAME_FILES_DIR=directory):
+            catalogue = seed_catalogue(directory, players=1, clubs=1, box2box_games=1)
+            game_id, answers = next(iter(catalogue['guess_the_side'].items()))
+            client = Client()
+            client.force_login(user)
+            client.post(f'/guess_the_side/game/{game_id}')
+
+            async def play():
+                communicator = WebsocketCommunicator(application, f'/ws/solo/guess_the_side/{game_id}/')
+                communicator.scope['user'] = user
+                await communicator.connect()
+                await communicator.receive_json_from()
+                replies = []
+                for frame in ('not json', '[1, 2]', '"guess"'):
+                    await communicator.send_to(text_data=frame)
+                    replies.append(await communicator.receive_json_from())
+                await communicator.send_to(bytes_data=b'{}')
+                replies.append(await communicator.receive_json_from())
+                await communicator.send_json_to({'action': 'guess', 'guess': answers[0]})
+                replies.append(await communicator.receive_json_from())
+                await communicator.disconnect()
+                return replies
+
+            received = WS_MESSAGES_RECEIVED.collect().get(('SoloGameConsumer', 'other'), 0)
+            replies = async_to_sync(play)()
+            self.assertEqual(replies[:4], [{'error': 'Expected a JSON object.'}] * 4)
+            self.assertEqual(replies[4]['correct'], 'yes')
+            self.assertEqual(WS_MESSAGES_RECEIVED.collect()[('SoloGameConsumer', 'other')], received + 4) # Counted under a fixed label
+
+    def test_stale_writes_are_skipped(self):
+        ''' A snapshot behind the row (guesses made over HTTP since) isn't written nor finalized, one ahead of it is '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais15', email='test@test15.com', password='Test2015')
+        player = PlayerBank.objects.create(player_names=['Harry Kane'])
+        session = CareerPath.objects.create(user=user, gameID=player.id, player_guess=player.player_names, guesses=3)
+        game = CareerPathGame(user, player.id)
+        game.session = CareerPath.objects.get(pk=session.pk)
+
+        game.session.guesses, game.session.result = 2, True
+        game.store(game.snapshot(), finalize=True)
+        session.refresh_from_db()
+        self.assertEqual((session.guesses, session.result), (3, False))
+        self.assertFalse(GameProgress.is_completed(user, 'careerPath', player.id))
+
+        game.session.guesses = 4
+        game.store(game.snapshot(), finalize=True)
+        session.refresh_from_db()
+        self.assertEqual((session.guesses, session.result), (4, True))
+        self.assertTrue(GameProgress.is_completed(user, 'careerPath', player.id))
+
+class SessionCountersTest(TransactionTestCase):
+    ''' Test the write-behind session counters, their journal replay and the tamper checks at flush time '''
+
+    def tearDown(self):
+        close_pool_connections()
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_counters_are_read_back_and_flushed(self):
+        ''' Guesses are resumed from the cached counters before the row is written, and the flush writes them '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais16', email='test@test16.com', password='Test2016')
+        self.client.force_login(user)
+        with tempfile.TemporaryDirectory() as directory, override_settings(GAME_FILES_DIR=directory, SESSION_JOURNAL_DIR=directory):
+            catalogue = seed_catalogue(directory, players=1, clubs=1, box2box_games=1)
+            game_id, answers = next(iter(catalogue['guess_the_side'].items()))
+            self.client.post(f'/guess_the_side/game/{game_id}')
+            for guess in (answers[0], 'Nobody'):
+                self.client.post(f'/guess_the_side/guess/{game_id}', data=json.dumps({'guess': guess}), content_type='application/json')
+
+            self.assertEqual(self.client.post(f'/guess_the_side/game/{game_id}').json()['guesses_left'], GUESS_THE_SIDE_GUESSES - 2)
+            session_counters.flush()
+            session = GuessTheSide.objects.get(user=user, gameID=game_id)
+            self.assertEqual((session.guesses, session.correct_scores), (2, 1))
+
+    def test_tampered_counters_are_not_written(self):
+        ''' Counters over the model's points limit are dropped at flush time '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais17', email='test@test17.com', password='Test2017')
+        player = PlayerBank.objects.create(player_names=['Harry Kane'])
+        session = CareerPath.objects.create(user=user, gameID=player.id, player_guess=player.player_names)
+        counters = SessionCounters()
+        counters.pending[(MODELS.index(CareerPath), session.pk)] = Counters(session.pk, 1, 0, 5, True, time.time())
+        self.assertEqual(counters.flush(), 0)
+        session.refresh_from_db()
+        self.assertEqual((session.guesses, session.points_received, session.result), (0, 0, False))
+
+    def test_dead_journals_are_replayed(self):
+        ''' The latest counters of a dead process's journal are written once, a torn last record is ignored '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais18', email='test@test18.com', password='Test2018')
+        club = ClubBank.objects.create(team_name='Side', description='Side in the final')
+        session = GuessTheSide.objects.create(user=user, gameID=club.id, team_guess='Side', team_description='Side in the final')
+        process = subprocess.Popen(['true'])
+        process.wait() # Its pid is free, as a crashed worker's
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(SESSION_JOURNAL_DIR=directory):
+            journal = journal_dir(connection.settings_dict['NAME']) / f'{process.pid}.journal'
+            journal.parent.mkdir(parents=True)
+            index = MODELS.index(GuessTheSide)
+            journal.write_bytes(b''.join(RECORD.pack(index, session.pk, guesses, correct, 0, False, time.time()) for guesses, correct in ((5, 3), (4, 2))) + b'\x01\x02')
+            self.assertEqual(SessionCounters().replay(), 1)
+            self.assertFalse(journal.exists())
+            session.refresh_from_db()
+            self.assertEqual((session.guesses, session.correct_scores), (5, 3))
+
+            journal.write_bytes(RECORD.pack(index, session.pk, 4, 2, 0, False, time.time()))
+            self.assertEqual(SessionCounters().replay(), 0) # The row is already past these counters
+            session.refresh_from_db()
+            self.assertEqual(session.guesses, 5)
+
+
+class SessionInvariantsTest(TestCase):
+    ''' Test the compiled bounds of the solo game sessions, checked by their save and by the database '''
+
+    def test_bounds_are_enforced(self):
+        ''' A session out of its game's bounds is refused by save, and by the database when save is bypassed '''
+        User = get_user_model()
+        user = User.objects.create_user(username='awais19', email='test@test19.com', password='Test2019')
+        session = CareerPath.objects.create(user=user, gameID=1, player_guess='Harry Kane')
+        session.points_received = 2
+        with self.assertRaises(ValidationError) as raised:
+            session.save()
+        self.assertEqual(list(raised.exception.message_dict), ['points_received'])
+        session.points_received, session.guesses = 1, 5
+        session.save()
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            GuessTheSide.objects.filter(pk=GuessTheSide.objects.create(user=user, gameID=1).pk).update(guesses=GUESS_THE_SIDE_GUESSES + 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CareerPath.objects.filter(pk=session.pk).update(points_received=-1)
+
+
+class StartupTest(TestCase):
+    ''' Test the cold start of a worker against its budget, with the rarely used modules loaded lazily '''
+
+    def test_startup_within_budget(self):
+        ''' Import the ASGI application in a fresh interpreter, then check the lazy routes still resolve here '''
+        startup = profile_startup(env={**os.environ, 'DB_NAME': connection.settings_dict['NAME']}) # Warm-ups read the test database
+        self.assertLess(startup.wall, STARTUP_BUDGET)
+        self.assertEqual(startup.lazy_loaded, [])
+        self.assertIn('project.asgi', [item.module for item in startup.imports])
+
+        self.assertEqual(resolve(reverse('admin:index')).url_name, 'index')
+        self.assertEqual(resolve('/users/').url_name, 'users-list')
+
+
+class SpaShellTest(TestCase):
+    ''' Test the navigations of the SPA, answered with its shell from memory, and the caching of its assets '''
+
+    def setUp(self):
+        spa_shell.reset()
+        self.addCleanup(spa_shell.reset)
+
+    def test_navigation_served_from_memory(self):
+        ''' Navigations get the compressed shell with its validators, without a query or cookie even when logged in '''
+        User = get_user_model()
+        self.client.force_login(User.objects.create_user(username='awais20', email='test@test20.com', password='Test2020'))
+        headers = {'Accept': 'text/html,application/xhtml+xml', 'Accept-Encoding': 'gzip, deflate'}
+        for url in ('/', '/career-path/3'):
+            with self.assertNumQueries(0):
+                response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertIn(b'<div id="app"></div>', gzip.decompress(response.content))
+            self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+            self.assertEqual(response.headers['X-Frame-Options'], 'DENY')
+            self.assertEqual(response.cookies, {})
+
+        response = self.client.get('/', headers={**headers, 'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/', headers={'Accept': 'text/html', 'Accept-Encoding': 'gzip;q=0'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(self.client.post('/').status_code, 405) # As the catch-all TemplateView answered
+        self.assertEqual(self.client.get('/leaderboard', headers={'Accept': 'application/json'})['Content-Type'], 'application/json')
+
+    def test_built_shell_is_served(self):
+        ''' The shell rendered by build_spa_shell is read instead of rendering the template '''
+        with tempfile.TemporaryDirectory() as directory, override_settings(SPA_SHELL_PATH=f'{directory}/shell.html'):
+            call_command('build_spa_shell', stdout=io.StringIO())
+            with open(f'{directory}/shell.html', 'ab') as shell:
+                shell.write(b'<!-- built -->')
+            response = self.client.get('/', headers={'Accept': 'text/html'})
+        self.assertTrue(response.content.endswith(b'<!-- built -->'))
+
+    @override_settings(WHITENOISE_USE_FINDERS=True)
+    def test_hashed_assets_cached_forever(self):
+        ''' The content hashed assets of the Vite build are immutable, the other static files are revalidated '''
+        response = self.client.get('/static/api/spa/assets/index-48386239.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        b''.join(response.streaming_content) # Closes the file, as the client does once a response is read
+        response = self.client.get('/static/api/spa/vite.svg')
+        self.assertNotIn('immutable', response.headers['Cache-Control'])
+        b''.join(response.streaming_content)
@@ -0,0 +1,58 @@
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+
+class AttemptWindow:
+    '''
+    Fixed window counter held in the shared cache, used to rate limit an action per identity (e.g. login attempts per email).
+
+    Each identity gets `capacity` attempts per window of `capacity * refill_seconds` seconds, the time a token bucket of the same
+    rate would take to refill. The window's counter is created with cache.add and bumped with cache.incr, both atomic on the
+    shared caches (memcached, Redis) and the local memory one, so concurrent workers can't both take the last attempt.
+    The lock makes the pair atomic within a worker on caches whose incr is a plain read and write (the file based one).
+    '''
+
+    lock = threading.Lock()
+
+    def __init__(self, scope, capacity, refill_seconds):
+        self.scope = scope # Scope keeps the counters for different identities apart (email vs ip)
+        self.capacity = capacity
+        self.window = max(1, int(capacity * refill_seconds))
+
+    def cache_key(self, identity, window_index):
+        ''' Hash the identity so any characters are safe to use as a cache key '''
+        digest = hashlib.sha256(str(identity).encode('utf-8')).hexdigest()
+        return f"throttle_{self.scope}_{digest}_{window_index}"
+
+    def consume(self, identity):
+        ''' Count an attempt in the identity's current window. Returns False if the window's attempts are used up (throttled) '''
+        key = self.cache_key(identity, int(time.time()) // self.window)
+        with self.lock:
+            cache.add(key, 0, timeout=self.window + 1) # Only the first attempt of the window creates the counter
+            try:
+                attempts = cache.incr(key)
+            except ValueError: # The counter expired between the two calls
+                cache.add(key, 1, timeout=self.window + 1)
+                attempts = 1
+        return attempts <= self.capacity
+
+    def reset(self, identity):
+        ''' Clear the identity's attempts in the current window (e.g. after a successful login) '''
+        cache.delete(self.cache_key(identity, int(time.time()) // self.window))
+
+
+def login_windows():
+    ''' Return the (email window, ip window) pair configured in settings.LOGIN_THROTTLE_RATES '''
+    rates = settings.LOGIN_THROTTLE_RATES
+    return AttemptWindow('login_email', *rates['email']), AttemptWindow('login_ip', *rates['ip'])
+
+
+def client_ip(request):
+    ''' Return the address of the client. The last X-Forwarded-For entry is the one appended by our own proxy, so it cannot be spoofed '''
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded_for:
+        return forwarded_for.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
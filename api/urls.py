@@ -1,45 +1,59 @@
 from django.conf import settings
-from django.urls import include, path, re_path
+from django.urls import URLResolver, path, re_path
+from django.urls.resolvers import RoutePattern
 from django.conf.urls.static import static
-from django.views.generic import TemplateView
-from rest_framework.routers import DefaultRouter
 
 from api import views
-from .views import main_spa, UserProfileHistoryView, BoxToBoxView, CareerPathView, GuessTheSideView
+from .views import main_spa, BoxToBoxView, CareerPathView, GuessTheSideView
 app_name = 'api'
 
-#Handles all the url's served by the rest framework
-router = DefaultRouter()
-router.register(r'check_auth', UserProfileHistoryView, basename='check_auth')
-router.register(r'users', views.UserViewSet, basename='users')
+if settings.ASYNC_SOLO_VIEWS: # Serve the solo games from the async views, which run on the event loop under ASGI
+    from .async_views import AsyncBoxToBoxView as BoxToBoxView, AsyncCareerPathView as CareerPathView, AsyncGuessTheSideView as GuessTheSideView
 
-urlpatterns = [
-    path('', main_spa),
-    path('', include(router.urls)),
-    path('login/', views.login_view, name='login'),
-    path('signup/', views.signup_view, name='signup'),
-    path('logout/', views.custom_logout, name='logout'),
-    path('leaderboard', views.leaderboard, name='leaderboard'), #Endpoint for the leaderboard
 
+def solo_game_urls(box2box_view, career_path_view, guess_the_side_view):
+    ''' Routes of the solo games, served by either the sync or the async views '''
     #Patterns:
     # _get_game -> Retrieve all games that can be played
     # _game -> Retrieve game data about a specific game
     # _guess -> Guess endpoint for a specific game in mind
+    # _guess_batch -> Several guesses at once, {"guesses": [...]} played in order
     # session_id and game denote the same field, they are seperated for logic as there are two POST methods in each class
+    return [
+        path('box2box/game/', box2box_view.as_view(), name='box2box_get_game'),
+        path('box2box/game/<int:game_id>', box2box_view.as_view(), name='box2box_game'),
+        path('box2box/guess/<int:session_id>', box2box_view.as_view(), name='box2box_guess'),
+        path('box2box/guesses/<int:session_id>', box2box_view.as_view(), {'batch': True}, name='box2box_guess_batch'),
+
+        path('career_path/game/', career_path_view.as_view(), name='career_path_get_game'),
+        path('career_path/game/<int:game_id>', career_path_view.as_view(), name='career_path_game'),
+        path('career_path/guess/<int:session_id>', career_path_view.as_view(), name='career_path_guess'),
+        path('career_path/guesses/<int:session_id>', career_path_view.as_view(), {'batch': True}, name='career_path_guess_batch'),
+
+        path('guess_the_side/game/', guess_the_side_view.as_view(), name='gts_get_game'),
+        path('guess_the_side/game/<int:game_id>', guess_the_side_view.as_view(), name='gts_game'),
+        path('guess_the_side/guess/<int:session_id>', guess_the_side_view.as_view(), name='gts_guess'),
+        path('guess_the_side/guesses/<int:session_id>', guess_the_side_view.as_view(), {'batch': True}, name='gts_guess_batch'),
+    ]
 
-    path('box2box/game/', BoxToBoxView.as_view(), name='box2box_get_game'),
-    path('box2box/game/<int:game_id>', BoxToBoxView.as_view(), name='box2box_game'),
-    path('box2box/guess/<int:session_id>', BoxToBoxView.as_view(), name='box2box_guess'),
 
-    path('career_path/game/', CareerPathView.as_view(), name='career_path_get_game'),
-    path('career_path/game/<int:game_id>', CareerPathView.as_view(), name='career_path_game'),
-    path('career_path/guess/<int:session_id>', CareerPathView.as_view(), name='career_path_guess'),
+def lazy_include(route, urlconf, app_name=None, namespace=None):
+    ''' include() of a urlconf that's imported when a URL under the route is first resolved (or reversed), not with this one '''
+    return URLResolver(RoutePattern(route, is_endpoint=False), urlconf, app_name=app_name, namespace=namespace)
+
+
+urlpatterns = [
+    path('', main_spa),
+    path('login/', views.login_view, name='login'),
+    path('signup/', views.signup_view, name='signup'),
+    path('logout/', views.custom_logout, name='logout'),
+    path('leaderboard', views.leaderboard, name='leaderboard'), #Endpoint for the leaderboard
+    path('metrics', views.prometheus_metrics, name='metrics'), # Prometheus scrape endpoint for the performance metrics
 
-    path('guess_the_side/game/', GuessTheSideView.as_view(), name='gts_get_game'),
-    path('guess_the_side/game/<int:game_id>', GuessTheSideView.as_view(), name='gts_game'),
-    path('guess_the_side/guess/<int:session_id>', GuessTheSideView.as_view(), name='gts_guess'),
+    *solo_game_urls(BoxToBoxView, CareerPathView, GuessTheSideView),
+    lazy_include('', 'api.rest_urls'), # Handles all the url's served by the rest framework, after the routes of the app
 
-    re_path(r'^.*$', TemplateView.as_view(template_name='api/spa/index.html'), name='home'), # Ensure the user is redirected to the vue page if any other url is entered
+    re_path(r'^.*$', main_spa, name='home'), # Ensure the user is redirected to the vue page if any other url is entered
     # We use a regex to match any other pattern that has not been defined above this
 ]
 
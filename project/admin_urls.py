@@ -0,0 +1,8 @@
+from django.contrib import admin
+
+# The admin site, included lazily by urls.py. Its apps' admin modules are only discovered (the admin app is installed without
+# autodiscovery, see INSTALLED_APPS) once a URL under the admin prefix is resolved, or a URL is reversed into it.
+
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
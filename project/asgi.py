@@ -13,7 +13,11 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings') # Export any
 django.setup()
 
 from django.urls import path
-from api.consumers import MatchmakingConsumer, TriviaGameConsumer
+from django.conf import settings
+from api.consumers import MatchmakingConsumer, TriviaGameConsumer, SoloGameConsumer
+from api.questions import warm_question_bank
+
+warm_question_bank() # Match setup reads the questions from memory from the first match on
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
@@ -21,6 +25,7 @@ application = ProtocolTypeRouter({
         URLRouter([
             path('ws/matchmaking/', MatchmakingConsumer.as_asgi()), # Path for joining the queue for Trivia
             path('ws/trivia/<int:game_id>/', TriviaGameConsumer.as_asgi()), # Path for playing the Trivia game
+            *([path('ws/solo/<str:game_type>/<int:game_id>/', SoloGameConsumer.as_asgi())] if settings.SOLO_WEBSOCKETS else []), # Guesses of a started solo game
         ])
     ),
 })
@@ -31,8 +31,28 @@ SECRET_KEY = os.getenv(
 AUTH_USER_MODEL = 'api.User'
 
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',  # Default backend
-    'api.backends.EmailAuthBackend',  # Custom email auth backend
+    'api.backends.EmailAuthBackend',  # Custom email (or username) auth backend, which refuses every failed attempt itself
+    'django.contrib.auth.backends.ModelBackend',  # Default backend, kept for the sessions logged in through it (never reached with a password)
+]
+
+# Login throttling, as (attempts, seconds per attempt) per email and per client ip: the attempts are allowed in each window of their product
+LOGIN_THROTTLE_RATES = {
+    'email': (5, 60),
+    'ip': (30, 2),
+}
+
+# Password hashing runs in a bounded thread pool of this size, so login storms cannot occupy every core
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+
+# Iterations for the preferred PBKDF2 hasher (OWASP recommendation), hashes with other counts are upgraded on login
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', '600000'))
+
+PASSWORD_HASHERS = [
+    'api.hashers.TunedPBKDF2PasswordHasher',  # Preferred hasher, also verifies the existing pbkdf2_sha256 hashes
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
 ]
 
 # SECURITY WARNING: don't run with debug turned on in production!
@@ -45,7 +65,7 @@ ALLOWED_HOSTS = ['*']
 
 INSTALLED_APPS = [
     'corsheaders',
-    'django.contrib.admin',
+    'django.contrib.admin.apps.SimpleAdminConfig',  # The admin, without discovering the admin modules at startup (see project/admin_urls.py)
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -54,14 +74,16 @@ INSTALLED_APPS = [
     'django.contrib.postgres',
     'api',
     'rest_framework',
-    'storages',
     'channels'
 ]
 
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 MIDDLEWARE = [
+    'api.middleware.InstrumentationMiddleware',  # First, so the latency covers the whole middleware stack
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.StaticFilesMiddleware', # Whitenoise middleware for static files (with an async path), ahead of the session and auth middleware
+    'api.middleware.SpaShellMiddleware', # Navigations of the SPA get its shell here, without running the middleware below
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware for handling requests
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,10 +91,48 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', # Whitenoise middleware for static files
     'api.middleware.ErrorHandlingMiddleware',  # Custom middleware for error handling
 ]
 
+# Requests slower than this (seconds) are counted, and logged with a profile when they were sampled for profiling
+SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', '1.0'))
+SLOW_REQUEST_PROFILE_RATE = float(os.getenv('SLOW_REQUEST_PROFILE_RATE', '0'))  # Fraction of requests to profile, 0 disables profiling
+
+# Bearer token allowing a Prometheus scraper to read /metrics (staff users can always read it)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Seconds between event loop lag samples in websocket workers (0 disables the monitor)
+EVENT_LOOP_MONITOR_INTERVAL = float(os.getenv('EVENT_LOOP_MONITOR_INTERVAL', '0.5'))
+METRICS_LOG_INTERVAL = float(os.getenv('METRICS_LOG_INTERVAL', '0'))  # Seconds between metric dumps to the log (0 disables them)
+
+# Queued users' consumers refresh their entry every interval, and entries that missed three heartbeats are expired
+MATCHMAKING_HEARTBEAT_INTERVAL = float(os.getenv('MATCHMAKING_HEARTBEAT_INTERVAL', '10'))
+MATCHMAKING_QUEUE_DEPTH_INTERVAL = float(os.getenv('MATCHMAKING_QUEUE_DEPTH_INTERVAL', '5'))  # Seconds between counts of the queue for its metric
+REAPER_INTERVAL = float(os.getenv('REAPER_INTERVAL', '60'))  # Seconds between reaper passes in each websocket worker (0 disables it, e.g. when run from cron)
+REAPER_BATCH_SIZE = int(os.getenv('REAPER_BATCH_SIZE', '500'))  # Rows handled per reaper transaction
+
+# Trivia questions each worker keeps in memory (api/questions.py). A larger bank keeps a rotating subset of this many
+QUESTION_BANK_PRELOAD = int(os.getenv('QUESTION_BANK_PRELOAD', '10000'))
+QUESTION_BANK_CHECK_INTERVAL = float(os.getenv('QUESTION_BANK_CHECK_INTERVAL', '30'))  # Seconds between checks for a changed bank
+QUESTION_STATS_FLUSH_INTERVAL = float(os.getenv('QUESTION_STATS_FLUSH_INTERVAL', '10'))  # Seconds between writes of the answer statistics (0 disables them)
+QUESTION_STATS_RELOAD_INTERVAL = float(os.getenv('QUESTION_STATS_RELOAD_INTERVAL', '3600'))  # Least seconds between bank reloads for changed difficulties
+JSON_ENCODER = os.getenv('JSON_ENCODER', 'auto')  # Encoder of the JSON responses and websocket messages: auto (orjson when installed), orjson or json
+CONTENT_CACHE_SIZE = int(os.getenv('CONTENT_CACHE_SIZE', '2000'))  # Compiled career paths and formations each worker keeps in memory, per game type (api/content_cache.py)
+CONTENT_CACHE_CHECK_INTERVAL = float(os.getenv('CONTENT_CACHE_CHECK_INTERVAL', '30'))  # Seconds between checks for changed solo game content
+LEADERBOARD_MAX_AGE = int(os.getenv('LEADERBOARD_MAX_AGE', '10'))  # Seconds a browser or the reverse proxy may serve the leaderboard before revalidating it
+GUESS_LOG_DIR = os.getenv('GUESS_LOG_DIR', str(BASE_DIR / 'var' / 'guess_log'))  # Spool and column chunks of the guess log (empty disables it)
+GUESS_LOG_FLUSH_INTERVAL = float(os.getenv('GUESS_LOG_FLUSH_INTERVAL', '1'))  # Seconds between appends of the queued guesses
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.performance': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},  # Slow requests and metric dumps
+    },
+}
 
 ROOT_URLCONF = 'project.urls'
 
@@ -107,6 +167,16 @@ CSRF_TRUSTED_ORIGINS = [
     "https://trivela-trivia.onrender.com"  # Custom url to allow for cross-origin requests
 ]
 
+GAME_FILES_DIR = BASE_DIR / 'api'  # Holds a folder of JSON game files per file based game type (e.g. api/box2box/1.json)
+ASYNC_SOLO_VIEWS = os.getenv('ASYNC_SOLO_VIEWS', 'False') == 'True'  # Serve the solo games from the async views (api/async_views.py) under ASGI
+ASYNC_STORAGE_WORKERS = int(os.getenv('ASYNC_STORAGE_WORKERS', '10'))  # Threads (and database connections) shared by the async views' blocking calls
+SOLO_WEBSOCKETS = os.getenv('SOLO_WEBSOCKETS', 'True') == 'True'  # Also play started solo games over ws/solo/<game type>/<game id>/ (SoloGameConsumer)
+SOLO_WRITE_BEHIND_INTERVAL = float(os.getenv('SOLO_WRITE_BEHIND_INTERVAL', '1'))  # Most seconds a solo game websocket keeps guesses before writing them
+SESSION_WRITE_BEHIND_INTERVAL = float(os.getenv('SESSION_WRITE_BEHIND_INTERVAL', '1'))  # Seconds between writes of the solo game session counters (0 saves the session on every guess)
+SESSION_WRITE_BEHIND_MAX_PENDING = int(os.getenv('SESSION_WRITE_BEHIND_MAX_PENDING', '5000'))  # Sessions waiting to be written that trigger an early flush
+SESSION_JOURNAL_DIR = os.getenv('SESSION_JOURNAL_DIR', str(BASE_DIR / 'var' / 'session_journal'))  # Journals of the counters not yet written, replayed after a crash
+SESSION_JOURNAL_FSYNC = os.getenv('SESSION_JOURNAL_FSYNC', 'False') == 'True'  # Sync every journal append to disk (survives power loss, not only a killed worker)
+
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:8000/') # Frontend url is either read by the environment variable or set to localhost
 
 SESSION_COOKIE_DOMAIN = None
@@ -157,12 +227,23 @@ CHANNEL_LAYERS = {
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'api.postgres_pool', # PostgreSQL, with connections borrowed from a per process pool (api/postgres_pool/base.py)
         'NAME': os.environ.get('DB_NAME', ''),  # Name of your database
         'USER': os.environ.get('DB_USER', ''),  # Database user
         'PASSWORD': os.environ.get('DB_PASSWORD', ''),  # Database password
         'HOST': os.environ.get('DB_HOST', ''),  # Set to empty string for localhost
         'PORT': os.environ.get('DB_PORT', '5432'),  # Set to empty string for default
+        'CONN_MAX_AGE': 0, # Connections are returned to the pool at the end of each request, rather than kept by the thread
+        'OPTIONS': {
+            'pool': { # Sized per worker process: every worker holds up to max_size connections, keep workers * max_size under max_connections
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)), # Idle connections kept open
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 20)),
+                'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)), # Seconds to wait for a free connection before failing
+                'max_idle': 300, # Seconds before an idle connection over min_size is closed
+                'max_lifetime': 3600, # Seconds before a connection is replaced
+                'check_after': float(os.environ.get('DB_POOL_CHECK_AFTER', 30)), # Idle seconds after which a connection is checked before reuse
+            },
+        },
     }
 }
 
@@ -234,6 +315,12 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'}, # Hashed names, with gzip copies written by collectstatic, and Brotli ones when the Brotli package (requirements.txt) is installed
+}
+# Content hashed files are cached forever: the names hashed by collectstatic, and those of the Vite build linked by the SPA shell
+WHITENOISE_IMMUTABLE_FILE_TEST = rf'^/{STATIC_URL}(api/spa/assets/.+-[0-9a-f]{{8}}|.+\.[0-9a-f]{{12}})\.\w+$'
+SPA_SHELL_PATH = os.getenv('SPA_SHELL_PATH', os.path.join(STATIC_ROOT, 'spa_shell.html'))  # The SPA shell rendered by build_spa_shell
 
 INTERNAL_IPS = ['127.0.0.1']
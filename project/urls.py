@@ -14,13 +14,13 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings
-from django.contrib import admin
 from django.urls import include, path
+from api.urls import lazy_include
 import os
 
 admin_url = os.getenv('SUPERUSER_URL', 'super-admin/') # Holds the environment variable for the admin url
 
 urlpatterns = [
-    path(admin_url, admin.site.urls),
+    lazy_include(admin_url, 'project.admin_urls', app_name='admin', namespace='admin'), # The admin site is loaded on its first use
     path('', include('api.urls')), # References all the urls in the api
 ]